@@ -0,0 +1,148 @@
+"""
+Runs the microbenchmarks and compares results with a baseline.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json --filter format
+
+Exits with code 1 when any benchmark is slower than the baseline by more than the threshold.
+Benchmarks are compared by the best run, which is the least affected by the noise.
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+
+from .suite import BENCHMARKS
+
+
+def _number(timer: timeit.Timer, min_time: float) -> int:
+    """
+    Number of loops, so one run takes at least `min_time` seconds.
+    """
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time or number >= 1_000_000:
+            return number
+        number *= 10
+
+
+def run_benchmark(func, params: dict, repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(func(**params), timer=time.perf_counter)
+    number = _number(timer, min_time)
+    times = [time / number for time in timer.repeat(repeat, number)]
+
+    return {
+        "name": func.__name__,
+        "params": params,
+        "min": min(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def run(
+    pattern: str = None, repeat: int = 5, min_time: float = 0.1, max_size: int = None
+) -> list[dict]:
+    results = []
+    for name, (func, grid) in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+
+        for values in itertools.product(*grid.values()):
+            params = dict(zip(grid, values))
+            if max_size and params.get("size", 0) > max_size:
+                continue
+
+            result = run_benchmark(func, params, repeat, min_time)
+            results.append(result)
+            print(f"{_id(result):<40} {result['min'] * 1e6:>14.1f} us", file=sys.stderr)
+
+    return results
+
+
+def _id(result: dict) -> str:
+    params = ",".join(f"{key}={value}" for key, value in result["params"].items())
+
+    return f"{result['name']}[{params}]"
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """
+    Returns comparisons of the results which are in the baseline.
+    """
+    baseline = {_id(result): result for result in baseline}
+    comparisons = []
+    for result in results:
+        base = baseline.get(_id(result))
+        if base is None:
+            continue
+
+        ratio = result["min"] / base["min"]
+        comparisons.append(
+            {
+                "id": _id(result),
+                "baseline": base["min"],
+                "current": result["min"],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+
+    return comparisons
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--filter", help="Only run benchmarks which name contains it.")
+    parser.add_argument("--output", help="File to write JSON results to.")
+    parser.add_argument("--baseline", help="JSON results to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1)
+    parser.add_argument(
+        "--max-size", type=int, help="Skip documents larger than this, in bytes."
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.repeat, args.min_time, args.max_size)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+        report["comparisons"] = compare(results, baseline, args.threshold)
+        for comparison in report["comparisons"]:
+            mark = "REGRESSION" if comparison["regression"] else ""
+            print(
+                f"{comparison['id']:<40} {comparison['ratio']:>8.2f}x {mark}",
+                file=sys.stderr,
+            )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if any(comparison["regression"] for comparison in report.get("comparisons", [])):
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
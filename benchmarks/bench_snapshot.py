@@ -0,0 +1,80 @@
+"""
+Compares document snapshot codec with pickle.
+
+    python -m benchmarks.bench_snapshot
+"""
+import gzip
+import io
+import pickle
+import timeit
+
+from docchain.documents import Document, Section
+from docchain.snapshots import dump_document, load_document
+
+
+def make_document(sections: int) -> Document:
+    res = {}
+    for i in range(sections):
+        res[f"section_{i}"] = {
+            "schema": {
+                "type": "object",
+                "properties": {f"field_{j}": {"type": "string"} for j in range(20)},
+            },
+            "section": Section(title=f"Section {i}", text="Lorem ipsum " * 50),
+        }
+
+    return Document(title="Benchmark", filename="benchmark.json", res=res)
+
+
+def dump_codec(document: Document, compress: bool = False) -> bytes:
+    buffer = io.BytesIO()
+    raw = gzip.GzipFile(fileobj=buffer, mode="wb") if compress else buffer
+    with io.TextIOWrapper(raw, encoding="utf-8") as file:
+        dump_document(document, file)
+        file.flush()
+        if compress:
+            raw.close()
+
+        return buffer.getvalue()
+
+
+def load_codec(data: bytes, compress: bool = False) -> Document:
+    raw = io.BytesIO(data)
+    if compress:
+        raw = gzip.GzipFile(fileobj=raw, mode="rb")
+
+    return load_document(io.TextIOWrapper(raw, encoding="utf-8"))
+
+
+def main(number: int = 5):
+    print(
+        f"{'sections':>8} {'codec':>8} {'size':>10} {'dump, ms':>10} {'load, ms':>10}"
+    )
+    for sections in (10, 100, 1000):
+        document = make_document(sections)
+        codecs = {
+            "pickle": (lambda document=document: pickle.dumps(document), pickle.loads),
+            "json": (lambda document=document: dump_codec(document), load_codec),
+            "json.gz": (
+                lambda document=document: dump_codec(document, compress=True),
+                lambda data: load_codec(data, compress=True),
+            ),
+        }
+
+        for name, (dump, load) in codecs.items():
+            data = dump()
+            assert load(data) == document
+            dump_time = timeit.timeit(dump, number=number) / number * 1000
+            load_time = (
+                timeit.timeit(lambda load=load, data=data: load(data), number=number)
+                / number
+                * 1000
+            )
+            print(
+                f"{sections:>8} {name:>8} {len(data):>10} "
+                f"{dump_time:>10.2f} {load_time:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Load test of the generator with the simulated LLM.
+
+    python -m benchmarks.load_test --specs 100 --concurrency 8 --blocks 5 \
+        --latency 0.5 --tokens-per-second 50 --rpm 300 --error-rate 0.05
+
+Reports throughput, document latency percentiles, LLM requests and wasted tokens: tokens billed
+for timed out requests, completions which were generated again and failed documents.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from docchain.blocks import TextBlock
+from docchain.exceptions import DocumentGenerationError
+from docchain.generator import Generator
+from docchain.middleware import collect_openai_stats
+from docchain.models.simulated import SimulatedLLM
+from docchain.specs import Spec
+from docchain.stats import percentile
+
+
+def make_spec(i: int, blocks: int) -> Spec:
+    return Spec(
+        title=f"Document {i}",
+        name="load-test",
+        blocks=[TextBlock(f"block_{j}", title=f"Section {j}") for j in range(blocks)],
+    )
+
+
+def load_test(
+    generator: Generator, specs: list[Spec], concurrency: int = 1
+) -> dict[str, float]:
+    """
+    Generates documents from the specs with the given concurrency. Generator LLM must be
+    SimulatedLLM and documents must be generated with collect_openai_stats middleware.
+    """
+
+    def generate(spec: Spec) -> tuple[float, int | None]:
+        start = time.perf_counter()
+        try:
+            document = generator(spec)
+        except DocumentGenerationError:
+            return time.perf_counter() - start, None
+
+        return time.perf_counter() - start, document.stats["total_tokens"]
+
+    start = time.perf_counter()
+    latencies = []
+    used_tokens = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in as_completed([executor.submit(generate, spec) for spec in specs]):
+            latency, tokens = future.result()
+            latencies.append(latency)
+            if tokens is None:
+                failed += 1
+            else:
+                used_tokens += tokens
+    duration = time.perf_counter() - start
+
+    stats = generator.llm.stats.dict()
+
+    return {
+        "documents": len(specs),
+        "failed": failed,
+        "concurrency": concurrency,
+        "duration": duration,
+        "throughput": len(specs) / duration,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=None),
+        **{f"llm_{name}": value for name, value in stats.items()},
+        "used_tokens": used_tokens,
+        "wasted_tokens": stats["total_tokens"] - used_tokens,
+    }
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test")
+    parser.add_argument("--specs", type=int, default=20)
+    parser.add_argument("--blocks", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--max-workers", type=int, default=1, help="Blocks per document."
+    )
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--latency-stddev", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--request-timeout", type=float, default=10.0)
+    parser.add_argument("--rpm", type=int)
+    parser.add_argument("--tpm", type=int)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--retry-min-wait", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    llm = SimulatedLLM(
+        latency=args.latency,
+        latency_stddev=args.latency_stddev,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        request_timeout=args.request_timeout,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        max_retries=args.max_retries,
+        retry_min_wait=args.retry_min_wait,
+        seed=args.seed,
+    )
+    generator = Generator(
+        middleware=[collect_openai_stats], llm=llm, max_workers=args.max_workers
+    )
+    specs = [make_spec(i, args.blocks) for i in range(args.specs)]
+
+    print(json.dumps(load_test(generator, specs, args.concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Microbenchmarks of the generator internals.
+
+Each benchmark is a function which takes its parameters and returns the callable to time,
+so setup is not measured.
+"""
+import io
+import json
+import subprocess
+import sys
+from collections.abc import Callable
+
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import JSONSchemaBlock, TextBlock
+from docchain.documents import Document, Format, Section
+from docchain.generator import Generator
+from docchain.middleware.base import build_handler
+from docchain.output_parsers import JSONSchemaOutputParser
+from docchain.results import Results
+from docchain.serializers import get_serializer
+from docchain.snapshots import dump_document, load_document
+from docchain.specs import Spec
+
+BLOCKS = (1, 10, 100, 1000)
+# Approximate size of the document results in bytes.
+SIZES = (1_000, 100_000, 1_000_000, 10_000_000)
+
+BENCHMARKS: dict[str, tuple[Callable, dict[str, tuple]]] = {}
+
+
+def make_schema(fields: int) -> str:
+    return json.dumps(
+        {
+            "$schema": "http://json-schema.org/draft-2020-12/schema",
+            "type": "object",
+            "properties": {f"field_{i}": {"type": "string"} for i in range(fields)},
+            "required": [f"field_{i}" for i in range(fields)],
+        },
+        indent=2,
+    )
+
+
+SCHEMA = make_schema(20)
+
+
+def benchmark(**params: tuple):
+    def decorator(func):
+        BENCHMARKS[func.__name__] = (func, params)
+        return func
+
+    return decorator
+
+
+def make_spec(blocks: int) -> Spec:
+    return Spec(
+        title="Benchmark",
+        name="benchmark",
+        blocks=[
+            TextBlock(
+                f"block_{i}",
+                title=f"Section {i} of {{{{ doc.title }}}}",
+                description="Follows {{ block_0 | default('') | truncate(20) }}",
+            )
+            for i in range(blocks)
+        ],
+    )
+
+
+def make_document(size: int) -> Document:
+    res = {}
+    section_size = 1_000
+    for i in range(max(size // section_size, 1)):
+        res[f"section_{i}"] = {
+            "schema": {"type": "object", "properties": {"name": {"type": "string"}}},
+            "section": Section(title=f"Section {i}", text="Lorem ipsum " * 75),
+        }
+
+    return Document(title="Benchmark", filename="benchmark.json", res=res)
+
+
+def _noop_middleware(build_document):
+    def run(spec):
+        return build_document(spec)
+
+    return run
+
+
+@benchmark(blocks=BLOCKS)
+def spec_copy(blocks: int):
+    spec = make_spec(blocks)
+    spec.compile()
+
+    return lambda: spec.copy()
+
+
+@benchmark(layers=(1, 10, 100))
+def middleware(layers: int):
+    document = Document(title="Benchmark", res={})
+    handler = build_handler([_noop_middleware] * layers, lambda spec: document)
+    spec = Spec()
+
+    return lambda: handler(spec)
+
+
+@benchmark(blocks=BLOCKS)
+def get_params(blocks: int):
+    spec = make_spec(blocks)
+    document = Document(title="Benchmark", res={"block_0": "Lorem ipsum " * 10})
+
+    def run():
+        for block in spec.blocks:
+            block.get_params(document)
+
+    return run
+
+
+@benchmark(blocks=BLOCKS)
+def resume_nested(blocks: int):
+    res = Results()
+    for i in range(blocks):
+        res.set(f"section_{i % 10}.block_{i}", "Lorem ipsum")
+    document = Document(title="Benchmark", res=res)
+    keys = [f"section_{i % 10}.block_{i}" for i in range(blocks)]
+
+    return lambda: all(key in document.res for key in keys)
+
+
+@benchmark(fields=(20, 200))
+def parse_json_schema(fields: int):
+    parser = JSONSchemaOutputParser()
+    completion = f"Here is the schema:\n```json\n{make_schema(fields)}\n```"
+
+    return lambda: parser.parse(completion)
+
+
+@benchmark(fmt=("json", "yaml", "text"), size=SIZES)
+def format_document(fmt: str, size: int):
+    document = make_document(size)
+    serializer = get_serializer(Format(fmt))
+
+    return lambda: serializer.dump(document.res, io.StringIO())
+
+
+@benchmark(size=SIZES)
+def snapshot_dump(size: int):
+    document = make_document(size)
+
+    return lambda: dump_document(document, io.StringIO())
+
+
+@benchmark(size=SIZES)
+def snapshot_load(size: int):
+    file = io.StringIO()
+    dump_document(make_document(size), file)
+    data = file.getvalue()
+
+    return lambda: load_document(io.StringIO(data))
+
+
+@benchmark(blocks=BLOCKS)
+def generate(blocks: int):
+    spec = make_spec(blocks)
+    generator = Generator(llm=FakeListLLM(responses=["Lorem ipsum"] * blocks))
+
+    def run():
+        generator.llm.i = 0
+        generator(spec)
+
+    return run
+
+
+@benchmark(blocks=(1, 10))
+def generate_json_schema(blocks: int):
+    spec = Spec(
+        title="Benchmark",
+        blocks=[
+            JSONSchemaBlock(
+                f"schema_{i}", title="Person", description="Of {{ doc.title }}"
+            )
+            for i in range(blocks)
+        ],
+    )
+    generator = Generator(llm=FakeListLLM(responses=[SCHEMA] * blocks))
+
+    def run():
+        generator.llm.i = 0
+        generator(spec)
+
+    return run
+
+
+@benchmark(
+    module=(
+        "docchain.generator",
+        "docchain.blocks",
+        "docchain.middleware",
+        "docchain.models",
+        "docchain.output_parsers",
+    )
+)
+def import_time(module: str):
+    """
+    Cold start of a new interpreter importing the module.
+    """
+    command = [sys.executable, "-c", f"import {module}"]
+
+    return lambda: subprocess.run(command, check=True)
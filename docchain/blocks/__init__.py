@@ -1,13 +1,32 @@
-from .base import BaseBlock
-from .json_schema import JSONSchemaBlock
-from .pydantic import PydanticBlock
-from .text import TextBlock
-from .ui_schema import UISchemaBlock
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
 
 __all__ = [
     "BaseBlock",
+    "JSONBlock",
     "JSONSchemaBlock",
     "PydanticBlock",
     "TextBlock",
     "UISchemaBlock",
 ]
+
+# Blocks are imported on first access.
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "BaseBlock": ".base",
+        "JSONBlock": ".base",
+        "JSONSchemaBlock": ".json_schema",
+        "PydanticBlock": ".pydantic",
+        "TextBlock": ".text",
+        "UISchemaBlock": ".ui_schema",
+    },
+)
+
+if TYPE_CHECKING:
+    from .base import BaseBlock, JSONBlock
+    from .json_schema import JSONSchemaBlock
+    from .pydantic import PydanticBlock
+    from .text import TextBlock
+    from .ui_schema import UISchemaBlock
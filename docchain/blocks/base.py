@@ -1,18 +1,58 @@
-from jinja2 import Template
-from langchain.chains import LLMChain
-from langchain.llms.base import BaseLLM
-from langchain.prompts import BasePromptTemplate
+from __future__ import annotations
+
+from functools import cached_property, partial
+from typing import TYPE_CHECKING
+
 from pydantic import BaseModel
 
+from ..budget import TokenBudget
+from ..cache import BaseCache, cache_key
 from ..documents import Document
+from ..events import block_callbacks
+from ..singleflight import SingleFlight
+from ..templates import CompiledTemplate, compile_config
+from ..tracing import span
+from ..utils import incr_stat
+
+# LangChain is imported when a block runs.
+if TYPE_CHECKING:
+    from langchain.callbacks.base import BaseCallbackHandler
+    from langchain.chains import LLMChain
+    from langchain.llms.base import BaseLLM
+    from langchain.prompts import BasePromptTemplate
+    from langchain.schema import BaseOutputParser
+
+    from ..output_parsers.json_scanner import JSONStreamHandler
 
 
 class BaseBlock:
     model: BaseModel = BaseModel
+    # Set to False for the blocks which are expected to return a new result on every call.
+    cacheable: bool = True
+    # Set to True when the prompt does not depend on the document, so the chain is created
+    # once per Spec and reused for all documents. It's not inherited, as subclasses could
+    # override create_prompt or create_chain to use the document.
+    static_prompt: bool = False
+    # Number of times the LLM is asked again when the completion cannot be parsed.
+    max_retries: int = 0
+    # Completion budget hint used by the token budget instead of the history of the block.
+    max_tokens: int | None = None
 
-    def __init__(self, key, /, **kwargs):
+    def __init__(
+        self, key, /, cacheable: bool = None, max_tokens: int = None, **kwargs
+    ):
         self.key = key
         self.config = self.model(**kwargs)
+        self.templates = compile_config(self.config.dict())
+        if cacheable is not None:
+            self.cacheable = cacheable
+        if max_tokens is not None:
+            self.max_tokens = max_tokens
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "static_prompt" not in cls.__dict__:
+            cls.static_prompt = False
 
     def create_prompt(self, document: Document, llm: BaseLLM) -> BasePromptTemplate:
         """
@@ -24,6 +64,7 @@ class BaseBlock:
         """
         Creates LLMChain for the given block. Could be overridden in the subclass.
         """
+        from langchain.chains import LLMChain
 
         return LLMChain(
             prompt=self.create_prompt(
@@ -33,15 +74,45 @@ class BaseBlock:
             llm=llm,
         )
 
+    def _template(self, key: str, value: str) -> CompiledTemplate:
+        template = self.templates.get(key)
+        if template is None or template.source != value:
+            # config was changed after the block was created
+            template = self.templates[key] = CompiledTemplate(value)
+
+        return template
+
+    @property
+    def template_variables(self) -> dict[str, frozenset[str]]:
+        """
+        Names of the context variables referenced by each template in the block config.
+        """
+        return {
+            key: self._template(key, value).variables
+            for key, value in self.config.dict().items()
+            if isinstance(value, str)
+        }
+
+    @property
+    def variables(self) -> set[str]:
+        """
+        Names of the context variables referenced by the templates in the block config.
+        """
+        return set().union(*self.template_variables.values())
+
     def get_params(self, document: Document) -> dict:
         """
         Renders params for the given document. Could be overridden in the subclass.
         """
+        context = None
         res = {}
         for key, value in self.config.dict().items():
             if isinstance(value, str):
-                template = Template(value)
-                value = template.render(document.context)
+                template = self._template(key, value)
+                if not template.is_static:
+                    if context is None:
+                        context = document.context
+                    value = template.render(context)
 
             res[key] = value
 
@@ -53,8 +124,287 @@ class BaseBlock:
         """
         return result
 
-    def __call__(self, document: Document, llm: BaseLLM, **kwargs) -> any:
-        llm_chain = self.create_chain(document, llm)
-        result = llm_chain.run(**self.get_params(document))
+    @staticmethod
+    def _render_prompt(llm_chain: LLMChain, params: dict) -> str:
+        prompt = llm_chain.prompt
+        prompt_value = prompt.format_prompt(
+            **{key: params[key] for key in prompt.input_variables}
+        )
+
+        return prompt_value.to_string()
+
+    def _cache_key(self, llm_chain: LLMChain, params: dict) -> str:
+        return cache_key(self._render_prompt(llm_chain, params), llm_chain.llm)
+
+    def _run_chain(self, llm_chain: LLMChain, params: dict) -> str:
+        return llm_chain.run(callbacks=block_callbacks(self.key), **params)
 
+    async def _arun_chain(self, llm_chain: LLMChain, params: dict) -> str:
+        return await llm_chain.arun(callbacks=block_callbacks(self.key), **params)
+
+    def parse_result(self, result: str, document: Document) -> any:
+        """
+        Transforms the completion. OutputParserException raised here makes the block ask
+        the LLM again, up to `max_retries` times.
+        """
         return self.transform_result(result)
+
+    def _request_key(
+        self,
+        llm_chain: LLMChain,
+        params: dict,
+        cache: BaseCache | None,
+        single_flight: SingleFlight | None,
+    ) -> str | None:
+        """
+        Returns the key of the LLM request, which is used for caching and coalescing.
+        """
+        if not self.cacheable or (cache is None and single_flight is None):
+            return None
+
+        return self._cache_key(llm_chain, params)
+
+    @staticmethod
+    def _cached_result(
+        key: str | None, document: Document, cache: BaseCache | None
+    ) -> str | None:
+        if key is None or cache is None:
+            return None
+
+        result = cache.get(key)
+        incr_stat(document.stats, "cache_misses" if result is None else "cache_hits")
+
+        return result
+
+    def _budget_chain(
+        self, llm_chain: LLMChain, params: dict, budget: TokenBudget
+    ) -> LLMChain:
+        if budget is None:
+            return llm_chain
+
+        return budget.apply(self, llm_chain, self._render_prompt(llm_chain, params))
+
+    def _complete(
+        self, llm_chain: LLMChain, params: dict, document: Document, budget: TokenBudget
+    ) -> tuple[str, any]:
+        """
+        Asks the LLM until the completion can be parsed. Returns the completion and the result.
+        """
+        from langchain.schema import OutputParserException
+
+        # Request key is computed for the configured LLM, as the budget varies between calls.
+        llm_chain = self._budget_chain(llm_chain, params, budget)
+        for attempt in range(self.max_retries + 1):
+            with span("block.llm", key=self.key, attempt=attempt):
+                result = self._run_chain(llm_chain, params)
+            try:
+                with span("block.parse_result", key=self.key):
+                    res = self.parse_result(result, document)
+                break
+            except OutputParserException:
+                if attempt == self.max_retries:
+                    raise
+                incr_stat(document.stats, "llm_retries")
+
+        if budget is not None:
+            budget.record(self, result, llm_chain.llm)
+
+        return result, res
+
+    async def _acomplete(
+        self, llm_chain: LLMChain, params: dict, document: Document, budget: TokenBudget
+    ) -> tuple[str, any]:
+        from langchain.schema import OutputParserException
+
+        llm_chain = self._budget_chain(llm_chain, params, budget)
+        for attempt in range(self.max_retries + 1):
+            with span("block.llm", key=self.key, attempt=attempt):
+                result = await self._arun_chain(llm_chain, params)
+            try:
+                with span("block.parse_result", key=self.key):
+                    res = self.parse_result(result, document)
+                break
+            except OutputParserException:
+                if attempt == self.max_retries:
+                    raise
+                incr_stat(document.stats, "llm_retries")
+
+        if budget is not None:
+            budget.record(self, result, llm_chain.llm)
+
+        return result, res
+
+    def _prepare(
+        self,
+        document: Document,
+        llm: BaseLLM,
+        cache: BaseCache | None,
+        chain: LLMChain | None,
+        single_flight: SingleFlight | None,
+    ) -> tuple[LLMChain, dict, str | None, str | None]:
+        """
+        Returns the chain, params, request key and the cached completion.
+        """
+        if chain is None:
+            with span("block.create_chain", key=self.key):
+                chain = self.create_chain(document, llm)
+        with span("block.get_params", key=self.key):
+            params = self.get_params(document)
+
+        with span("block.cache_get", key=self.key):
+            key = self._request_key(chain, params, cache, single_flight)
+            result = self._cached_result(key, document, cache)
+
+        return chain, params, key, result
+
+    def _coalesced_result(self, result: str, document: Document) -> any:
+        incr_stat(document.stats, "coalesced_requests")
+        with span("block.parse_result", key=self.key):
+            return self.parse_result(result, document)
+
+    def __call__(
+        self,
+        document: Document,
+        llm: BaseLLM,
+        cache: BaseCache = None,
+        chain: LLMChain = None,
+        budget: TokenBudget = None,
+        single_flight: SingleFlight = None,
+        **kwargs,
+    ) -> any:
+        llm_chain, params, key, result = self._prepare(
+            document, llm, cache, chain, single_flight
+        )
+        if result is not None:
+            with span("block.parse_result", key=self.key):
+                return self.parse_result(result, document)
+
+        complete = partial(self._complete, llm_chain, params, document, budget)
+        if key is None or single_flight is None:
+            result, res = complete()
+        else:
+            leader, (result, res) = single_flight.do(key, complete)
+            if not leader:
+                return self._coalesced_result(result, document)
+
+        # Only completions which can be parsed are cached.
+        if key is not None and cache is not None:
+            with span("block.cache_set", key=self.key):
+                cache.set(key, result)
+
+        return res
+
+    async def acall(
+        self,
+        document: Document,
+        llm: BaseLLM,
+        cache: BaseCache = None,
+        chain: LLMChain = None,
+        budget: TokenBudget = None,
+        single_flight: SingleFlight = None,
+        **kwargs,
+    ) -> any:
+        """
+        Async version of the block call. LLM must support async generation.
+        """
+        llm_chain, params, key, result = self._prepare(
+            document, llm, cache, chain, single_flight
+        )
+        if result is not None:
+            with span("block.parse_result", key=self.key):
+                return self.parse_result(result, document)
+
+        complete = partial(self._acomplete, llm_chain, params, document, budget)
+        if key is None or single_flight is None:
+            result, res = await complete()
+        else:
+            leader, (result, res) = await single_flight.ado(key, complete)
+            if not leader:
+                return self._coalesced_result(result, document)
+
+        if key is not None and cache is not None:
+            with span("block.cache_set", key=self.key):
+                cache.set(key, result)
+
+        return res
+
+
+class JSONBlock(BaseBlock):
+    """
+    Base class for the blocks which generate a JSON object. When LLM streams the completion,
+    generation is stopped as soon as the first object is closed or turns out to be malformed.
+    """
+
+    max_retries = 1
+
+    def create_output_parser(self) -> BaseOutputParser:
+        """
+        Creates parser of the completion. Must be implemented in the subclass.
+        """
+        raise NotImplementedError
+
+    @cached_property
+    def output_parser(self) -> BaseOutputParser:
+        return self.create_output_parser()
+
+    def _callbacks(self, handler: JSONStreamHandler) -> list[BaseCallbackHandler]:
+        # Events handler goes first, so it receives the closing token too.
+        return (block_callbacks(self.key) or []) + [handler]
+
+    @staticmethod
+    def _stopped_result(handler: JSONStreamHandler) -> str:
+        if handler.error is not None:
+            # Malformed completion goes to the parser, so it's repaired or generated again.
+            return handler.scanner.text
+
+        return handler.scanner.result
+
+    def _run_chain(self, llm_chain: LLMChain, params: dict) -> str:
+        from ..output_parsers.json_scanner import JSONStreamHandler, StopGeneration
+
+        handler = JSONStreamHandler()
+        try:
+            return llm_chain.run(callbacks=self._callbacks(handler), **params)
+        except StopGeneration:
+            return self._stopped_result(handler)
+
+    async def _arun_chain(self, llm_chain: LLMChain, params: dict) -> str:
+        from ..output_parsers.json_scanner import JSONStreamHandler, StopGeneration
+
+        handler = JSONStreamHandler()
+        try:
+            return await llm_chain.arun(callbacks=self._callbacks(handler), **params)
+        except StopGeneration:
+            return self._stopped_result(handler)
+
+    def transform_result(self, result: str) -> any:
+        return self.output_parser.parse(result)
+
+    def parse_result(self, result: str, document: Document) -> any:
+        """
+        Tries to repair the completion locally before the LLM is asked again.
+        """
+        from langchain.schema import OutputParserException
+
+        from ..output_parsers.repair import repair_json
+
+        try:
+            return self.transform_result(result)
+        except OutputParserException:
+            try:
+                with span("block.repair_json", key=self.key):
+                    repaired = repair_json(result)
+            except OutputParserException:
+                incr_stat(document.stats, "json_repair_failed")
+                raise
+
+            try:
+                res = self.transform_result(repaired)
+            except OutputParserException:
+                # Repaired JSON is rejected by the parser, e.g. by the schema validation.
+                incr_stat(document.stats, "json_rejected")
+                raise
+
+            incr_stat(document.stats, "json_repaired")
+
+            return res
@@ -1,11 +1,15 @@
-import json
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
-from langchain.llms.base import BaseLLM
-from langchain.prompts import PromptTemplate
 from pydantic import BaseModel
 
-from ..output_parsers import JSONSchemaOutputParser
-from .base import BaseBlock
+from .base import JSONBlock
+
+if TYPE_CHECKING:
+    from langchain.llms.base import BaseLLM
+
+    from ..output_parsers import JSONSchemaOutputParser
 
 
 class JSONSchemaBlockModel(BaseModel):
@@ -13,11 +17,19 @@ class JSONSchemaBlockModel(BaseModel):
     description: str
 
 
-class JSONSchemaBlock(BaseBlock):
+class JSONSchemaBlock(JSONBlock):
     model = JSONSchemaBlockModel
+    static_prompt = True
+
+    def create_output_parser(self) -> JSONSchemaOutputParser:
+        from ..output_parsers import JSONSchemaOutputParser
+
+        return JSONSchemaOutputParser()
 
     def create_prompt(self, llm: BaseLLM, **kwargs):
-        parser = JSONSchemaOutputParser()
+        from langchain.prompts import PromptTemplate
+
+        parser = self.output_parser
         return PromptTemplate(
             template="""Give me JSON Schema for {title}.
 {description}
@@ -27,6 +39,3 @@ class JSONSchemaBlock(BaseBlock):
             input_variables=["title", "description"],
             partial_variables={"format_instructions": parser.get_format_instructions()},
         )
-
-    def transform_result(self, result: str) -> any:
-        return json.loads(result)
@@ -1,11 +1,14 @@
-import json
+from __future__ import annotations
 
-from langchain.llms.base import BaseLLM
-from langchain.output_parsers import PydanticOutputParser
-from langchain.prompts import PromptTemplate
-from pydantic import BaseModel
+from typing import TYPE_CHECKING
 
-from .base import BaseBlock
+from pydantic import BaseModel, ValidationError
+
+from .base import JSONBlock
+
+if TYPE_CHECKING:
+    from langchain.llms.base import BaseLLM
+    from langchain.output_parsers import PydanticOutputParser
 
 
 class PydanticBlockModel(BaseModel):
@@ -14,11 +17,19 @@ class PydanticBlockModel(BaseModel):
     description: str = ""
 
 
-class PydanticBlock(BaseBlock):
+class PydanticBlock(JSONBlock):
     model = PydanticBlockModel
+    static_prompt = True
+
+    def create_output_parser(self) -> PydanticOutputParser:
+        from langchain.output_parsers import PydanticOutputParser
+
+        return PydanticOutputParser(pydantic_object=self.config.model)
 
     def create_prompt(self, llm: BaseLLM, **kwargs):
-        parser = PydanticOutputParser(pydantic_object=self.model)
+        from langchain.prompts import PromptTemplate
+
+        parser = self.output_parser
         return PromptTemplate(
             template="""
         Write {title} section of configuration file for {description}.
@@ -31,4 +42,16 @@ class PydanticBlock(BaseBlock):
         )
 
     def transform_result(self, result: str) -> any:
-        return json.loads(result)
+        from langchain.schema import OutputParserException
+
+        from ..output_parsers import parse_json_object
+
+        json_object = parse_json_object(result)
+        try:
+            self.config.model.parse_obj(json_object)
+        except ValidationError as e:
+            raise OutputParserException(
+                f"Failed to parse {self.config.model.__name__}. Completion {result}: {e}"
+            )
+
+        return json_object
@@ -1,10 +1,15 @@
-from langchain.llms.base import BaseLLM
-from langchain.prompts import PromptTemplate
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 from pydantic import BaseModel
 
 from ..documents import Document
 from .base import BaseBlock
 
+if TYPE_CHECKING:
+    from langchain.llms.base import BaseLLM
+
 
 class TextBlockModel(BaseModel):
     title: str
@@ -13,8 +18,11 @@ class TextBlockModel(BaseModel):
 
 class TextBlock(BaseBlock):
     model = TextBlockModel
+    static_prompt = True
+
+    def create_prompt(self, llm: BaseLLM, **kwargs):
+        from langchain.prompts import PromptTemplate
 
-    def create_prompt(self, document: Document, llm: BaseLLM, **kwargs):
         return PromptTemplate(
             template="""
         Write {title} section for {document_title} document.
@@ -24,8 +32,12 @@ class TextBlock(BaseBlock):
             input_variables=[
                 "title",
                 "description",
+                "document_title",
             ],
-            partial_variables={
-                "document_title": document.title,
-            },
         )
+
+    def get_params(self, document: Document) -> dict:
+        res = super().get_params(document)
+        res["document_title"] = document.title
+
+        return res
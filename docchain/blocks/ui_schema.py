@@ -1,21 +1,33 @@
-import json
+from __future__ import annotations
 
-from langchain.llms.base import BaseLLM
-from langchain.prompts import PromptTemplate
+from typing import TYPE_CHECKING
 
-from ..output_parsers import UISchemaOutputParser
-from .base import BaseBlock
+from .base import BaseBlock, JSONBlock
+
+if TYPE_CHECKING:
+    from langchain.llms.base import BaseLLM
+    from langchain.prompts import PromptTemplate
+
+    from ..output_parsers import UISchemaOutputParser
 
 
 class UISchemaBlockModel(BaseBlock.model):
     json_schema: str
 
 
-class UISchemaBlock(BaseBlock):
+class UISchemaBlock(JSONBlock):
     model = UISchemaBlockModel
+    static_prompt = True
+
+    def create_output_parser(self) -> UISchemaOutputParser:
+        from ..output_parsers import UISchemaOutputParser
+
+        return UISchemaOutputParser()
 
     def create_prompt(self, llm: BaseLLM, **kwargs) -> PromptTemplate:
-        parser = UISchemaOutputParser()
+        from langchain.prompts import PromptTemplate
+
+        parser = self.output_parser
 
         return PromptTemplate(
             template="""Generate form configuration for the following JSON Schema.
@@ -28,6 +40,3 @@ class UISchemaBlock(BaseBlock):
             input_variables=["json_schema"],
             partial_variables={"format_instructions": parser.get_format_instructions()},
         )
-
-    def transform_result(self, result: str) -> any:
-        return json.loads(result)
@@ -0,0 +1,185 @@
+"""
+Token budget of block LLM calls.
+
+Budget estimates the number of tokens in the rendered prompt and sizes max_tokens of the
+completion per block: a hint set on the block wins, otherwise the budget is derived from the
+sizes of previous completions of the block, and it's never larger than the space left in the
+context window. Blocks which prompts don't fit the context window are refused before the LLM
+is called.
+
+Tokens are counted with tiktoken when it's installed, otherwise they are estimated as one
+token per four characters.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict, defaultdict, deque
+from functools import cache
+from typing import TYPE_CHECKING
+
+from .exceptions import DocumentGenerationError
+from .settings import conf
+from .utils import copy_model
+
+if TYPE_CHECKING:
+    from langchain.chains import LLMChain
+    from langchain.llms.base import BaseLLM
+
+CHARS_PER_TOKEN = 4
+
+# Context windows of the known models, the longest matching prefix wins.
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "text-davinci-003": 4097,
+}
+
+
+class TokenBudgetExceeded(DocumentGenerationError):
+    pass
+
+
+@cache
+def _tiktoken():
+    # Imported on first use, as it's slow to import.
+    try:
+        import tiktoken
+    except ImportError:  # pragma: no cover
+        return None
+
+    return tiktoken
+
+
+@cache
+def _encoding(model_name: str):
+    tiktoken = _tiktoken()
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model_name: str = None) -> int:
+    if _tiktoken() is not None:
+        return len(_encoding(model_name or "").encode(text))
+
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def context_window(model_name: str = None) -> int:
+    if conf.context_window:
+        return conf.context_window
+
+    matches = [name for name in CONTEXT_WINDOWS if (model_name or "").startswith(name)]
+    if not matches:
+        return 4096
+
+    return CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+class TokenBudget:
+    """
+    Sizes max_tokens of the block LLM calls. History of completion sizes is kept per block key,
+    so the same budget is shared by all documents generated from the same specs.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = None,
+        min_tokens: int = 64,
+        margin: float = 1.5,
+        history_size: int = 20,
+        chain_cache_size: int = 128,
+    ):
+        self.max_tokens = max_tokens or conf.max_tokens
+        self.min_tokens = min_tokens
+        # Budget derived from the history is the largest seen completion times the margin.
+        self.margin = margin
+        self._history = defaultdict(lambda: deque(maxlen=history_size))
+        # Budgeted chains by the original chain and max_tokens, least recently used first.
+        self._chains = OrderedDict()
+        self.chain_cache_size = chain_cache_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _model_name(llm: BaseLLM) -> str | None:
+        return getattr(llm, "model_name", None)
+
+    def completion_tokens(self, block) -> int:
+        """
+        Returns the desired completion budget of the block, before the context window is
+        taken into account.
+        """
+        hint = getattr(block, "max_tokens", None)
+        if hint:
+            return hint
+
+        with self._lock:
+            history = list(self._history[block.key])
+        if not history:
+            return self.max_tokens
+
+        estimate = math.ceil(max(history) * self.margin)
+
+        return min(max(estimate, self.min_tokens), self.max_tokens)
+
+    def plan(self, block, prompt: str, llm: BaseLLM) -> int:
+        """
+        Returns max_tokens for the block call. Raises TokenBudgetExceeded if the prompt
+        leaves no room for the completion.
+        """
+        model_name = self._model_name(llm)
+        prompt_tokens = count_tokens(prompt, model_name)
+        available = context_window(model_name) - prompt_tokens
+        if available < self.min_tokens:
+            raise TokenBudgetExceeded(
+                f"Prompt of block {block.key} has {prompt_tokens} tokens and does not fit "
+                f"the context window of {model_name or 'the model'}."
+            )
+
+        return min(self.completion_tokens(block), available)
+
+    def apply(self, block, llm_chain: LLMChain, prompt: str) -> LLMChain:
+        """
+        Returns the chain which LLM has max_tokens set for the block call.
+        """
+        llm = llm_chain.llm
+        if not hasattr(llm, "max_tokens"):
+            return llm_chain
+
+        max_tokens = self.plan(block, prompt, llm)
+        if llm.max_tokens == max_tokens:
+            return llm_chain
+
+        key = (id(llm_chain), max_tokens)
+        with self._lock:
+            # Original chain is stored with the budgeted one, so its id is not reused.
+            cached_chain, chain = self._chains.get(key, (None, None))
+            if cached_chain is llm_chain:
+                self._chains.move_to_end(key)
+                return chain
+
+        from langchain.chains import LLMChain
+
+        chain = LLMChain(
+            prompt=llm_chain.prompt, llm=copy_model(llm, max_tokens=max_tokens)
+        )
+
+        with self._lock:
+            self._chains[key] = (llm_chain, chain)
+            if len(self._chains) > self.chain_cache_size:
+                self._chains.popitem(last=False)
+
+        return chain
+
+    def record(self, block, completion: str, llm: BaseLLM = None):
+        tokens = count_tokens(completion, self._model_name(llm))
+        with self._lock:
+            self._history[block.key].append(tokens)
+
+
+def default_token_budget_factory() -> TokenBudget:
+    return TokenBudget()
@@ -0,0 +1,170 @@
+"""
+Caches LLM responses for blocks.
+
+Responses are stored by a key which is a hash of the rendered prompt and the LLM parameters,
+so any change of the prompt or the model configuration results in a new LLM request.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from .settings import conf
+from .workspace import get_workspace
+
+if TYPE_CHECKING:
+    from langchain.llms.base import BaseLLM
+
+
+def cache_key(prompt: str, llm: "BaseLLM") -> str:
+    params = {"_type": llm._llm_type, **llm._identifying_params}
+    payload = json.dumps([prompt, params], sort_keys=True, default=str)
+
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class BaseCache:
+    def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str):
+        raise NotImplementedError
+
+
+class MemoryCache(BaseCache):
+    """
+    In-memory LRU cache.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            created, value = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class FSCache(BaseCache):
+    """
+    Persistent cache stored in the `path` directory of the workspace. Each entry is a JSON
+    file. The oldest entries are removed when the number of entries exceeds `max_size`.
+    """
+
+    def __init__(self, path: str = "cache", max_size: int = 10000, ttl: float = None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _fname(self, key: str) -> str:
+        return f"{self.path}/{key}.json"
+
+    def _load_index(self) -> OrderedDict:
+        """
+        Loads keys of the stored entries ordered by creation time.
+        """
+        if self._index is None:
+            workspace = get_workspace()
+            entries = []
+            if workspace.exists(self.path):
+                for info in workspace.fs.ls(workspace.path(self.path), detail=True):
+                    name = info["name"].rsplit("/", 1)[-1]
+                    if name.endswith(".json"):
+                        entries.append((info.get("mtime") or 0, name[: -len(".json")]))
+
+            self._index = OrderedDict(
+                (key, created) for created, key in sorted(entries)
+            )
+
+        return self._index
+
+    def get(self, key: str) -> str | None:
+        workspace = get_workspace()
+        fname = self._fname(key)
+        try:
+            with workspace.open(fname, mode="r") as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        if self.ttl is not None and time.time() - entry["created"] > self.ttl:
+            workspace.rm(fname)
+            with self._lock:
+                self._load_index().pop(key, None)
+
+            return None
+
+        return entry["value"]
+
+    def set(self, key: str, value: str):
+        workspace = get_workspace()
+        created = time.time()
+        with workspace.open(self._fname(key), mode="w") as file:
+            json.dump({"created": created, "value": value}, file)
+
+        with self._lock:
+            index = self._load_index()
+            index[key] = created
+            index.move_to_end(key)
+            expired = []
+            while len(index) > self.max_size:
+                expired.append(index.popitem(last=False)[0])
+
+        if expired:
+            workspace.rm(*[self._fname(key) for key in expired])
+
+
+class TieredCache(BaseCache):
+    """
+    Looks up the caches in order. Values found in the slower caches are copied to the faster
+    ones.
+    """
+
+    def __init__(self, *caches: BaseCache):
+        self.caches = caches
+
+    def get(self, key: str) -> str | None:
+        for i, cache in enumerate(self.caches):
+            value = cache.get(key)
+            if value is not None:
+                for faster in self.caches[:i]:
+                    faster.set(key, value)
+
+                return value
+
+        return None
+
+    def set(self, key: str, value: str):
+        for cache in self.caches:
+            cache.set(key, value)
+
+
+def default_cache_factory() -> BaseCache:
+    return TieredCache(
+        MemoryCache(max_size=conf.cache_max_size, ttl=conf.cache_ttl),
+        FSCache(max_size=conf.cache_max_size, ttl=conf.cache_ttl),
+    )
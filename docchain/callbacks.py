@@ -0,0 +1,66 @@
+"""
+LangChain callback handlers of the blocks. Kept apart, so langchain is imported only when blocks
+run.
+"""
+from typing import Any
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.callbacks.openai_info import (
+    MODEL_COST_PER_1K_TOKENS,
+    get_openai_token_cost_for_model,
+)
+from langchain.schema import LLMResult
+
+from .events import TokenChunk, get_listeners
+
+
+class TokenCallbackHandler(BaseCallbackHandler):
+    """
+    Emits new tokens of the block LLM call as TokenChunk events.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        # Async callbacks can be called in executor threads which don't share the context.
+        self.listeners = get_listeners()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        event = TokenChunk(key=self.key, text=token)
+        for listener in self.listeners:
+            listener(event)
+
+
+def _cost(model_name: str, tokens: int, is_completion: bool = False) -> float:
+    try:
+        return get_openai_token_cost_for_model(model_name, tokens, is_completion)
+    except ValueError:
+        return 0.0
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Sums token usage of the LLM calls of one block.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.cost = 0.0
+        self.requests = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        self.requests += 1
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage", {})
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+
+        self.model = llm_output.get("model_name") or self.model
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.total_tokens += usage.get("total_tokens", 0)
+        if self.model and self.model in MODEL_COST_PER_1K_TOKENS:
+            self.cost += _cost(self.model, prompt_tokens)
+            self.cost += _cost(self.model, completion_tokens, is_completion=True)
@@ -1,9 +1,13 @@
+from collections import ChainMap
+from collections.abc import Mapping
 from enum import Enum
 from pathlib import Path
 from typing import Any
 
 from pydantic import BaseModel, Field
 
+from .results import Results
+
 
 class Format(str, Enum):
     json = "json"
@@ -28,22 +32,23 @@ class Document(Section):
     included in other documents.
     """
 
-    res: dict[str, Any]
+    res: Results
     filename: Path | None = None
     stats: dict[str, int | float] = Field(default={})
     format: Format = Format.text
 
+    # Memoized serialization of the results, see docchain.serializers.
+
     @property
-    def context(self):
-        res = {
-            "doc": {
-                "title": self.title,
-                "summary": self.summary,
-                "text": self.text,
-                "filename": self.filename,
-            },
+    def context(self) -> Mapping[str, Any]:
+        """
+        Read-only view of the results for the templates. Results are not copied.
+        """
+        doc = {
+            "title": self.title,
+            "summary": self.summary,
+            "text": self.text,
+            "filename": self.filename,
         }
 
-        res.update(self.res)
-
-        return res
+        return ChainMap(self.res.view(), {"doc": doc})
@@ -0,0 +1,86 @@
+"""
+Events emitted during document generation.
+
+Listeners are registered for the current context with `listen`, so they receive events only
+from the generation started in this context, including blocks running in worker threads.
+Token chunks are emitted only by the LLMs which support streaming, e.g.
+ChatOpenAI(streaming=True).
+"""
+import contextlib
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel
+
+from .documents import Document
+from .stats import block_usage_handler
+from .utils import lazy_attributes
+
+if TYPE_CHECKING:
+    from langchain.callbacks.base import BaseCallbackHandler
+
+# Callback handlers are imported with langchain when blocks run.
+__getattr__ = lazy_attributes(__name__, {"TokenCallbackHandler": ".callbacks"})
+
+_listeners: ContextVar[tuple[Callable, ...]] = ContextVar(
+    "docchain_event_listeners", default=()
+)
+
+
+class Event(BaseModel):
+    pass
+
+
+class BlockStarted(Event):
+    key: str
+
+
+class TokenChunk(Event):
+    key: str
+    text: str
+
+
+class BlockFinished(Event):
+    key: str
+    result: Any
+
+
+class DocumentFinished(Event):
+    document: Document
+
+
+@contextlib.contextmanager
+def listen(listener: Callable[[Event], None]):
+    token = _listeners.set(_listeners.get() + (listener,))
+    try:
+        yield
+    finally:
+        _listeners.reset(token)
+
+
+def get_listeners() -> tuple[Callable, ...]:
+    return _listeners.get()
+
+
+def has_listeners() -> bool:
+    return bool(_listeners.get())
+
+
+def emit(event: Event):
+    for listener in _listeners.get():
+        listener(event)
+
+
+def block_callbacks(key: str) -> "list[BaseCallbackHandler] | None":
+    callbacks = []
+    if has_listeners():
+        from .callbacks import TokenCallbackHandler
+
+        callbacks.append(TokenCallbackHandler(key))
+
+    usage = block_usage_handler()
+    if usage is not None:
+        callbacks.append(usage)
+
+    return callbacks or None
@@ -1,47 +1,94 @@
+import asyncio
 import json
-import os
-import pickle
-from collections.abc import Iterable
-from copy import deepcopy
+import queue
+import threading
+import uuid
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from functools import cached_property, partial
 from logging import getLogger
+from typing import TYPE_CHECKING
 
-import yaml
-from langchain.llms.base import BaseLLM
-
-from .documents import Document, Format
+from .budget import TokenBudget
+from .cache import BaseCache
+from .documents import Document
+from .events import (
+    BlockFinished,
+    BlockStarted,
+    DocumentFinished,
+    Event,
+    emit,
+    listen,
+)
 from .exceptions import DocumentGenerationError
+from .middleware.base import build_handler
+from .plan import ExecutionPlan
+from .scheduler import arun_blocks, run_blocks
+from .serializers import serialize, write
 from .settings import conf
+from .singleflight import SingleFlight
+from .snapshots import (
+    SnapshotError,
+    dump_document,
+    dumps_value,
+    load_document,
+    loads_value,
+)
 from .specs import Spec
-from .utils import set_nested_val
+from .stats import block_stats, flush_stats
+from .tracing import ChromeTraceExporter, get_exporter, set_exporter, span
+from .utils import is_async_callable, sync_to_async
+from .workspace import get_workspace
+from .writer import close_writer, flush_writer, open_writer
+
+if TYPE_CHECKING:
+    from langchain.llms.base import BaseLLM
 
 logger = getLogger(__name__)
 
 
 class Generator:
-    def __init__(self, middleware: Iterable[callable] = None, llm: BaseLLM = None):
+    def __init__(
+        self,
+        middleware: Iterable[callable] = None,
+        llm: "BaseLLM" = None,
+        max_workers: int = None,
+        cache: BaseCache = None,
+        budget: TokenBudget = None,
+        single_flight: SingleFlight = None,
+    ):
+        if conf.trace_file and get_exporter() is None:
+            set_exporter(ChromeTraceExporter(conf.trace_file))
+
         self.middleware = middleware or []
-        handler = self.build_document
-        for step in self.middleware:
-            handler = step(handler)
 
         self.llm = llm or conf.default_llm_factory()
-        self.handler = handler
+        self.max_workers = max_workers or conf.max_workers
+        if cache is None and conf.cache_factory:
+            cache = conf.cache_factory()
+        self.cache = cache
+        if budget is None and conf.token_budget_factory:
+            budget = conf.token_budget_factory()
+        self.budget = budget
+        if single_flight is None and conf.coalesce_requests:
+            single_flight = SingleFlight()
+        self.single_flight = single_flight
+        # Background writers are shared, so they're closed with the last generator.
+        self._writer_user = open_writer(self)
 
-    @staticmethod
-    def format(spec: Spec):
-        doc = spec.doc
+    @cached_property
+    def handler(self) -> callable:
+        # Middleware chains are built on first use, most generators use only one of them.
+        return build_handler(self.middleware, self.build_document)
 
-        match spec.fmt:
-            case Format.json:
-                formatted = json.dumps(doc.res, indent=4)
-            case Format.yaml:
-                formatted = yaml.dump(doc.res, indent=4)
-            case Format.text:
-                formatted = [f"{key}\n\n{value}" for key, value in doc.res]
-            case _:
-                raise DocumentGenerationError(f"Unknown format: {spec.fmt}")
+    @cached_property
+    def ahandler(self) -> callable:
+        return build_handler(self.middleware, self.abuild_document)
 
-        return formatted
+    @staticmethod
+    def format(spec: Spec) -> str:
+        return serialize(spec.doc, spec.fmt)
 
     def _build_document(self, spec: Spec) -> Document:
         try:
@@ -57,28 +104,79 @@ class Generator:
 
         return document
 
+    async def _abuild_document(self, spec: Spec) -> Document:
+        try:
+            document = await self.ahandler(spec)
+        except Exception as exc:
+            if conf.debug:
+                logger.debug(spec.doc.res)
+
+            await asyncio.to_thread(self._maybe_save_wip, spec)
+            await asyncio.to_thread(self._maybe_save_snapshot, spec)
+
+            raise DocumentGenerationError("Document generation failed") from exc
+
+        return document
+
     def _maybe_save_wip(self, spec: Spec):
         """
         Save document in progress to workspace.
         """
-        if spec.doc and spec.doc.filename:
-            fs = conf.fs
-            fname = f"{conf.fs_workspace}/{spec.doc.filename}.wip"
-            fs.makedirs(os.path.dirname(fname), exist_ok=True)
-            with fs.open(fname, mode="w") as file:
-                file.write(self.format(spec))
+        if spec.doc and spec.filename:
+            with get_workspace().open(f"{spec.filename}.wip", mode="w") as file:
+                write(spec.doc, file, spec.fmt)
 
     @staticmethod
     def _maybe_save_snapshot(spec: Spec):
         """
-        Pickle document snapshot in the workspace.
+        Save document snapshot in the workspace.
+        """
+        if spec.doc and spec.filename:
+            workspace = get_workspace()
+            # Snapshot is replaced once written, so it's never left truncated.
+            fname = f"{spec.filename}.snapshot"
+            tmp = f"{fname}.{uuid.uuid4().hex}.tmp"
+            with workspace.open(
+                tmp, mode="w", compression=conf.snapshot_compression
+            ) as file:
+                dump_document(spec.doc, file)
+            workspace.mv(tmp, fname)
+
+            # Snapshot contains all results from the journal.
+            workspace.rm(f"{spec.filename}.journal")
+
+    @staticmethod
+    def _maybe_append_to_journal(spec: Spec, key: str, value: any):
+        """
+        Append result of the block to the document journal in the workspace, so it's not lost
+        even if the process is killed.
+        """
+        if spec.filename:
+            record = dumps_value({"key": key, "value": value})
+            get_workspace().append(f"{spec.filename}.journal", record + "\n")
+
+    @staticmethod
+    def _maybe_replay_journal(spec: Spec, doc: Document):
+        """
+        Restore results of the blocks from the document journal in the workspace.
         """
-        if spec.doc and spec.doc.filename:
-            fs = conf.fs
-            fname = f"{conf.fs_workspace}/{spec.doc.filename}.snapshot"
-            fs.makedirs(os.path.dirname(fname), exist_ok=True)
-            with fs.open(fname, mode="wb") as file:
-                file.write(pickle.dumps(spec.doc))
+        if spec.filename:
+            workspace = get_workspace()
+            fname = f"{spec.filename}.journal"
+            try:
+                journal = workspace.read_appended(fname)
+            except FileNotFoundError:
+                return
+
+            for line in journal.splitlines():
+                try:
+                    record = loads_value(line)
+                except json.JSONDecodeError:
+                    # The last record could be partially written.
+                    logger.warning(f"Skipping broken journal record in {fname}")
+                    continue
+
+                doc.res.set(record["key"], record["value"])
 
     @staticmethod
     def _maybe_restore_from_snapshot(spec: Spec) -> Document | None:
@@ -86,24 +184,285 @@ class Generator:
         Restore document from snapshot in the workspace.
         """
         if spec.filename:
-            fs = conf.fs
-            fname = f"{conf.fs_workspace}/{spec.filename}.snapshot"
-            if fs.exists(fname):
-                with fs.open(fname, mode="rb") as file:
-                    doc = pickle.loads(file.read())
-                return doc
+            workspace = get_workspace()
+            fname = f"{spec.filename}.snapshot"
+            try:
+                file = workspace.open(
+                    fname, mode="r", compression=conf.snapshot_compression
+                )
+            except FileNotFoundError:
+                return None
+
+            with file:
+                try:
+                    return load_document(file)
+                except SnapshotError as exc:
+                    logger.warning(f"Ignoring snapshot {fname}: {exc}")
 
         return None
 
+    @staticmethod
+    def plan(spec: Spec) -> ExecutionPlan:
+        """
+        Returns execution plan of the spec. Plan is built once and reused by all documents
+        generated from the spec or its copies.
+        """
+        # Copies which did not access the blocks use the blocks the plan was built for.
+        if spec.plan is None or (
+            not spec.shares_blocks and not spec.plan.matches(spec.blocks)
+        ):
+            spec.compile()
+
+        return spec.plan
+
+    def flush(self):
+        """
+        Waits for the background writes of documents and stats.
+        """
+        flush_writer()
+        flush_stats()
+
+    def close(self):
+        """
+        Waits for the background writes. Writer threads shared by the generators are stopped
+        when the last open generator is closed. They are started again if the generator is
+        used after close.
+        """
+        if not self._writer_user.alive:
+            self.flush()
+            return
+
+        last = close_writer(self._writer_user)
+        flush_stats(close=last)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def __call__(self, spec: Spec) -> Document:
+        # Plan is built before the spec is copied, so it's reused in the next calls.
+        self.plan(spec)
         # As generator can optionally modify spec, ensure it's working with a copy
-        spec_copy = deepcopy(spec)
-        doc = self._build_document(spec_copy)
+        with span("spec.copy"):
+            spec_copy = spec.copy()
+        with span("generate", spec=spec.name):
+            doc = self._build_document(spec_copy)
 
         return doc
 
-    def build_document(self, spec: Spec) -> Document:
-        doc = self._maybe_restore_from_snapshot(spec)
+    async def agenerate(self, spec: Spec) -> Document:
+        """
+        Async version of the generator call.
+        """
+        self.plan(spec)
+        with span("spec.copy"):
+            spec_copy = spec.copy()
+        with span("generate", spec=spec.name):
+            doc = await self._abuild_document(spec_copy)
+
+        return doc
+
+    def stream(self, spec: Spec) -> Iterator[Event]:
+        """
+        Generates document in a background thread and yields generation events. The last event
+        is DocumentFinished, the error is raised if generation fails.
+        """
+        events = queue.Queue()
+        finished = object()
+
+        def run():
+            with listen(events.put):
+                try:
+                    events.put(DocumentFinished(document=self(spec)))
+                except BaseException as exc:
+                    # Errors outside of the document build, e.g. of the plan, are raised
+                    # in the consumer too.
+                    events.put(exc)
+                finally:
+                    events.put(finished)
+
+        thread = threading.Thread(target=copy_context().run, args=(run,), daemon=True)
+        thread.start()
+
+        while (event := events.get()) is not finished:
+            if isinstance(event, BaseException):
+                raise event
+
+            yield event
+
+    async def astream(self, spec: Spec) -> AsyncIterator[Event]:
+        """
+        Async version of `stream`.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        finished = object()
+
+        def put(event):
+            # Events can be emitted from worker threads.
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        async def run():
+            with listen(put):
+                try:
+                    put(DocumentFinished(document=await self.agenerate(spec)))
+                except BaseException as exc:
+                    put(exc)
+                finally:
+                    put(finished)
+
+        task = asyncio.create_task(run())
+        while (event := await events.get()) is not finished:
+            if isinstance(event, BaseException):
+                raise event
+
+            yield event
+
+        await task
+
+    def generate_many(
+        self, specs: Iterable[Spec], concurrency: int = 1
+    ) -> Iterator[tuple[Spec, Document | Exception]]:
+        """
+        Generates documents for the specs on a pool of `concurrency` threads. Yields specs with
+        generated documents or errors in the order they are finished.
+        """
+        specs = iter(specs)
+        running = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                for spec in specs:
+                    running[executor.submit(copy_context().run, self, spec)] = spec
+                    if len(running) >= concurrency:
+                        break
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    spec = running.pop(future)
+                    try:
+                        res = future.result()
+                    except Exception as exc:
+                        # One failed spec doesn't stop the others.
+                        res = exc
+                    yield spec, res
+
+    async def agenerate_many(
+        self, specs: Iterable[Spec], concurrency: int = 1
+    ) -> AsyncIterator[tuple[Spec, Document | Exception]]:
+        """
+        Async version of `generate_many`.
+        """
+        specs = iter(specs)
+        running = {}
+        while True:
+            for spec in specs:
+                running[asyncio.create_task(self.agenerate(spec))] = spec
+                if len(running) >= concurrency:
+                    break
+
+            if not running:
+                break
+
+            finished, _ = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                spec = running.pop(task)
+                try:
+                    res = task.result()
+                except Exception as exc:
+                    res = exc
+                yield spec, res
+
+    @staticmethod
+    def _plan_blocks(
+        spec: Spec, plan: ExecutionPlan
+    ) -> tuple[Sequence, dict[int, int]]:
+        """
+        Returns blocks of the spec with their indexes in the plan. Copies which accessed their
+        blocks run them, e.g. with the attributes changed by middleware.
+        """
+        blocks = plan.blocks if spec.shares_blocks else spec.blocks
+
+        return blocks, {id(block): i for i, block in enumerate(blocks)}
+
+    def _call_block(
+        self,
+        block,
+        document: Document,
+        plan: ExecutionPlan,
+        indexes: dict[int, int],
+    ) -> any:
+        emit(BlockStarted(key=block.key))
+        with span("block", key=block.key, type=type(block).__name__), block_stats(
+            block
+        ):
+            res = block(
+                document=document,
+                llm=self.llm,
+                cache=self.cache,
+                chain=plan.chain(block, self.llm, indexes[id(block)]),
+                budget=self.budget,
+                single_flight=self.single_flight,
+            )
+        emit(BlockFinished(key=block.key, result=res))
+
+        return res
+
+    async def _acall_block(
+        self,
+        block,
+        document: Document,
+        plan: ExecutionPlan,
+        indexes: dict[int, int],
+    ) -> any:
+        if hasattr(block, "acall"):
+            call = block.acall
+        elif is_async_callable(block):
+            call = block
+        else:
+            call = sync_to_async(block)
+
+        emit(BlockStarted(key=block.key))
+        with span("block", key=block.key, type=type(block).__name__), block_stats(
+            block
+        ):
+            res = await call(
+                document=document,
+                llm=self.llm,
+                cache=self.cache,
+                chain=plan.chain(block, self.llm, indexes[id(block)]),
+                budget=self.budget,
+                single_flight=self.single_flight,
+            )
+        emit(BlockFinished(key=block.key, result=res))
+
+        return res
+
+    def _start_document(self, spec: Spec) -> Document:
+        snapshot = wip = False
+        journal = []
+        if spec.filename:
+            workspace = get_workspace()
+            fname = f"{spec.filename}.journal"
+            # Files could be written by other processes, e.g. a worker which died, so they
+            # are checked directly and at once, not in the cached listing.
+            snapshot, wip, *journal = workspace.exists_many(
+                [
+                    f"{spec.filename}.snapshot",
+                    f"{spec.filename}.wip",
+                    fname,
+                    workspace.segments_dir(fname),
+                ],
+                cached=False,
+            )
+
+        doc = self._maybe_restore_from_snapshot(spec) if snapshot else None
         if not doc:
             doc = Document(
                 title=spec.title,
@@ -111,25 +470,73 @@ class Generator:
                 format=spec.fmt,
                 res={},
             )
+        if any(journal):
+            self._maybe_replay_journal(spec, doc)
         spec.doc = doc
 
-        # maybe remove wip and snapshot files
-        fs = conf.fs
-        wip_fname = f"{conf.fs_workspace}/{spec.filename}.wip"
-        fs.exists(wip_fname) and fs.rm(wip_fname)
-        snapshot_fname = f"{conf.fs_workspace}/{spec.filename}.snapshot"
-        fs.exists(snapshot_fname) and fs.rm(snapshot_fname)
+        # maybe remove wip file, snapshot and journal are kept until the document is built
+        if wip:
+            get_workspace().rm(f"{spec.filename}.wip")
 
-        for block in spec.blocks:
-            if block.key in doc.res:
-                continue
+        return doc
 
-            res = block(
-                document=doc,
-                llm=self.llm,
+    @staticmethod
+    def _finish_document(spec: Spec):
+        """
+        Remove snapshot and journal of the built document, unless they are kept until the
+        document is saved.
+        """
+        if spec.filename and not spec.keep_snapshot:
+            get_workspace().rm(f"{spec.filename}.snapshot", f"{spec.filename}.journal")
+
+    def _on_block_result(self, spec: Spec) -> callable:
+        def on_result(key: str, value: any):
+            self._maybe_append_to_journal(spec, key, value)
+
+        return on_result
+
+    def build_document(self, spec: Spec) -> Document:
+        with span("document.start"):
+            doc = self._start_document(spec)
+
+        plan = self.plan(spec)
+        blocks, indexes = self._plan_blocks(spec, plan)
+        with span("document.blocks"):
+            run_blocks(
+                blocks,
+                doc,
+                call=partial(self._call_block, plan=plan, indexes=indexes),
+                max_workers=self.max_workers,
+                on_result=self._on_block_result(spec),
+                dependencies=plan.dependencies,
+            )
+
+        with span("document.format", format=spec.fmt):
+            doc.text = self.format(spec)
+        with span("document.finish"):
+            self._finish_document(spec)
+
+        return doc
+
+    async def abuild_document(self, spec: Spec) -> Document:
+        with span("document.start"):
+            doc = await asyncio.to_thread(self._start_document, spec)
+
+        plan = self.plan(spec)
+        blocks, indexes = self._plan_blocks(spec, plan)
+        with span("document.blocks"):
+            await arun_blocks(
+                blocks,
+                doc,
+                call=partial(self._acall_block, plan=plan, indexes=indexes),
+                max_workers=self.max_workers,
+                on_result=self._on_block_result(spec),
+                dependencies=plan.dependencies,
             )
-            set_nested_val(doc.res, block.key, res)
 
-        doc.text = self.format(spec)
+        with span("document.format", format=spec.fmt):
+            doc.text = self.format(spec)
+        with span("document.finish"):
+            await asyncio.to_thread(self._finish_document, spec)
 
         return doc
@@ -12,7 +12,7 @@ See an example of Function step below.
     def mark_as_draft(build_document):
         def run(spec: Spec):
             # Modify Spec
-            spec.document_title = f"WIP: {spec.document_title}"
+            spec.title = f"WIP: {spec.title}"
             document = build_document(spec)
             # Modify Doc
             document.title += " (Draft)"
@@ -20,13 +20,43 @@ See an example of Function step below.
             return document
 
         return run
+
+Function steps can also be async. Sync and async steps can be mixed in one Generator,
+which can be used both with `Generator.__call__` and `Generator.agenerate`.
+
+    def mark_as_reviewed(build_document):
+        async def run(spec: Spec):
+            document = await build_document(spec)
+            document.title += " (Reviewed)"
+
+            return document
+
+        return run
 """
-from .base import AbstractMiddleware
-from .collect_openai_stats import collect_openai_stats
-from .save_document import SaveDocumentMiddleware
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
 
 __all__ = [
     "AbstractMiddleware",
     "collect_openai_stats",
+    "collect_stats",
     "SaveDocumentMiddleware",
 ]
+
+# Middleware is imported on first access.
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "AbstractMiddleware": ".base",
+        "collect_openai_stats": ".collect_openai_stats",
+        "collect_stats": ".collect_stats",
+        "SaveDocumentMiddleware": ".save_document",
+    },
+)
+
+if TYPE_CHECKING:
+    from .base import AbstractMiddleware
+    from .collect_openai_stats import collect_openai_stats
+    from .collect_stats import collect_stats
+    from .save_document import SaveDocumentMiddleware
@@ -1,15 +1,44 @@
+from collections.abc import Iterable
+
 from ..documents import Document
 from ..specs import Spec
+from ..tracing import trace_handler
+from ..utils import (
+    async_to_sync,
+    await_sync,
+    is_async_callable,
+    maybe_await,
+    sync_to_async,
+)
 
 
 class AbstractMiddleware:
+    """
+    Works in both sync and async generation. `spec_pass` and `doc_pass` can be defined
+    as coroutines.
+    """
+
     def __init__(self, build_document: callable):
         self.build_document = build_document
 
+    @property
+    def is_async(self) -> bool:
+        return is_async_callable(self.build_document)
+
     def __call__(self, spec: Spec):
-        self.spec_pass(spec)
+        if self.is_async:
+            return self.acall(spec)
+
+        await_sync(self.spec_pass(spec))
         document = self.build_document(spec)
-        self.doc_pass(document)
+        await_sync(self.doc_pass(document))
+
+        return document
+
+    async def acall(self, spec: Spec):
+        await maybe_await(self.spec_pass(spec))
+        document = await self.build_document(spec)
+        await maybe_await(self.doc_pass(document))
 
         return document
 
@@ -24,3 +53,48 @@ class AbstractMiddleware:
         Can be used to transform generated doc.
         """
         pass
+
+
+class _Handler:
+    """
+    Handler passed to the middleware step, which is adapted to the step after it's created.
+    """
+
+    def __init__(self, handler: callable):
+        self.handler = handler
+        self.is_async = is_async_callable(handler)
+
+    def adapt(self, is_async: bool):
+        self.handler = (sync_to_async if is_async else async_to_sync)(self.handler)
+        self.is_async = is_async
+
+    def __call__(self, *args, **kwargs):
+        return self.handler(*args, **kwargs)
+
+
+def wrap_handler(step: callable, handler: callable) -> callable:
+    """
+    Wraps handler with the middleware step. Sync function steps can wrap async handlers
+    and the other way around. The step is called once.
+    """
+    inner = _Handler(handler)
+    wrapped = step(inner)
+    if inner.is_async and not is_async_callable(wrapped):
+        # Sync step runs in a worker thread and calls the handler on the event loop.
+        inner.adapt(is_async=False)
+        return sync_to_async(wrapped)
+
+    if not inner.is_async and is_async_callable(wrapped):
+        inner.adapt(is_async=True)
+        return async_to_sync(wrapped)
+
+    return wrapped
+
+
+def build_handler(middleware: Iterable[callable], handler: callable) -> callable:
+    for step in middleware:
+        wrapped = wrap_handler(step, handler)
+        name = getattr(step, "__name__", type(step).__name__)
+        handler = trace_handler(name, wrapped, is_async_callable(wrapped))
+
+    return handler
@@ -6,6 +6,7 @@ from langchain.callbacks import get_openai_callback
 from docchain.specs import Spec
 
 from ..settings import conf
+from ..workspace import get_workspace
 
 logger = getLogger(__name__)
 
@@ -15,20 +16,18 @@ def collect_openai_stats(build_document):
         with get_openai_callback() as cb:
             document = build_document(spec)
 
+        stats = {
+            "total_tokens": cb.total_tokens,
+            "prompt_tokens": cb.prompt_tokens,
+            "completion_tokens": cb.completion_tokens,
+            "successful_requests": cb.successful_requests,
+            "total_cost": cb.total_cost,
+        }
         if document.filename and conf.debug:
-            with conf.fs.open(
-                f"{conf.fs_workspace}/{document.filename}.stats", "w+"
-            ) as file:
-                stats = {
-                    "total_tokens": cb.total_tokens,
-                    "prompt_tokens": cb.prompt_tokens,
-                    "completion_tokens": cb.completion_tokens,
-                    "successful_requests": cb.successful_requests,
-                    "total_cost": cb.total_cost,
-                }
+            with get_workspace().open(f"{document.filename}.stats", "w+") as file:
                 file.write(json.dumps(stats))
 
-        document.stats = stats
+        document.stats.update(stats)
 
         return document
 
@@ -0,0 +1,81 @@
+import time
+import uuid
+from collections import Counter
+from logging import getLogger
+
+from ..documents import Document
+from ..specs import Spec
+from ..stats import StatsCollector, collect, get_stats_store
+from ..utils import is_async_callable
+
+logger = getLogger(__name__)
+
+_TOTALS = ("prompt_tokens", "completion_tokens", "total_tokens", "cost", "requests")
+
+
+def _record(
+    spec: Spec, document: Document | None, collector: StatsCollector, start: float
+):
+    run_id = uuid.uuid4().hex
+    created_at = time.time()
+    blocks = [
+        {"run_id": run_id, "created_at": created_at, "spec_name": spec.name, **block}
+        for block in collector.blocks
+    ]
+    models = Counter(block["model"] for block in blocks if block["model"])
+    stats = document.stats if document is not None else {}
+    row = {
+        "run_id": run_id,
+        "created_at": created_at,
+        "spec_name": spec.name,
+        "filename": str(spec.filename) if spec.filename else None,
+        "model": models.most_common(1)[0][0] if models else None,
+        "latency": time.perf_counter() - start,
+        "retries": sum(block["retries"] for block in blocks),
+        "cache_hits": stats.get("cache_hits", 0),
+        "cache_misses": stats.get("cache_misses", 0),
+        "failed": int(document is None),
+        **{name: sum(block[name] for block in blocks) for name in _TOTALS},
+    }
+
+    get_stats_store().record(row, blocks)
+
+
+def _try_record(
+    spec: Spec, document: Document | None, collector: StatsCollector, start: float
+):
+    # Stats must not replace the result or the error of the generation.
+    try:
+        _record(spec, document, collector, start)
+    except Exception:
+        logger.exception(f"Failed to record stats of {spec.name}")
+
+
+def collect_stats(build_document):
+    """
+    Records stats of the document and its blocks in the SQLite stats store.
+    """
+
+    def run(spec: Spec):
+        start = time.perf_counter()
+        document = None
+        with collect() as collector:
+            try:
+                document = build_document(spec)
+            finally:
+                _try_record(spec, document, collector, start)
+
+        return document
+
+    async def arun(spec: Spec):
+        start = time.perf_counter()
+        document = None
+        with collect() as collector:
+            try:
+                document = await build_document(spec)
+            finally:
+                _try_record(spec, document, collector, start)
+
+        return document
+
+    return arun if is_async_callable(build_document) else run
@@ -1,14 +1,50 @@
+from functools import partial
+
 from ..documents import Document
 from ..settings import conf
+from ..specs import Spec
+from ..workspace import get_workspace
+from ..writer import get_writer
 from .base import AbstractMiddleware
 
 
 class SaveDocumentMiddleware(AbstractMiddleware):
     """
-    Saves document in the workspace as a text file.
+    Saves document in the workspace as a text file. In the write-behind mode documents are
+    written by the background writer, so generation does not wait for the storage. Snapshot
+    and journal of the document are kept until it's written, so the document which failed
+    to be written is restored by the next run.
     """
 
+    # Uses save_write_behind setting if None.
+    write_behind: bool | None = None
+
+    @property
+    def is_write_behind(self) -> bool:
+        if self.write_behind is None:
+            return conf.save_write_behind
+
+        return self.write_behind
+
+    def spec_pass(self, spec: Spec):
+        if self.is_write_behind:
+            # Document is restored from the snapshot if it's not written.
+            spec.keep_snapshot = True
+
     def doc_pass(self, document: Document):
         if document.filename:
-            with conf.fs.open(f"{conf.fs_workspace}/{document.filename}", "w") as file:
-                file.write(document.text)
+            if self.is_write_behind:
+                get_writer().submit(
+                    get_workspace(),
+                    document.filename,
+                    document.text,
+                    document.stats,
+                    on_written=partial(_remove_snapshot, document.filename),
+                )
+            else:
+                with get_workspace().open(document.filename, "w") as file:
+                    file.write(document.text)
+
+
+def _remove_snapshot(filename: str):
+    get_workspace().rm(f"{filename}.snapshot", f"{filename}.journal")
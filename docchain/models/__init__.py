@@ -0,0 +1,26 @@
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
+
+__all__ = [
+    "LLMPool",
+    "SimulatedLLM",
+    "llm_factory",
+    "pool_llm_factory",
+]
+
+# Models are imported on first access, as they depend on langchain and openai.
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "LLMPool": ".pool",
+        "SimulatedLLM": ".simulated",
+        "llm_factory": ".gpt",
+        "pool_llm_factory": ".pool",
+    },
+)
+
+if TYPE_CHECKING:
+    from .gpt import llm_factory
+    from .pool import LLMPool, pool_llm_factory
+    from .simulated import SimulatedLLM
@@ -1,5 +1,14 @@
-from langchain.chat_models import ChatOpenAI
+from ..settings import conf
 
 
-def llm_factory():
-    return ChatOpenAI(model_name="gpt-3.5-turbo-0301", temperature=0.5, max_tokens=2048)
+def llm_factory(**kwargs):
+    # Imported here, so settings which refer to the factory don't import langchain.
+    from langchain.chat_models import ChatOpenAI
+
+    params = {
+        "model_name": "gpt-3.5-turbo-0301",
+        "temperature": 0.5,
+        "max_tokens": conf.max_tokens,
+    }
+
+    return ChatOpenAI(**params | kwargs)
@@ -0,0 +1,387 @@
+"""
+Pool of LLM clients, e.g. with different API keys, endpoints or deployments.
+
+Each request goes to one member of the pool: the one with the least outstanding requests
+relative to its weight, or the next one in the smooth weighted round robin order. Members
+which fail `failure_threshold` times in a row are taken out of rotation for `reset_timeout`
+seconds, then a single trial request decides whether they are back. Requests failed by
+transient errors, e.g. rate limits or timeouts, are retried on the other members unless the
+member has streamed tokens already. Other errors are raised at once and don't count as
+failures of the member.
+
+    pool = LLMPool(members=[ChatOpenAI(openai_api_key=key) for key in keys])
+
+Configure the default pool with `DOCCHAIN_LLM_POOL` and use it as the default LLM:
+
+    DOCCHAIN_DEFAULT_LLM_FACTORY=docchain.models.pool.pool_llm_factory
+    DOCCHAIN_LLM_POOL='[{"openai_api_key": "...", "weight": 2}, {"openai_api_key": "..."}]'
+"""
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.base_language import BaseLanguageModel
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.callbacks.manager import Callbacks
+from langchain.prompts.base import StringPromptValue
+from langchain.schema import LLMResult, PromptValue
+from pydantic import Field, PrivateAttr
+
+from ..settings import conf
+from ..utils import copy_model
+
+
+class LLMPoolUnavailable(Exception):
+    pass
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """
+    Whether the request could succeed on another member: rate limits, timeouts, connection
+    and server errors.
+    """
+    from openai.error import (
+        APIConnectionError,
+        OpenAIError,
+        RateLimitError,
+        ServiceUnavailableError,
+        Timeout,
+        TryAgain,
+    )
+
+    if isinstance(
+        exc,
+        (
+            APIConnectionError,
+            RateLimitError,
+            ServiceUnavailableError,
+            Timeout,
+            TryAgain,
+            TimeoutError,
+            ConnectionError,
+        ),
+    ):
+        return True
+
+    return isinstance(exc, OpenAIError) and (exc.http_status or 0) >= 500
+
+
+class _StreamTracker(BaseCallbackHandler):
+    """
+    Records whether the member streamed tokens to the callbacks.
+    """
+
+    def __init__(self):
+        self.streamed = False
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self.streamed = True
+
+
+def _with_handler(callbacks: Callbacks, handler: BaseCallbackHandler) -> Callbacks:
+    if callbacks is None:
+        return [handler]
+    if isinstance(callbacks, list):
+        return callbacks + [handler]
+
+    return type(callbacks)(
+        handlers=callbacks.handlers + [handler],
+        inheritable_handlers=callbacks.inheritable_handlers,
+        parent_run_id=callbacks.parent_run_id,
+    )
+
+
+class PoolMember:
+    """
+    Member of the pool with its circuit breaker and stats.
+    """
+
+    def __init__(self, llm: BaseLanguageModel, weight: float = 1.0, name: str = None):
+        self.llm = llm
+        self.weight = weight
+        self.name = name
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.circuit_opened = 0
+        self.latency = 0.0
+        self.opened_at: float | None = None
+        self.trial = False
+        # Current weight of the smooth weighted round robin.
+        self.current_weight = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+
+        return "half_open" if self.trial else "open"
+
+    def available(self, now: float, reset_timeout: float) -> bool:
+        if self.opened_at is None:
+            return True
+
+        # Single trial request is let through after the reset timeout.
+        return not self.trial and now - self.opened_at >= reset_timeout
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit_opened": self.circuit_opened,
+            "avg_latency": self.latency / self.requests if self.requests else None,
+        }
+
+
+class LLMPool(BaseLanguageModel):
+    members: list[BaseLanguageModel]
+    weights: list[float] | None = None
+    strategy: str = Field(
+        default="least_outstanding", description="One of least_outstanding, weighted."
+    )
+    failure_threshold: int = 3
+    reset_timeout: float = 30.0
+    max_tokens: int | None = Field(
+        default=None,
+        description="Overrides max_tokens of the members, e.g. by the budget.",
+    )
+    callbacks: Callbacks = Field(default=None, exclude=True)
+
+    _pool: list[PoolMember] = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if not self.members:
+            raise ValueError("LLM pool must have at least one member.")
+        if self.strategy not in ("least_outstanding", "weighted"):
+            raise ValueError(f"Unknown strategy: {self.strategy}")
+
+        weights = self.weights or [1.0] * len(self.members)
+        self._pool = [
+            PoolMember(llm, weight, name=f"{i}:{getattr(llm, '_llm_type', '')}")
+            for i, (llm, weight) in enumerate(zip(self.members, weights))
+        ]
+
+    @property
+    def _llm_type(self) -> str:
+        return "pool"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        # Members are expected to run the same model, so responses are cached across them.
+        llm = self.members[0]
+        params = dict(getattr(llm, "_identifying_params", {}))
+        if self.max_tokens is not None:
+            params["max_tokens"] = self.max_tokens
+
+        return {"_member_type": getattr(llm, "_llm_type", None), **params}
+
+    @property
+    def model_name(self) -> str | None:
+        return getattr(self.members[0], "model_name", None)
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [member.stats() for member in self._pool]
+
+    def _acquire(self, excluded: set[int]) -> tuple[int, PoolMember]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                (i, member)
+                for i, member in enumerate(self._pool)
+                if i not in excluded and member.available(now, self.reset_timeout)
+            ]
+            if not candidates:
+                raise LLMPoolUnavailable("All members of the LLM pool are unavailable.")
+
+            if self.strategy == "weighted":
+                total = sum(member.weight for _, member in candidates)
+                for _, member in candidates:
+                    member.current_weight += member.weight
+                i, member = max(candidates, key=lambda item: item[1].current_weight)
+                member.current_weight -= total
+            else:
+                i, member = min(
+                    candidates,
+                    key=lambda item: (item[1].outstanding + 1) / item[1].weight,
+                )
+
+            if member.opened_at is not None:
+                member.trial = True
+            member.outstanding += 1
+            member.requests += 1
+
+            return i, member
+
+    def _release(self, member: PoolMember, started: float, failed: bool | None):
+        """
+        Records the outcome of the request. None is used for the errors which don't tell
+        whether the member works, so its circuit is left as is.
+        """
+        with self._lock:
+            member.outstanding -= 1
+            member.latency += time.monotonic() - started
+            member.trial = False
+            if failed is None:
+                return
+
+            if not failed:
+                member.consecutive_failures = 0
+                member.opened_at = None
+                return
+
+            member.failures += 1
+            member.consecutive_failures += 1
+            if (
+                member.opened_at is not None
+                or member.consecutive_failures >= self.failure_threshold
+            ):
+                if member.opened_at is None:
+                    member.circuit_opened += 1
+                member.opened_at = time.monotonic()
+
+    def _member_llm(self, member: PoolMember) -> BaseLanguageModel:
+        llm = member.llm
+        if self.max_tokens is None or getattr(llm, "max_tokens", None) in (
+            None,
+            self.max_tokens,
+        ):
+            return llm
+
+        return copy_model(llm, max_tokens=self.max_tokens)
+
+    def _call_member(
+        self, call: Callable[[BaseLanguageModel, Callbacks], Any], callbacks: Callbacks
+    ) -> Any:
+        excluded = set()
+        while True:
+            i, member = self._acquire(excluded)
+            tracker = _StreamTracker()
+            started = time.monotonic()
+            try:
+                res = call(self._member_llm(member), _with_handler(callbacks, tracker))
+            except Exception as exc:
+                if not self._failover(i, member, started, exc, tracker, excluded):
+                    raise
+                continue
+            except BaseException:
+                # E.g. generation stopped by the callbacks after the member streamed tokens.
+                self._release(
+                    member, started, failed=False if tracker.streamed else None
+                )
+                raise
+
+            self._release(member, started, failed=False)
+
+            return res
+
+    async def _acall_member(
+        self,
+        call: Callable[[BaseLanguageModel, Callbacks], Awaitable],
+        callbacks: Callbacks,
+    ) -> Any:
+        excluded = set()
+        while True:
+            i, member = self._acquire(excluded)
+            tracker = _StreamTracker()
+            started = time.monotonic()
+            try:
+                res = await call(
+                    self._member_llm(member), _with_handler(callbacks, tracker)
+                )
+            except Exception as exc:
+                if not self._failover(i, member, started, exc, tracker, excluded):
+                    raise
+                continue
+            except BaseException:
+                self._release(
+                    member, started, failed=False if tracker.streamed else None
+                )
+                raise
+
+            self._release(member, started, failed=False)
+
+            return res
+
+    def _failover(
+        self,
+        i: int,
+        member: PoolMember,
+        started: float,
+        exc: Exception,
+        tracker: "_StreamTracker",
+        excluded: set[int],
+    ) -> bool:
+        """
+        Releases the failed member. Returns whether the request is retried on another one.
+        """
+        # Errors of the request itself, e.g. context length exceeded, fail on every member.
+        transient = is_transient_error(exc)
+        self._release(member, started, failed=True if transient else None)
+        excluded.add(i)
+
+        # Tokens streamed to the callbacks can't be taken back, so they are not repeated.
+        return transient and not tracker.streamed and len(excluded) < len(self._pool)
+
+    def generate_prompt(
+        self,
+        prompts: list[PromptValue],
+        stop: list[str] | None = None,
+        callbacks: Callbacks = None,
+    ) -> LLMResult:
+        return self._call_member(
+            lambda llm, callbacks: llm.generate_prompt(
+                prompts, stop=stop, callbacks=callbacks
+            ),
+            callbacks or self.callbacks,
+        )
+
+    async def agenerate_prompt(
+        self,
+        prompts: list[PromptValue],
+        stop: list[str] | None = None,
+        callbacks: Callbacks = None,
+    ) -> LLMResult:
+        return await self._acall_member(
+            lambda llm, callbacks: llm.agenerate_prompt(
+                prompts, stop=stop, callbacks=callbacks
+            ),
+            callbacks or self.callbacks,
+        )
+
+    def __call__(self, prompt: str, stop: list[str] | None = None) -> str:
+        result = self.generate_prompt([StringPromptValue(text=prompt)], stop=stop)
+
+        return result.generations[0][0].text
+
+
+def pool_llm_factory() -> LLMPool:
+    """
+    Creates the pool of ChatOpenAI members configured with the llm_pool setting.
+    """
+    from .gpt import llm_factory
+
+    members = []
+    weights = []
+    for params in conf.llm_pool:
+        params = dict(params)
+        weights.append(float(params.pop("weight", 1.0)))
+        members.append(llm_factory(**params))
+
+    return LLMPool(
+        members=members,
+        weights=weights,
+        strategy=conf.llm_pool_strategy,
+        failure_threshold=conf.llm_pool_failure_threshold,
+        reset_timeout=conf.llm_pool_reset_timeout,
+    )
@@ -0,0 +1,348 @@
+"""
+Local stand-in of a provider LLM for load testing.
+
+SimulatedLLM responds after a random latency, streams tokens at a given rate, injects rate limit
+errors and timeouts and enforces requests and tokens per minute limits. Like the OpenAI LLMs,
+it retries rate limit errors and timeouts with exponential backoff. Copies of the LLM, e.g. the
+ones made by LLMChain, share the limits, the stats and the random generator.
+
+    llm = SimulatedLLM(latency=0.8, latency_stddev=0.3, tokens_per_second=50, rpm=60)
+"""
+import asyncio
+import itertools
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain.llms.base import BaseLLM
+from langchain.schema import Generation, LLMResult
+from openai.error import RateLimitError, Timeout
+from pydantic import Field, PrivateAttr
+
+from ..budget import CHARS_PER_TOKEN, count_tokens
+
+_CHUNKS = re.compile(r"\s*\S+")
+
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua."
+)
+
+
+class SimulationStats:
+    """
+    Counters of the simulated requests. Tokens are counted for the requests billed by the
+    provider, including the timed out ones.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.successful = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.wasted_tokens = 0
+        self._lock = threading.Lock()
+
+    def incr(self, **values: int):
+        with self._lock:
+            for name, value in values.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def dict(self) -> dict[str, int]:
+        return {
+            name: value
+            for name, value in vars(self).items()
+            if not name.startswith("_")
+        } | {"total_tokens": self.total_tokens}
+
+
+class RateLimiter:
+    """
+    Sliding window limits of requests and tokens per minute.
+    """
+
+    def __init__(self, rpm: int = None, tpm: int = None, window: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._requests = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            while self._requests and self._requests[0][0] <= now - self.window:
+                self._tokens -= self._requests.popleft()[1]
+
+            if self.rpm and len(self._requests) >= self.rpm:
+                return False
+            if self.tpm and self._tokens + tokens > self.tpm:
+                return False
+
+            self._requests.append((now, tokens))
+            self._tokens += tokens
+
+            return True
+
+
+class _Request:
+    def __init__(
+        self, prompt_tokens: int, chunks: list[str], latency: float, timeout: bool
+    ):
+        self.prompt_tokens = prompt_tokens
+        self.chunks = chunks
+        self.latency = latency
+        self.timeout = timeout
+        self.streamed = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.streamed)
+
+
+class SimulatedLLM(BaseLLM):
+    responses: list[str] = Field(
+        default_factory=list, description="Responses returned in order, in a loop."
+    )
+    completion_tokens: int = Field(
+        default=200, description="Number of words generated if no responses given."
+    )
+    model_name: str = "simulated"
+    max_tokens: int | None = None
+    latency: float = Field(default=0.5, description="Mean time to the first token.")
+    latency_stddev: float = 0.0
+    latency_distribution: str = Field(
+        default="lognormal",
+        description="One of constant, normal, lognormal, exponential.",
+    )
+    tokens_per_second: float | None = Field(
+        default=None,
+        description="Generation speed. Tokens are generated at once if None.",
+    )
+    streaming: bool = False
+    error_rate: float = Field(default=0.0, description="Probability of 429 responses.")
+    timeout_rate: float = Field(default=0.0, description="Probability of timeouts.")
+    request_timeout: float = 10.0
+    rpm: int | None = None
+    tpm: int | None = None
+    max_retries: int = 6
+    retry_min_wait: float = 1.0
+    retry_max_wait: float = 10.0
+    seed: int | None = None
+    stats: SimulationStats = Field(default_factory=SimulationStats)
+
+    _random: random.Random = PrivateAttr()
+    _limiter: RateLimiter = PrivateAttr()
+    _responses: Any = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._random = random.Random(self.seed)
+        self._limiter = RateLimiter(self.rpm, self.tpm)
+        self._responses = itertools.cycle(self.responses) if self.responses else None
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name, "max_tokens": self.max_tokens}
+
+    def _sample_latency(self) -> float:
+        mean, stddev = self.latency, self.latency_stddev
+        match self.latency_distribution:
+            case "constant":
+                return mean
+            case "normal":
+                return max(self._random.gauss(mean, stddev), 0.0)
+            case "exponential":
+                return self._random.expovariate(1 / mean) if mean > 0 else 0.0
+            case "lognormal":
+                if mean <= 0 or stddev <= 0:
+                    return mean
+                sigma2 = math.log(1 + (stddev / mean) ** 2)
+                return self._random.lognormvariate(
+                    math.log(mean) - sigma2 / 2, sigma2**0.5
+                )
+            case _:
+                raise ValueError(
+                    f"Unknown latency distribution: {self.latency_distribution}"
+                )
+
+    def _response(self) -> str:
+        if self._responses is not None:
+            return next(self._responses)
+
+        words = LOREM.split()
+        return " ".join(words[i % len(words)] for i in range(self.completion_tokens))
+
+    def _prepare(self, prompt: str) -> _Request:
+        """
+        Picks the response and decides how the request goes. Raises RateLimitError.
+        """
+        self.stats.incr(requests=1)
+        with self._lock:
+            response = self._response()
+            rate_limited = self._random.random() < self.error_rate
+            timeout = self._random.random() < self.timeout_rate
+            latency = self._sample_latency()
+
+        if self.max_tokens:
+            response = response[: self.max_tokens * CHARS_PER_TOKEN]
+
+        prompt_tokens = count_tokens(prompt, self.model_name)
+        completion_tokens = count_tokens(response, self.model_name)
+        if rate_limited or not self._limiter.acquire(prompt_tokens + completion_tokens):
+            self.stats.incr(rate_limited=1)
+            raise RateLimitError("Rate limit reached for simulated requests.")
+
+        return _Request(prompt_tokens, _CHUNKS.findall(response), latency, timeout)
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _bill(self, request: _Request, wasted: bool):
+        # Generation stopped by the callbacks is not wasted, its result is used.
+        completion_tokens = count_tokens(request.text, self.model_name)
+        tokens = request.prompt_tokens + completion_tokens
+        self.stats.incr(
+            prompt_tokens=request.prompt_tokens,
+            completion_tokens=completion_tokens,
+            wasted_tokens=tokens if wasted else 0,
+            timeouts=int(request.timeout),
+            successful=int(not wasted),
+        )
+
+    def _usage(self, requests: list[_Request]) -> dict:
+        prompt_tokens = sum(request.prompt_tokens for request in requests)
+        completion_tokens = sum(
+            count_tokens(request.text, self.model_name) for request in requests
+        )
+
+        return {
+            "token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "model_name": self.model_name,
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.retry_min_wait * 2**attempt, self.retry_max_wait)
+
+    def _request(
+        self, prompt: str, run_manager: CallbackManagerForLLMRun = None
+    ) -> _Request:
+        request = self._prepare(prompt)
+        wasted = False
+        try:
+            time.sleep(request.latency)
+            delay = self._token_delay()
+            for chunk in request.chunks:
+                delay and time.sleep(delay)
+                request.streamed.append(chunk)
+                if run_manager and self.streaming and not request.timeout:
+                    run_manager.on_llm_new_token(chunk)
+
+            if request.timeout:
+                time.sleep(max(self.request_timeout - request.latency, 0))
+                raise Timeout("Simulated request timed out.")
+
+        except Exception:
+            wasted = True
+            raise
+        finally:
+            self._bill(request, wasted)
+
+        return request
+
+    async def _arequest(
+        self, prompt: str, run_manager: AsyncCallbackManagerForLLMRun = None
+    ) -> _Request:
+        request = self._prepare(prompt)
+        wasted = False
+        try:
+            await asyncio.sleep(request.latency)
+            delay = self._token_delay()
+            for chunk in request.chunks:
+                delay and await asyncio.sleep(delay)
+                request.streamed.append(chunk)
+                if run_manager and self.streaming and not request.timeout:
+                    await run_manager.on_llm_new_token(chunk)
+
+            if request.timeout:
+                await asyncio.sleep(max(self.request_timeout - request.latency, 0))
+                raise Timeout("Simulated request timed out.")
+
+        except Exception:
+            wasted = True
+            raise
+        finally:
+            self._bill(request, wasted)
+
+        return request
+
+    def _generate(
+        self,
+        prompts: list[str],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+    ) -> LLMResult:
+        requests = []
+        for prompt in prompts:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    requests.append(self._request(prompt, run_manager))
+                    break
+                except (RateLimitError, Timeout):
+                    if attempt == self.max_retries:
+                        raise
+                    self.stats.incr(retries=1)
+                    time.sleep(self._backoff(attempt))
+
+        return LLMResult(
+            generations=[[Generation(text=request.text)] for request in requests],
+            llm_output=self._usage(requests),
+        )
+
+    async def _agenerate(
+        self,
+        prompts: list[str],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+    ) -> LLMResult:
+        requests = []
+        for prompt in prompts:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    requests.append(await self._arequest(prompt, run_manager))
+                    break
+                except (RateLimitError, Timeout):
+                    if attempt == self.max_retries:
+                        raise
+                    self.stats.incr(retries=1)
+                    await asyncio.sleep(self._backoff(attempt))
+
+        return LLMResult(
+            generations=[[Generation(text=request.text)] for request in requests],
+            llm_output=self._usage(requests),
+        )
@@ -1,4 +1,31 @@
-from .json_schema import JSONSchemaOutputParser
-from .ui_schema import UISchemaOutputParser
+from typing import TYPE_CHECKING
 
-__all__ = ["JSONSchemaOutputParser", "UISchemaOutputParser"]
+from ..utils import lazy_attributes
+
+__all__ = [
+    "JSONScanner",
+    "JSONSchemaOutputParser",
+    "UISchemaOutputParser",
+    "is_valid_json_schema",
+    "parse_json_object",
+    "repair_json",
+]
+
+# Parsers are imported on first access, as they depend on langchain and jsonschema.
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "JSONScanner": ".json_scanner",
+        "parse_json_object": ".json_scanner",
+        "JSONSchemaOutputParser": ".json_schema",
+        "is_valid_json_schema": ".json_schema",
+        "repair_json": ".repair",
+        "UISchemaOutputParser": ".ui_schema",
+    },
+)
+
+if TYPE_CHECKING:
+    from .json_scanner import JSONScanner, parse_json_object
+    from .json_schema import JSONSchemaOutputParser, is_valid_json_schema
+    from .repair import repair_json
+    from .ui_schema import UISchemaOutputParser
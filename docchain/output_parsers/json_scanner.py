@@ -0,0 +1,158 @@
+"""
+Incremental scanner of the first top level JSON object in LLM completions.
+
+Scanner consumes completion chunk by chunk and tracks nesting of objects, arrays and strings.
+It knows when the first object is closed, so text after it is ignored and streaming generation
+can be stopped, and it reports mismatched brackets as soon as they are received.
+"""
+import json
+import re
+from typing import Any
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import OutputParserException
+
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING = re.compile(r'["\\]')
+_CLOSING = {"{": "}", "[": "]"}
+
+
+class JSONScanner:
+    def __init__(self):
+        self.start: int | None = None
+        self.end: int | None = None
+        # Chunks are joined only when the text is needed, only new chunks are scanned.
+        self._chunks = []
+        self._length = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def done(self) -> bool:
+        return self.end is not None
+
+    @property
+    def result(self) -> str | None:
+        """
+        Text of the first object when it's closed.
+        """
+        if self.end is None:
+            return None
+
+        return self.text[self.start : self.end]
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consumes the chunk of the completion. Returns True when the first object is closed.
+        """
+        if self.done:
+            return True
+
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        pos = 0
+        if self._escaped and chunk:
+            # Escaped character of the previous chunk.
+            self._escaped = False
+            pos = 1
+
+        while True:
+            if self.start is None:
+                pos = chunk.find("{", pos)
+                if pos == -1:
+                    break
+
+                self.start = offset + pos
+                self._stack.append("}")
+                pos += 1
+            elif self._in_string:
+                match = _STRING.search(chunk, pos)
+                if match is None:
+                    break
+
+                if match.group() == "\\":
+                    if match.end() == len(chunk):
+                        # Escaped character is in the next chunk.
+                        self._escaped = True
+                        break
+
+                    pos = match.end() + 1
+                else:
+                    self._in_string = False
+                    pos = match.end()
+            else:
+                match = _STRUCTURE.search(chunk, pos)
+                if match is None:
+                    break
+
+                char = match.group()
+                pos = match.end()
+                if char == '"':
+                    self._in_string = True
+                elif char in _CLOSING:
+                    self._stack.append(_CLOSING[char])
+                else:
+                    expected = self._stack.pop()
+                    if char != expected:
+                        raise OutputParserException(
+                            f"Failed to parse json. Unexpected {char!r} at position "
+                            f"{offset + match.start()}, expected {expected!r}. "
+                            f"Completion: {self.text}"
+                        )
+
+                    if not self._stack:
+                        self.end = offset + pos
+                        break
+
+        return self.done
+
+
+def parse_json_object(text: str) -> Any:
+    """
+    Parses the first top level JSON object in the completion.
+    """
+    scanner = JSONScanner()
+    if not scanner.feed(text):
+        raise OutputParserException(f"Failed to find json object. Completion: {text}")
+
+    try:
+        return json.loads(scanner.result)
+    except json.JSONDecodeError as e:
+        raise OutputParserException(f"Failed to parse json. Completion {text}: {e}")
+
+
+class StopGeneration(BaseException):
+    """
+    Raised from the LLM callback to stop streaming generation. It's a BaseException, as
+    LangChain callback managers swallow exceptions raised by the handlers.
+    """
+
+
+class JSONStreamHandler(BaseCallbackHandler):
+    """
+    Feeds streamed tokens to the scanner and stops generation when the first object is closed
+    or the completion is malformed.
+    """
+
+    def __init__(self):
+        self.scanner = JSONScanner()
+        self.error: OutputParserException | None = None
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        try:
+            done = self.scanner.feed(token)
+        except OutputParserException as exc:
+            self.error = exc
+            raise StopGeneration()
+
+        if done:
+            raise StopGeneration()
@@ -1,10 +1,9 @@
-import json
-import re
-
 import jsonschema
 from jsonschema import Draft202012Validator
 from langchain.schema import BaseOutputParser, OutputParserException
 
+from .json_scanner import parse_json_object
+
 FORMAT_INSTRUCTIONS = (
     "Give me result as json schema draft 2020-12. Use camel case for fields names. "
     "Be as concise as possible, use short names, reuse names where possible. "
@@ -28,18 +27,7 @@ def is_valid_json_schema(schema: dict) -> tuple[bool, list[str] | None]:
 
 class JSONSchemaOutputParser(BaseOutputParser):
     def parse(self, text: str) -> dict:
-        try:
-            # Finds what looks like the first json object in the text
-            match = re.search(
-                "{.*}", text.strip(), re.MULTILINE | re.IGNORECASE | re.DOTALL
-            )
-            json_str = ""
-            if match:
-                json_str = match.group()
-
-            json_object = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise OutputParserException(f"Failed to parse json. Completion {text}: {e}")
+        json_object = parse_json_object(text)
 
         is_valid, errors = is_valid_json_schema(json_object)
         if not is_valid:
@@ -0,0 +1,108 @@
+"""
+Deterministic repair of malformed JSON completions.
+
+Fixes the most common issues of LLM generated JSON: markdown fences and prose around the
+object, single quoted strings, Python literals, trailing commas, raw new lines in strings and
+objects truncated at the max tokens limit. Mismatched brackets are not repaired.
+"""
+import json
+import re
+
+from langchain.schema import OutputParserException
+
+_FENCE = re.compile(r"```(?:json|javascript|js)?\s*\n(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSING = {"{": "}", "[": "]"}
+
+
+def _strip_trailing(out: list[str], chars: str):
+    while out and (out[-1].isspace() or out[-1] in chars):
+        if out[-1] in chars:
+            out.pop()
+            return
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    """
+    Returns repaired JSON text of the first object in the completion. Raises
+    OutputParserException when the completion cannot be repaired.
+    """
+    match = _FENCE.search(text)
+    if match and "{" in match.group(1):
+        text = match.group(1)
+
+    start = text.find("{")
+    if start == -1:
+        raise OutputParserException(f"Failed to repair json. Completion: {text}")
+
+    out = []
+    stack = []
+    quote = None
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\" and i + 1 < len(text):
+                escaped = text[i + 1]
+                # \' is not a valid JSON escape
+                out.append(escaped if escaped == "'" else text[i : i + 2])
+                i += 2
+                continue
+
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+        elif char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in _CLOSING:
+            stack.append(_CLOSING[char])
+            out.append(char)
+        elif char in "}]":
+            expected = stack.pop()
+            if char != expected:
+                # Only truncation is repaired, the intended structure is unknown.
+                raise OutputParserException(
+                    f"Failed to repair json. Unexpected {char!r} at position {i}, "
+                    f"expected {expected!r}. Completion: {text}"
+                )
+            _strip_trailing(out, ",")
+            out.append(char)
+            if not stack:
+                break
+        elif char.isalpha():
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(char)
+
+        i += 1
+
+    if stack:
+        # Completion was truncated.
+        if quote:
+            out.append('"')
+        _strip_trailing(out, ",")
+        if out and out[-1] == ":":
+            out.append("null")
+        out.extend(reversed(stack))
+
+    repaired = "".join(out)
+    try:
+        json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise OutputParserException(f"Failed to repair json. Completion {text}: {e}")
+
+    return repaired
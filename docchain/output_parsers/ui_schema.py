@@ -1,7 +1,6 @@
-import json
-import re
+from langchain.schema import BaseOutputParser
 
-from langchain.schema import BaseOutputParser, OutputParserException
+from .json_scanner import parse_json_object
 
 FORMAT_INSTRUCTIONS = (
     "Give me valid UI schema for the latest version of react-jsonschema-form library."
@@ -10,19 +9,7 @@ FORMAT_INSTRUCTIONS = (
 
 class UISchemaOutputParser(BaseOutputParser):
     def parse(self, text: str) -> dict:
-        try:
-            match = re.search(
-                "{.*}", text.strip(), re.MULTILINE | re.IGNORECASE | re.DOTALL
-            )
-            json_str = ""
-            if match:
-                json_str = match.group()
-
-            json_object = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise OutputParserException(f"Failed to parse json. Completion {text}: {e}")
-
-        return json_object
+        return parse_json_object(text)
 
     def get_format_instructions(self) -> str:
         return FORMAT_INSTRUCTIONS
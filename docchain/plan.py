@@ -0,0 +1,78 @@
+"""
+Execution plan of a Spec.
+
+Plan is built once per Spec and shared by all documents generated from it. It holds block
+dependencies and LLM chains of the blocks which prompts do not depend on the document, so
+prompts, output parsers and chains are not created for every document.
+"""
+from __future__ import annotations
+
+import threading
+from collections.abc import Sequence
+from copy import deepcopy
+from typing import TYPE_CHECKING
+
+from .scheduler import block_dependencies
+
+if TYPE_CHECKING:
+    from langchain.chains import LLMChain
+    from langchain.llms.base import BaseLLM
+
+
+class ExecutionPlan:
+    """
+    Plan is immutable, copies of the Spec share the same plan.
+    """
+
+    def __init__(self, blocks: Sequence):
+        self.blocks = tuple(blocks)
+        self.dependencies = tuple(
+            frozenset(dependencies) for dependencies in block_dependencies(self.blocks)
+        )
+        # Configs the plan was built for, blocks could be changed in place later.
+        self._configs = tuple(
+            deepcopy(getattr(block, "config", None)) for block in self.blocks
+        )
+        self._indexes = {id(block): i for i, block in enumerate(self.blocks)}
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def matches(self, blocks: Sequence) -> bool:
+        """
+        Checks the plan was built for the same blocks, e.g. for a copy of the Spec.
+        """
+        if len(blocks) != len(self.blocks):
+            return False
+
+        for planned, config, block in zip(self.blocks, self._configs, blocks):
+            if (
+                type(planned) is not type(block)
+                or planned.key != block.key
+                or config != getattr(block, "config", None)
+            ):
+                return False
+
+        return True
+
+    def chain(self, block, llm: BaseLLM, index: int = None) -> LLMChain | None:
+        """
+        Returns prepared chain of the block or None if it has to be created for every document.
+        Index of the block in the plan is required for the blocks of the matching copies.
+        """
+        if not getattr(block, "static_prompt", False):
+            return None
+
+        if index is None:
+            index = self._indexes[id(block)]
+        key = (index, id(llm))
+        with self._lock:
+            # LLM is stored with the chain, as the chain holds a copy of it.
+            cached_llm, chain = self._chains.get(key, (None, None))
+            if cached_llm is not llm:
+                chain = block.create_chain(document=None, llm=llm)
+                self._chains[key] = (llm, chain)
+
+        return chain
+
+    def __deepcopy__(self, memo):
+        return self
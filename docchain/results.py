@@ -0,0 +1,90 @@
+"""
+Results of the document blocks.
+
+Block keys can be dotted paths, e.g. `schema.ui`, which store results in nested dicts. Paths
+are resolved on every lookup, so changes made to the nested dicts directly are always seen.
+Results are a dict of the nested results, so they are serialized as before.
+"""
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from yaml.representer import Representer, SafeRepresenter
+
+from .utils import set_nested_val
+
+_MISSING = object()
+
+
+class Results(dict):
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value: Any) -> "Results":
+        if not isinstance(value, Mapping):
+            raise TypeError("Results must be a mapping")
+
+        return cls(value)
+
+    def _lookup(self, path: str) -> Any:
+        if dict.__contains__(self, path) or "." not in path:
+            return dict.get(self, path, _MISSING)
+
+        value = self
+        for key in path.split("."):
+            if not isinstance(value, dict) or key not in value:
+                return _MISSING
+            value = value[key]
+
+        return value
+
+    def __contains__(self, path: object) -> bool:
+        if not isinstance(path, str):
+            return dict.__contains__(self, path)
+
+        return self._lookup(path) is not _MISSING
+
+    def __getitem__(self, path: str) -> Any:
+        value = self._lookup(path) if isinstance(path, str) else _MISSING
+        if value is _MISSING:
+            return dict.__getitem__(self, path)
+
+        return value
+
+    def get(self, path: str, default: Any = None) -> Any:
+        value = self._lookup(path) if isinstance(path, str) else _MISSING
+
+        return default if value is _MISSING else value
+
+    def set(self, path: str, value: Any):
+        """
+        Stores the result at the dotted path, creating the missing nested dicts.
+        """
+        if "." not in path:
+            self[path] = value
+            return
+
+        parent_path, _, key = path.rpartition(".")
+        parent = self._lookup(parent_path)
+        if isinstance(parent, dict):
+            parent[key] = value
+        else:
+            set_nested_val(self, path, value)
+
+    def copy(self) -> "Results":
+        """
+        Returns shallow copy of the results.
+        """
+        return Results(self)
+
+    def view(self) -> Mapping[str, Any]:
+        """
+        Returns read-only view of the results, which also resolves dotted paths.
+        """
+        return MappingProxyType(self)
+
+
+# Results are dumped as plain dicts by all the dumpers, including the C ones.
+for representer in (Representer, SafeRepresenter):
+    representer.add_representer(Results, SafeRepresenter.represent_dict)
@@ -0,0 +1,204 @@
+"""
+Runs blocks of a document respecting dependencies between them.
+
+A block depends on an earlier block when one of its config templates references the top level
+key the earlier block writes to. Blocks which are not instances of BaseBlock (plain callables)
+can read anything from the document, so they depend on every block before them.
+
+Independent blocks are executed concurrently, but results are always written to the document
+in the order of the blocks in the Spec, so the generated document does not depend on timing.
+"""
+import asyncio
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from .documents import Document
+
+
+def block_dependencies(blocks: Sequence) -> list[set[int]]:
+    """
+    Returns indexes of the earlier blocks each block depends on.
+    """
+    res = []
+    for i, block in enumerate(blocks):
+        variables = getattr(block, "variables", None)
+        if variables is None:
+            res.append(set(range(i)))
+        else:
+            res.append(
+                {j for j in range(i) if blocks[j].key.split(".")[0] in variables}
+            )
+
+    return res
+
+
+class BlockSchedule:
+    """
+    Tracks which blocks can be started and stores finished results in the document.
+
+    When a block fails, no new blocks are started. Results of the blocks which have already
+    finished are stored in the document, so they are not lost, and the first error is raised.
+    """
+
+    def __init__(
+        self,
+        blocks: Sequence,
+        document: Document,
+        on_result: Callable[[str, any], None] = None,
+        dependencies: Sequence[set[int]] = None,
+    ):
+        self.blocks = blocks
+        self.document = document
+        self.on_result = on_result
+        self.pending = [
+            i for i, block in enumerate(blocks) if block.key not in document.res
+        ]
+        if dependencies is None:
+            dependencies = block_dependencies(blocks)
+        self.dependencies = dependencies
+        self.committed = set(range(len(blocks))) - set(self.pending)
+        self.scheduled = set()
+        self.results = {}
+        self.errors = {}
+        self.cursor = 0
+
+    def ready(self) -> list[tuple[int, Document]]:
+        """
+        Returns blocks which dependencies are satisfied with documents to run them against.
+        """
+        if self.errors:
+            return []
+
+        res = []
+        for i in self.pending:
+            if i not in self.scheduled and self.dependencies[i] <= self.committed:
+                # Blocks get their own copy of results, as the document is updated while
+                # they are running.
+                snapshot = self.document.copy(update={"res": self.document.res.copy()})
+                res.append((i, snapshot))
+                self.scheduled.add(i)
+
+        return res
+
+    def done(self, i: int, result: any = None, error: Exception = None):
+        if error is not None:
+            self.errors[i] = error
+        else:
+            self.results[i] = result
+
+        while (
+            self.cursor < len(self.pending)
+            and self.pending[self.cursor] in self.results
+        ):
+            self._commit(self.pending[self.cursor])
+            self.cursor += 1
+
+    def finish(self):
+        if self.errors:
+            for i in sorted(self.results):
+                self._commit(i)
+
+            raise self.errors[min(self.errors)]
+
+    def _commit(self, i: int):
+        commit(self.document, self.blocks[i].key, self.results.pop(i), self.on_result)
+        self.committed.add(i)
+
+
+def commit(
+    document: Document,
+    key: str,
+    value: any,
+    on_result: Callable[[str, any], None] = None,
+):
+    document.res.set(key, value)
+    if on_result is not None:
+        on_result(key, value)
+
+
+def run_blocks(
+    blocks: Sequence,
+    document: Document,
+    call: Callable[[any, Document], any],
+    max_workers: int = 1,
+    on_result: Callable[[str, any], None] = None,
+    dependencies: Sequence[set[int]] = None,
+):
+    """
+    Calls every block which result is not in the document yet on a thread pool and stores
+    results in `document.res`. `on_result` is called for every stored result. Dependencies
+    of the blocks are computed unless given.
+    """
+    if max_workers <= 1:
+        for block in blocks:
+            if block.key not in document.res:
+                commit(document, block.key, call(block, document), on_result)
+
+        return
+
+    schedule = BlockSchedule(blocks, document, on_result, dependencies)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for i, snapshot in schedule.ready():
+                # Context is copied, so blocks see context variables, e.g. event listeners.
+                context = copy_context()
+                running[executor.submit(context.run, call, blocks[i], snapshot)] = i
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                try:
+                    schedule.done(i, result=future.result())
+                except Exception as exc:
+                    schedule.done(i, error=exc)
+
+    schedule.finish()
+
+
+async def arun_blocks(
+    blocks: Sequence,
+    document: Document,
+    call: Callable[[any, Document], Awaitable],
+    max_workers: int = 1,
+    on_result: Callable[[str, any], None] = None,
+    dependencies: Sequence[set[int]] = None,
+):
+    """
+    Async version of `run_blocks`. At most `max_workers` blocks are awaited concurrently.
+    """
+    if max_workers <= 1:
+        for block in blocks:
+            if block.key not in document.res:
+                commit(document, block.key, await call(block, document), on_result)
+
+        return
+
+    schedule = BlockSchedule(blocks, document, on_result, dependencies)
+    semaphore = asyncio.Semaphore(max_workers)
+    running = {}
+
+    async def bounded_call(block, snapshot):
+        async with semaphore:
+            return await call(block, snapshot)
+
+    while True:
+        for i, snapshot in schedule.ready():
+            running[asyncio.create_task(bounded_call(blocks[i], snapshot))] = i
+
+        if not running:
+            break
+
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            i = running.pop(task)
+            try:
+                schedule.done(i, result=task.result())
+            except Exception as exc:
+                schedule.done(i, error=exc)
+
+    schedule.finish()
@@ -0,0 +1,129 @@
+"""
+Serializers of the document results to the output formats.
+
+Serializers write straight into a file handle in chunks, so documents saved to the workspace are
+never held in memory as a whole string. YAML is dumped by the C accelerated dumper when PyYAML
+is built with libyaml.
+
+Register serializer for a custom format with `register_serializer`.
+"""
+import io
+import json
+from pathlib import PurePath
+from typing import IO, Any
+
+import yaml
+from pydantic import BaseModel
+
+from .documents import Document, Format
+from .exceptions import DocumentGenerationError
+
+# Approximate size of the chunks written to the file.
+CHUNK_SIZE = 64 * 1024
+
+
+class BaseSerializer:
+    def dump(self, res: dict, file: IO[str]):
+        raise NotImplementedError()
+
+    def dumps(self, res: dict) -> str:
+        file = io.StringIO()
+        self.dump(res, file)
+
+        return file.getvalue()
+
+
+def _default(o: Any) -> Any:
+    if isinstance(o, BaseModel):
+        return o.dict()
+
+    if isinstance(o, PurePath):
+        return str(o)
+
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class JSONSerializer(BaseSerializer):
+    def __init__(self, indent: int = 4):
+        self.encoder = json.JSONEncoder(indent=indent, default=_default)
+
+    def dump(self, res: dict, file: IO[str]):
+        chunks, size = [], 0
+        for chunk in self.encoder.iterencode(res):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= CHUNK_SIZE:
+                file.write("".join(chunks))
+                chunks, size = [], 0
+
+        file.write("".join(chunks))
+
+
+# Full dumper, as with yaml.dump, so e.g. tuples keep their tags.
+class _YAMLDumper(getattr(yaml, "CDumper", yaml.Dumper)):
+    pass
+
+
+def _represent_model(dumper: yaml.Dumper, model: BaseModel) -> yaml.Node:
+    return dumper.represent_dict(model.dict())
+
+
+_YAMLDumper.add_multi_representer(BaseModel, _represent_model)
+_YAMLDumper.add_multi_representer(
+    PurePath, lambda dumper, path: dumper.represent_str(str(path))
+)
+
+
+class YAMLSerializer(BaseSerializer):
+    def __init__(self, indent: int = 4):
+        self.indent = indent
+
+    def dump(self, res: dict, file: IO[str]):
+        # Emitter writes to the file as it goes.
+        yaml.dump(res, file, Dumper=_YAMLDumper, indent=self.indent)
+
+
+class TextSerializer(BaseSerializer):
+    """
+    Writes top level results as sections: the key, a blank line and the text of the result.
+    """
+
+    def dump(self, res: dict, file: IO[str]):
+        separator = ""
+        for key, value in res.items():
+            if isinstance(value, BaseModel) and hasattr(value, "text"):
+                value = value.text
+            file.write(f"{separator}{key}\n\n{value}")
+            separator = "\n\n"
+
+
+_serializers: dict[str, BaseSerializer] = {
+    Format.json: JSONSerializer(),
+    Format.yaml: YAMLSerializer(),
+    Format.text: TextSerializer(),
+}
+
+
+def register_serializer(fmt: str, serializer: BaseSerializer):
+    _serializers[fmt] = serializer
+
+
+def get_serializer(fmt: str) -> BaseSerializer:
+    try:
+        return _serializers[fmt]
+    except KeyError:
+        raise DocumentGenerationError(f"Unknown format: {fmt}") from None
+
+
+def serialize(document: Document, fmt: str) -> str:
+    """
+    Returns serialized results of the document.
+    """
+    return get_serializer(fmt).dumps(document.res)
+
+
+def write(document: Document, file: IO[str], fmt: str):
+    """
+    Writes serialized results of the document to the file.
+    """
+    get_serializer(fmt).dump(document.res, file)
@@ -1,6 +1,14 @@
-from fsspec import AbstractFileSystem, get_filesystem_class
+import json
+from functools import cache
+from typing import TYPE_CHECKING
+
 from pydantic import BaseSettings, DirectoryPath, Field, PyObject
 
+from .tracing import trace_fs
+
+if TYPE_CHECKING:
+    from fsspec import AbstractFileSystem
+
 
 class Settings(BaseSettings):
     class Config:
@@ -13,28 +21,168 @@ class Settings(BaseSettings):
     max_tokens: int = Field(
         default=2048, description="Max number of tokens to use in the model."
     )
+    context_window: int | None = Field(
+        default=None,
+        description=(
+            "Context window of the model in tokens. Derived from the model name if not set."
+        ),
+    )
+    token_budget_factory: PyObject | None = Field(
+        default=None,
+        description=(
+            "Factory of the token budget which sizes max_tokens per block, e.g. "
+            "docchain.budget.default_token_budget_factory. Disabled by default."
+        ),
+    )
     default_llm_factory: PyObject = Field(
         default="docchain.models.gpt.llm_factory",
         description="Default LLM to use for generation.",
     )
+    llm_pool: list[dict] = Field(
+        default=[],
+        description=(
+            "Members of the pool created by docchain.models.pool.pool_llm_factory. Each is "
+            "a dict of ChatOpenAI params, e.g. openai_api_key, with an optional weight."
+        ),
+    )
+    llm_pool_strategy: str = Field(
+        default="least_outstanding",
+        description="Balancing of the pool requests: least_outstanding or weighted.",
+    )
+    llm_pool_failure_threshold: int = Field(
+        default=3,
+        description="Consecutive failures after which the pool member is taken out.",
+    )
+    llm_pool_reset_timeout: float = Field(
+        default=30.0,
+        description="Seconds before the failed pool member gets a trial request.",
+    )
+    max_workers: int = Field(
+        default=1,
+        description="Max number of independent blocks of a document generated concurrently.",
+    )
+    cache_factory: PyObject | None = Field(
+        default=None,
+        description=(
+            "Factory of the LLM responses cache, e.g. docchain.cache.default_cache_factory. "
+            "Responses are not cached by default."
+        ),
+    )
+    cache_max_size: int = Field(
+        default=10000, description="Max number of entries in each cache tier."
+    )
+    cache_ttl: float | None = Field(
+        default=None, description="Time to live of cached responses in seconds."
+    )
+    coalesce_requests: bool = Field(
+        default=False,
+        description=(
+            "Identical concurrent block requests share one LLM call. Blocks which are not "
+            "cacheable are never coalesced."
+        ),
+    )
+    template_cache_size: int = Field(
+        default=1000, description="Max number of compiled templates kept in memory."
+    )
+    template_bytecode_cache_dir: str | None = Field(
+        default=None,
+        description="Directory to store compiled templates bytecode across processes.",
+    )
+    snapshot_compression: str | None = Field(
+        default=None,
+        description="Compression of document snapshots, e.g. gzip. As supported by fsspec.",
+    )
+    stats_db: str | None = Field(
+        default=None,
+        description=(
+            "Path of the SQLite database of generation stats. Defaults to stats.sqlite3 "
+            "in fs_workspace, which must be a local directory in this case."
+        ),
+    )
+    trace_file: str | None = Field(
+        default=None,
+        description=(
+            "Local file to write Chrome trace of the generation to. Disabled by default."
+        ),
+    )
+    save_write_behind: bool = Field(
+        default=False,
+        description=(
+            "Save documents in SaveDocumentMiddleware by a background writer. "
+            "Use Generator.flush or Generator.close to wait for the writes."
+        ),
+    )
+    save_queue_size: int = Field(
+        default=100, description="Max number of documents waiting to be written."
+    )
+    save_max_retries: int = Field(
+        default=3, description="Number of retries of the failed background writes."
+    )
+    save_retry_backoff: float = Field(
+        default=0.5, description="Initial delay between retries in seconds."
+    )
+    queue_dir: str = Field(
+        default="queue",
+        description="Workspace directory of the leases and done markers of docchain-worker.",
+    )
+    lease_ttl: float = Field(
+        default=60.0,
+        description="Seconds before the lease of a worker which stopped renewing it expires.",
+    )
+    lease_heartbeat_interval: float = Field(
+        default=15.0, description="Seconds between renewals of the worker leases."
+    )
+    lease_settle_delay: float = Field(
+        default=1.0,
+        description=(
+            "Seconds to wait before the leases written on filesystems without exclusive "
+            "create, e.g. S3, are read back. Must exceed the latency of the writes."
+        ),
+    )
+    queue_poll_interval: float = Field(
+        default=5.0,
+        description="Seconds between checks of the specs leased by other workers.",
+    )
     fs_backend: str = Field(
         default="file",
         description="Filesystem backend to use. As supported by fsspec.",
     )
     fs_params: dict = Field(default={}, description="Parameters for fs_backend.")
+    fs_listing_ttl: float = Field(
+        default=5.0,
+        description=(
+            "Seconds to cache listings of the workspace directories. Files written and removed "
+            "by this process are reflected immediately, files of the resumed documents are "
+            "checked directly."
+        ),
+    )
     fs_workspace: DirectoryPath = Field(
         default=".docchain", description="All files will be stored in this directory."
     )
 
 
+@cache
+def _get_filesystem(backend: str, params: str) -> "AbstractFileSystem":
+    from fsspec import get_filesystem_class
+
+    return get_filesystem_class(backend)(**json.loads(params))
+
+
+def get_filesystem(backend: str, params: dict) -> "AbstractFileSystem":
+    """
+    Returns filesystem instance shared by all the users of the same backend and params.
+    """
+    return _get_filesystem(backend, json.dumps(params, sort_keys=True, default=str))
+
+
 class LazySettings:
     """
     Instantiates settings class when first attempt to read an attribute is made.
     """
 
     @property
-    def fs(self) -> AbstractFileSystem:
-        return get_filesystem_class(self.fs_backend)(**self.fs_params)
+    def fs(self) -> "AbstractFileSystem":
+        return trace_fs(get_filesystem(self.fs_backend, self.fs_params))
 
     def __init__(self, settings_class):
         self.settings_class = settings_class
@@ -0,0 +1,80 @@
+"""
+Coalescing of identical in-flight requests.
+
+While the LLM call of a block is running, identical calls, i.e. with the same rendered prompt
+and LLM parameters, wait for it instead of calling the LLM again. Works across threads and
+event loops.
+"""
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+
+from .utils import incr_stat
+
+
+class SingleFlight:
+    def __init__(self):
+        self.stats = {}
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str) -> tuple[Future, bool]:
+        """
+        Returns future of the call and whether the caller has to make it.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                incr_stat(self.stats, "coalesced")
+                return future, False
+
+            future = self._calls[key] = Future()
+            incr_stat(self.stats, "calls")
+
+            return future, True
+
+    def _done(self, key: str):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key: str, func: Callable) -> tuple[bool, any]:
+        """
+        Calls the function unless the call with the same key is in flight. Returns whether
+        the call was made by this caller and its result.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return False, future.result()
+
+        try:
+            res = func()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            self._done(key)
+
+        future.set_result(res)
+
+        return True, res
+
+    async def ado(self, key: str, func: Callable[[], Awaitable]) -> tuple[bool, any]:
+        """
+        Async version of `do`.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return False, await asyncio.wrap_future(future)
+
+        try:
+            res = await func()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            self._done(key)
+
+        future.set_result(res)
+
+        return True, res
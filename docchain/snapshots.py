@@ -0,0 +1,165 @@
+"""
+Versioned snapshot format for documents.
+
+A snapshot is a text file. The first line is a header with the format name and version, the
+rest is the document encoded as JSON. Sections nested in the results are tagged, so they are
+restored as Section or Document objects. Dict keys starting with `__` are escaped
+with one more underscore, so dicts are never mistaken for tags.
+
+Snapshots are written and read result by result, one per line, so the whole document is never
+serialized to or parsed from an intermediate string.
+"""
+import gzip
+import json
+import lzma
+import zlib
+from logging import getLogger
+from pathlib import PurePath
+from typing import IO
+
+from .documents import Document, Section
+
+logger = getLogger(__name__)
+
+SNAPSHOT_FORMAT = "docchain.snapshot"
+SNAPSHOT_VERSION = 1
+
+_MODELS = {
+    "section": Section,
+    "document": Document,
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# Errors of the truncated or corrupt files, decoded or decompressed.
+_DECODE_ERRORS = (ValueError, EOFError, gzip.BadGzipFile, zlib.error, lzma.LZMAError)
+
+
+# Document line before and after the fields, results are written on the following lines.
+_DOCUMENT_START = '{"__document__": '
+_RESULTS_START = ', "res": {'
+_DOCUMENT_END = "}}}"
+
+
+def _escape_key(key: any) -> any:
+    return f"_{key}" if isinstance(key, str) and key.startswith("__") else key
+
+
+def _escape(value: any) -> any:
+    if isinstance(value, dict):
+        return {_escape_key(key): _escape(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_escape(item) for item in value]
+
+    return value
+
+
+def _fields(section: Section, exclude: str = None) -> dict:
+    # Fields are not converted with .dict() to keep nested sections tagged.
+    return {
+        field: _escape(getattr(section, field))
+        for field in section.__fields__
+        if field != exclude
+    }
+
+
+class SnapshotEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, Section):
+            name = "document" if isinstance(o, Document) else "section"
+            return {f"__{name}__": _fields(o)}
+
+        if isinstance(o, PurePath):
+            return str(o)
+
+        return super().default(o)
+
+
+def decode_object(obj: dict) -> any:
+    if len(obj) == 1:
+        ((key, value),) = obj.items()
+        if key.startswith("__") and key.endswith("__") and key[2:-2] in _MODELS:
+            return _MODELS[key[2:-2]](**value)
+
+    if any(key.startswith("___") for key in obj):
+        return {
+            key[1:] if key.startswith("___") else key: value
+            for key, value in obj.items()
+        }
+
+    return obj
+
+
+def dumps_value(value: any) -> str:
+    return json.dumps(_escape(value), cls=SnapshotEncoder)
+
+
+def loads_value(data: str) -> any:
+    return json.loads(data, object_hook=decode_object)
+
+
+def dump_document(document: Document, file: IO[str]):
+    """
+    Writes results one per line. Each of them is encoded with the C accelerated encoder, which
+    is not used by json.dump.
+    """
+    encoder = SnapshotEncoder()
+    header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION}
+    file.write(json.dumps(header) + "\n")
+
+    # Fields without the closing brace, results are written after them.
+    fields = encoder.encode(_fields(document, exclude="res"))[:-1]
+    file.write(_DOCUMENT_START + fields + _RESULTS_START + "\n")
+    for i, (key, value) in enumerate(document.res.items()):
+        if i:
+            file.write(",\n")
+        file.write(
+            encoder.encode(_escape_key(key)) + ": " + encoder.encode(_escape(value))
+        )
+    file.write(("\n" if document.res else "") + _DOCUMENT_END)
+
+
+def _load_results(file: IO[str]) -> dict:
+    res = {}
+    for line in file:
+        line = line.rstrip("\n")
+        if line == _DOCUMENT_END:
+            return res
+
+        # JSON strings don't contain newlines, so every line is one result.
+        ((key, value),) = loads_value("{" + line.rstrip(",") + "}").items()
+        res[key] = value
+
+    raise SnapshotError("Snapshot is truncated or corrupt")
+
+
+def load_document(file: IO[str]) -> Document:
+    """
+    Reads results one by one, so only one of them is parsed at a time.
+    """
+    try:
+        header = json.loads(file.readline())
+    except _DECODE_ERRORS as exc:
+        # Includes the files which are not compressed as configured.
+        raise SnapshotError("Not a document snapshot") from exc
+
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError("Not a document snapshot")
+
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version: {header.get('version')}")
+
+    try:
+        line = file.readline()
+        end = f"{_RESULTS_START}\n"
+        if not line.startswith(_DOCUMENT_START) or not line.endswith(end):
+            raise SnapshotError("Snapshot is truncated or corrupt")
+
+        fields = loads_value(line[len(_DOCUMENT_START) : -len(end)] + "}")
+        return Document(**fields, res=_load_results(file))
+    except (*_DECODE_ERRORS, TypeError) as exc:
+        raise SnapshotError("Snapshot is truncated or corrupt") from exc
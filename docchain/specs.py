@@ -1,7 +1,14 @@
 from collections.abc import Callable
+from copy import deepcopy
+from enum import Enum
+from pathlib import PurePath
 
 from .blocks import BaseBlock
 from .documents import Document, Format
+from .plan import ExecutionPlan
+
+# Values shared by the spec and its copies as they can't be changed in place.
+_IMMUTABLE = (str, bytes, int, float, bool, type(None), Enum, PurePath, ExecutionPlan)
 
 
 class Spec:
@@ -22,3 +29,67 @@ class Spec:
         self.fmt = fmt
         self.blocks = blocks or []
         self.doc = doc
+        self.plan: ExecutionPlan | None = None
+        # Snapshot and journal are kept after the build, e.g. until the document is written
+        # by the background writer.
+        self.keep_snapshot = False
+
+    def compile(self) -> ExecutionPlan:
+        """
+        Builds execution plan of the blocks. It is shared with copies of the spec.
+        """
+        self.plan = ExecutionPlan(self.blocks)
+
+        return self.plan
+
+    def copy(self) -> "Spec":
+        """
+        Returns copy-on-write copy of the spec. Immutable attributes are shared, the others,
+        e.g. blocks or doc, are deep copied on first access. Changes of the copy never affect
+        the spec, as with deepcopy, but the blocks are not copied unless the copy uses them.
+        """
+        spec = object.__new__(type(self))
+        pending = {}
+        for name, value in vars(self).items():
+            if name == "_pending":
+                pending.update(value)
+            elif isinstance(value, _IMMUTABLE):
+                spec.__dict__[name] = value
+            else:
+                pending[name] = value
+        spec.__dict__["_pending"] = pending
+
+        return spec
+
+    @property
+    def shares_blocks(self) -> bool:
+        """
+        Whether blocks of the copy were not accessed, so they are the ones of the original spec.
+        """
+        return "blocks" in self.__dict__.get("_pending", ())
+
+    def __getattr__(self, name: str):
+        pending = self.__dict__.get("_pending")
+        if pending is None or name not in pending:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+
+        value = self.__dict__[name] = deepcopy(pending.pop(name))
+
+        return value
+
+    def __setattr__(self, name: str, value):
+        pending = self.__dict__.get("_pending")
+        if pending:
+            pending.pop(name, None)
+
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name: str):
+        pending = self.__dict__.get("_pending")
+        if pending and name in pending:
+            del pending[name]
+            return
+
+        super().__delattr__(name)
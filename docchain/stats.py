@@ -0,0 +1,413 @@
+"""
+Generation stats stored in a local SQLite database.
+
+Stats are collected by `docchain.middleware.collect_stats`: one row per generated document and
+one row per block with tokens, cost, latency and retries. Rows are written in batches by a
+background thread, so generation never waits for the database.
+
+Query stats from Python with `StatsStore` or from the command line:
+
+    python -m docchain.stats latency --by block_type
+    python -m docchain.stats tokens --by block_key --spec my-spec
+"""
+import argparse
+import atexit
+import contextlib
+import math
+import queue
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .settings import conf
+from .utils import lazy_attributes
+from .workspace import get_workspace
+
+if TYPE_CHECKING:
+    from .callbacks import UsageCallbackHandler
+
+# Callback handlers are imported with langchain when stats are collected.
+__getattr__ = lazy_attributes(__name__, {"UsageCallbackHandler": ".callbacks"})
+
+_collector: ContextVar["StatsCollector | None"] = ContextVar(
+    "docchain_stats_collector", default=None
+)
+_block_usage: ContextVar["UsageCallbackHandler | None"] = ContextVar(
+    "docchain_block_usage", default=None
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL,
+    spec_name TEXT,
+    filename TEXT,
+    model TEXT,
+    latency REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    cost REAL,
+    requests INTEGER,
+    retries INTEGER,
+    cache_hits INTEGER,
+    cache_misses INTEGER,
+    failed INTEGER
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    run_id TEXT,
+    created_at REAL,
+    spec_name TEXT,
+    block_key TEXT,
+    block_type TEXT,
+    model TEXT,
+    latency REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    cost REAL,
+    requests INTEGER,
+    retries INTEGER,
+    failed INTEGER
+);
+CREATE INDEX IF NOT EXISTS blocks_run_id ON blocks (run_id);
+"""
+_DOCUMENT_COLUMNS = (
+    "run_id",
+    "created_at",
+    "spec_name",
+    "filename",
+    "model",
+    "latency",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cost",
+    "requests",
+    "retries",
+    "cache_hits",
+    "cache_misses",
+    "failed",
+)
+_BLOCK_COLUMNS = (
+    "run_id",
+    "created_at",
+    "spec_name",
+    "block_key",
+    "block_type",
+    "model",
+    "latency",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cost",
+    "requests",
+    "retries",
+    "failed",
+)
+_GROUP_BY = ("block_type", "block_key", "spec_name", "model")
+_USAGE = ("prompt_tokens", "completion_tokens", "total_tokens", "cost", "requests")
+
+
+def block_usage_handler() -> "UsageCallbackHandler | None":
+    return _block_usage.get()
+
+
+class StatsCollector:
+    """
+    Collects block rows of one document. Blocks can finish in worker threads.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def block(self, block):
+        from .callbacks import UsageCallbackHandler
+
+        usage = UsageCallbackHandler()
+        token = _block_usage.set(usage)
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield usage
+            failed = False
+        finally:
+            _block_usage.reset(token)
+            row = {
+                "block_key": getattr(block, "key", None),
+                "block_type": type(block).__name__,
+                "model": usage.model,
+                "latency": time.perf_counter() - start,
+                "retries": max(usage.requests - 1, 0),
+                "failed": int(failed),
+            }
+            row.update({name: getattr(usage, name) for name in _USAGE})
+            with self._lock:
+                self.blocks.append(row)
+
+
+@contextlib.contextmanager
+def collect():
+    collector = StatsCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def block_stats(block):
+    """
+    Measures the block call when stats are collected for the current document.
+    """
+    collector = _collector.get()
+    if collector is None:
+        return contextlib.nullcontext()
+
+    return collector.block(block)
+
+
+def _path(path: str | Path = None) -> str:
+    return str(path or conf.stats_db or get_workspace().local_path("stats.sqlite3"))
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """
+    Nearest-rank percentile.
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+
+    return values[rank - 1]
+
+
+class StatsStore:
+    """
+    SQLite database of the generation stats. Rows are queued and written by a background
+    thread in batches of `batch_size` or every `flush_interval` seconds.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        path: str | Path = None,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+    ):
+        self.path = _path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        with contextlib.closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="docchain-stats", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        with contextlib.closing(self._connect()) as connection:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while batch[-1] is not self._STOP and len(batch) < self.batch_size:
+                    try:
+                        batch.append(
+                            self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                        )
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._write(
+                        connection, [item for item in batch if item is not self._STOP]
+                    )
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+
+                if batch[-1] is self._STOP:
+                    return
+
+    @staticmethod
+    def _write(connection: sqlite3.Connection, batch: list[tuple[str, dict]]):
+        with connection:
+            for table, columns in (
+                ("documents", _DOCUMENT_COLUMNS),
+                ("blocks", _BLOCK_COLUMNS),
+            ):
+                rows = [
+                    tuple(row.get(column) for column in columns)
+                    for row_table, row in batch
+                    if row_table == table
+                ]
+                if rows:
+                    connection.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})",
+                        rows,
+                    )
+
+    def record(self, document: dict, blocks: list[dict]):
+        """
+        Queues rows of the generated document.
+        """
+        self._start()
+        self._queue.put(("documents", document))
+        for block in blocks:
+            self._queue.put(("blocks", block))
+
+    def flush(self):
+        """
+        Waits until all queued rows are written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join()
+
+    def query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with contextlib.closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            return connection.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _where(spec_name: str = None) -> tuple[str, tuple]:
+        if spec_name is None:
+            return "", ()
+
+        return "WHERE spec_name = ?", (spec_name,)
+
+    def latency(
+        self, by: str = "block_type", spec_name: str = None, percentiles=(50, 95)
+    ) -> dict[str, dict[str, float]]:
+        """
+        Returns block latency percentiles in seconds, e.g. {"TextBlock": {"p50": 1.2, ...}}.
+        """
+        if by not in _GROUP_BY:
+            raise ValueError(f"Unknown group: {by}. Expected one of {_GROUP_BY}")
+
+        where, params = self._where(spec_name)
+        latencies = {}
+        for row in self.query(f"SELECT {by}, latency FROM blocks {where}", params):
+            latencies.setdefault(row[0], []).append(row[1])
+
+        return {
+            group: {
+                "count": len(values),
+                **{f"p{p}": percentile(values, p) for p in percentiles},
+            }
+            for group, values in latencies.items()
+        }
+
+    def tokens(self, by: str = "block_type", spec_name: str = None) -> dict[str, dict]:
+        """
+        Returns block token usage and cost, e.g. {"TextBlock": {"total_tokens": 100, ...}}.
+        """
+        if by not in _GROUP_BY:
+            raise ValueError(f"Unknown group: {by}. Expected one of {_GROUP_BY}")
+
+        where, params = self._where(spec_name)
+        rows = self.query(
+            f"""
+            SELECT {by} AS grp, COUNT(*) AS count, SUM(prompt_tokens) AS prompt_tokens,
+                SUM(completion_tokens) AS completion_tokens, SUM(total_tokens) AS total_tokens,
+                AVG(total_tokens) AS avg_tokens, SUM(cost) AS cost, SUM(retries) AS retries
+            FROM blocks {where} GROUP BY {by} ORDER BY total_tokens DESC
+            """,
+            params,
+        )
+
+        return {row["grp"]: {key: row[key] for key in row.keys()[1:]} for row in rows}
+
+
+_stores: dict[str, StatsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_stats_store(path: str | Path = None) -> StatsStore:
+    """
+    Returns the store shared by the process for the given or configured database.
+    """
+    path = _path(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = StatsStore(path)
+
+        return _stores[path]
+
+
+def flush_stats(close: bool = False):
+    """
+    Waits until stats of all the stores are written.
+    """
+    with _stores_lock:
+        stores = list(_stores.values())
+
+    for store in stores:
+        if close:
+            store.close()
+        else:
+            store.flush()
+
+
+def _print_table(title: str, data: dict[str, dict]):
+    columns = [title] + list(next(iter(data.values()), {}).keys())
+    rows = [
+        [str(group)]
+        + [
+            f"{value:.3f}" if isinstance(value, float) else str(value)
+            for value in values.values()
+        ]
+        for group, values in data.items()
+    ]
+    widths = [max(len(row[i]) for row in [columns] + rows) for i in range(len(columns))]
+    for row in [columns] + rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m docchain.stats")
+    parser.add_argument("report", choices=["latency", "tokens"])
+    parser.add_argument("--db", help="Path of the stats database.")
+    parser.add_argument("--by", choices=_GROUP_BY, default="block_type")
+    parser.add_argument("--spec", help="Only include documents of the spec.")
+    args = parser.parse_args(argv)
+
+    store = StatsStore(args.db)
+    if args.report == "latency":
+        data = store.latency(by=args.by, spec_name=args.spec)
+    else:
+        data = store.tokens(by=args.by, spec_name=args.spec)
+
+    _print_table(args.by, data)
+
+
+if __name__ == "__main__":
+    main()
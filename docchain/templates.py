@@ -0,0 +1,138 @@
+"""
+Compiles Jinja templates used in block configs.
+
+All templates are compiled by a shared Environment. Compiled templates are cached by their
+source, so the same template used by many blocks or specs is compiled only once, as long as it
+is kept in the `Settings.template_cache_size` cache of the Environment. Bytecode
+cache allows to reuse compiled templates across processes when
+`Settings.template_bytecode_cache_dir` is set.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import ChainMap
+from collections.abc import Mapping
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from .settings import conf
+
+if TYPE_CHECKING:
+    from jinja2 import BytecodeCache, Environment, Template
+
+TEMPLATE_MARKERS = ("{{", "{%", "{#")
+
+
+def _memory_bytecode_cache() -> BytecodeCache:
+    from jinja2 import BytecodeCache
+
+    class MemoryBytecodeCache(BytecodeCache):
+        def __init__(self):
+            self._buckets = {}
+
+        def load_bytecode(self, bucket):
+            code = self._buckets.get(bucket.key)
+            if code is not None:
+                bucket.bytecode_from_string(code)
+
+        def dump_bytecode(self, bucket):
+            self._buckets[bucket.key] = bucket.bytecode_to_string()
+
+    return MemoryBytecodeCache()
+
+
+# Sources of the templates being loaded by this thread, they are not kept after the load.
+_loading = threading.local()
+_env = None
+_env_lock = threading.Lock()
+
+
+def _load_source(name: str) -> str | None:
+    return getattr(_loading, "sources", {}).get(name)
+
+
+def get_environment() -> Environment:
+    global _env
+
+    with _env_lock:
+        if _env is None:
+            from jinja2 import Environment, FileSystemBytecodeCache, FunctionLoader
+
+            if conf.template_bytecode_cache_dir:
+                bytecode_cache = FileSystemBytecodeCache(
+                    conf.template_bytecode_cache_dir
+                )
+            else:
+                bytecode_cache = _memory_bytecode_cache()
+
+            _env = Environment(
+                loader=FunctionLoader(_load_source),
+                bytecode_cache=bytecode_cache,
+                cache_size=conf.template_cache_size,
+            )
+
+    return _env
+
+
+class CompiledTemplate:
+    """
+    Compiled config string. Strings without template syntax are not rendered at all.
+    Templates are compiled on first use, e.g. when the plan of the spec is built.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.is_static = not any(marker in source for marker in TEMPLATE_MARKERS)
+
+    @cached_property
+    def template(self) -> Template | None:
+        if self.is_static:
+            return None
+
+        name = hashlib.sha1(self.source.encode()).hexdigest()
+        if not hasattr(_loading, "sources"):
+            _loading.sources = {}
+        _loading.sources[name] = self.source
+        try:
+            return get_environment().get_template(name)
+        finally:
+            del _loading.sources[name]
+
+    @cached_property
+    def variables(self) -> frozenset[str]:
+        if self.is_static:
+            return frozenset()
+
+        from jinja2 import meta
+
+        return frozenset(
+            meta.find_undeclared_variables(get_environment().parse(self.source))
+        )
+
+    def render(self, context: Mapping) -> str:
+        if self.is_static:
+            return self.source
+
+        # Context is used as is, Template.render would copy it to a dict.
+        template = self.template
+        ctx = template.new_context(ChainMap(context, template.globals), shared=True)
+        try:
+            return template.environment.concat(template.root_render_func(ctx))
+        except Exception:
+            return template.environment.handle_exception()
+
+    def __deepcopy__(self, memo):
+        # Compiled templates are immutable and can be shared between copies of blocks.
+        return self
+
+
+def compile_config(config: dict) -> dict[str, CompiledTemplate]:
+    """
+    Compiles string values of the block config.
+    """
+    return {
+        key: CompiledTemplate(value)
+        for key, value in config.items()
+        if isinstance(value, str)
+    }
@@ -0,0 +1,245 @@
+"""
+Tracing spans of document generation.
+
+Spans are opened around the phases of block calls, document building, middleware layers and
+workspace I/O, and passed to the exporter when they are closed. Tracing is disabled until an
+exporter is set, and disabled spans are a shared no-op context manager.
+
+    from docchain.tracing import ChromeTraceExporter, set_exporter
+
+    set_exporter(ChromeTraceExporter("trace.json"))
+
+The Chrome trace file can be opened in chrome://tracing or https://ui.perfetto.dev. Set
+`DOCCHAIN_TRACE_FILE` to trace all generators. Middleware layers are traced only when the
+exporter is set before the Generator is created.
+"""
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+from functools import wraps
+from typing import Any
+
+_exporter: "BaseExporter | None" = None
+_noop = contextlib.nullcontext()
+
+
+class Span:
+    __slots__ = ("name", "category", "args", "start", "end", "thread_id")
+
+    def __init__(self, name: str, category: str, args: dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+        self.end = None
+        self.thread_id = None
+
+    @property
+    def duration(self) -> float:
+        """
+        Duration in seconds.
+        """
+        return (self.end - self.start) / 1e9
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(self)
+
+
+class BaseExporter:
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class MemoryExporter(BaseExporter):
+    """
+    Keeps finished spans in memory.
+    """
+
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+
+class ChromeTraceExporter(BaseExporter):
+    """
+    Writes spans to a local file in the Chrome trace event format. Events are buffered and
+    appended to the file when the buffer is full, on flush and at exit, so the file is never
+    rewritten. The file is a JSON array of the events, which is closed after every write.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 10000):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._events = []
+        # Offset of the closing bracket and the number of the written events.
+        self._end = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": span.start / 1000,
+            "dur": (span.end - span.start) / 1000,
+            "pid": os.getpid(),
+            "tid": span.thread_id,
+            "args": span.args,
+        }
+        with self._lock:
+            self._events.append(event)
+            full = len(self._events) >= self.buffer_size
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                events, self._events = self._events, []
+
+            if not events and self._end is not None:
+                return
+
+            chunk = ",\n".join(json.dumps(event, default=str) for event in events)
+            if self._end is None:
+                file = open(self.path, "wb")
+                file.write(b"[\n")
+            else:
+                file = open(self.path, "r+b")
+                file.seek(self._end)
+                if events and self._count:
+                    file.write(b",\n")
+
+            with file:
+                file.write(chunk.encode())
+                self._count += len(events)
+                self._end = file.tell()
+                file.write(b"\n]\n")
+                file.truncate()
+
+
+def set_exporter(exporter: BaseExporter | None):
+    global _exporter
+    _exporter = exporter
+
+
+def get_exporter() -> BaseExporter | None:
+    return _exporter
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+def span(name: str, category: str = "docchain", **args):
+    if _exporter is None:
+        return _noop
+
+    return Span(name, category, args)
+
+
+def trace_handler(name: str, handler: callable, is_async: bool) -> callable:
+    """
+    Wraps the middleware layer with a span, when tracing is enabled.
+    """
+    if _exporter is None:
+        return handler
+
+    if is_async:
+
+        @wraps(handler)
+        async def traced(spec):
+            with span(name, category="middleware"):
+                return await handler(spec)
+
+    else:
+
+        @wraps(handler)
+        def traced(spec):
+            with span(name, category="middleware"):
+                return handler(spec)
+
+    return traced
+
+
+class _TracedFile:
+    """
+    Traces closing of the file, which is when remote filesystems upload it.
+    """
+
+    def __init__(self, file, path: str):
+        self._file = file
+        self._path = path
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with span("fs.close", category="fs", path=self._path):
+            self._file.close()
+
+
+class _TracedFileSystem:
+    """
+    Proxy of the fsspec filesystem which traces its calls.
+    """
+
+    def __init__(self, fs):
+        self._fs = fs
+
+    def __getattr__(self, name):
+        attr = getattr(self._fs, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        @wraps(attr)
+        def traced(*args, **kwargs):
+            path = str(args[0]) if args else None
+            with span(f"fs.{name}", category="fs", path=path):
+                res = attr(*args, **kwargs)
+
+            if name == "open":
+                return _TracedFile(res, path)
+
+            return res
+
+        return traced
+
+
+def trace_fs(fs):
+    if _exporter is None:
+        return fs
+
+    return _TracedFileSystem(fs)
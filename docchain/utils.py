@@ -1,3 +1,19 @@
+import asyncio
+import copy
+import importlib
+import inspect
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+
+# Event loop running the async generation. Sync code executed in worker threads uses it to
+# call back into async code.
+_event_loop: ContextVar[asyncio.AbstractEventLoop | None] = ContextVar(
+    "docchain_event_loop", default=None
+)
+
+
 def set_nested_val(obj: dict, path: str, value: any):
     *path, last = path.split(".")
 
@@ -8,3 +24,111 @@ def set_nested_val(obj: dict, path: str, value: any):
         obj = obj.setdefault(key, {})
 
     obj[last] = value
+
+
+def copy_model(model, **update):
+    """
+    Returns shallow copy of the pydantic model with the fields updated. Unlike
+    `BaseModel.copy()`, fields excluded from export, e.g. callbacks, are kept, and unlike
+    `copy.copy()`, the copy does not share `__dict__` with the model.
+    """
+    res = copy.copy(model)
+    object.__setattr__(res, "__dict__", {**model.__dict__, **update})
+
+    return res
+
+
+_stats_lock = threading.Lock()
+
+
+def incr_stat(stats: dict, name: str, value: int | float = 1):
+    """
+    Increments document stats counter. Safe to use from concurrently running blocks.
+    """
+    with _stats_lock:
+        stats[name] = stats.get(name, 0) + value
+
+
+def is_async_callable(obj: any) -> bool:
+    if hasattr(obj, "is_async"):
+        return obj.is_async
+
+    return inspect.iscoroutinefunction(obj) or inspect.iscoroutinefunction(
+        getattr(obj, "__call__", None)
+    )
+
+
+async def maybe_await(value: any) -> any:
+    if inspect.isawaitable(value):
+        return await value
+
+    return value
+
+
+def await_sync(value: any) -> any:
+    """
+    Waits for the awaitable from sync code. When called from a worker thread of the async
+    generation, the awaitable runs on its event loop. When called from a thread running an
+    event loop, which can't be blocked, it runs on a new loop in another thread.
+    """
+    if not inspect.isawaitable(value):
+        return value
+
+    loop = _event_loop.get()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+
+    if loop is not None and loop is not running:
+        return asyncio.run_coroutine_threadsafe(value, loop).result()
+
+    if running is None:
+        return asyncio.run(value)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(copy_context().run, asyncio.run, value).result()
+
+
+def async_to_sync(func: callable) -> callable:
+    def run(*args, **kwargs):
+        return await_sync(func(*args, **kwargs))
+
+    return run
+
+
+def sync_to_async(func: callable) -> callable:
+    """
+    Runs sync function in a worker thread, so it does not block the event loop.
+    """
+
+    async def run(*args, **kwargs):
+        token = _event_loop.set(asyncio.get_running_loop())
+        try:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        finally:
+            _event_loop.reset(token)
+
+    return run
+
+
+def lazy_attributes(package: str, attributes: dict[str, str]) -> Callable[[str], any]:
+    """
+    Returns module `__getattr__` which imports attributes from their modules on first access,
+    so importing the package does not import heavy dependencies, e.g. langchain.
+
+        __getattr__ = lazy_attributes(__name__, {"TextBlock": ".text"})
+    """
+
+    def __getattr__(name: str) -> any:
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        value = getattr(importlib.import_module(module, package), name)
+        # Next lookups don't call __getattr__.
+        setattr(importlib.import_module(package), name, value)
+
+        return value
+
+    return __getattr__
@@ -0,0 +1,527 @@
+"""
+Work queue of specs shared by worker processes on several nodes.
+
+Every worker loads the same list of specs and claims them with lease files in the `queue_dir`
+of the workspace. Leases are created exclusively, renewed by heartbeats and expire when the
+worker dies, so the spec is claimed again and resumed from its snapshot and journal. Specs are
+owned by the node selected by the hash of `spec.filename`, other nodes take them only when
+they run out of their own work. Finished specs are marked by the `.done` files.
+
+    docchain-worker myproject.specs.SPECS --node 0 --nodes 2 --processes 4 --concurrency 8
+
+Leases expire by the wall clock, so the clocks of the nodes must be synchronized within a
+fraction of `lease_ttl`. A worker which didn't renew its lease in time keeps generating the
+spec until its next heartbeat finds the lease taken over.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from functools import partial
+from logging import getLogger
+
+from pydantic import BaseModel
+from pydantic.utils import import_string
+
+from .documents import Document
+from .generator import Generator
+from .settings import conf
+from .specs import Spec
+from .workspace import get_workspace
+
+logger = getLogger(__name__)
+
+
+class Lease(BaseModel):
+    filename: str
+    owner: str
+    token: str
+    expires: float
+
+    @property
+    def expired(self) -> bool:
+        return self.expires < time.time()
+
+
+def _key(filename: str) -> str:
+    return hashlib.sha1(filename.encode()).hexdigest()
+
+
+def spec_node(spec: Spec, nodes: int) -> int:
+    """
+    Returns the node which owns the spec.
+    """
+    return int(_key(spec.filename), 16) % nodes
+
+
+class WorkQueue:
+    """
+    Leases of the specs held by one worker. Leases are renewed by a background thread while
+    the queue is open.
+    """
+
+    def __init__(
+        self,
+        node: int = 0,
+        nodes: int = 1,
+        worker_id: str = None,
+        steal: bool = True,
+        lease_ttl: float = None,
+        heartbeat_interval: float = None,
+        dirname: str = None,
+    ):
+        if not 0 <= node < nodes:
+            raise ValueError(f"Node {node} is out of range of {nodes} nodes.")
+
+        self.node = node
+        self.nodes = nodes
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.steal = steal
+        self.lease_ttl = lease_ttl or conf.lease_ttl
+        self.heartbeat_interval = heartbeat_interval or conf.lease_heartbeat_interval
+        self.dirname = dirname or conf.queue_dir
+        self._leases: dict[str, Lease] = {}
+        # Tokens of the leases of each spec written or taken over by the worker.
+        self._tokens: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def _path(self, filename: str, ext: str) -> str:
+        return f"{self.dirname}/{_key(filename)}.{ext}"
+
+    def owns(self, spec: Spec) -> bool:
+        return spec_node(spec, self.nodes) == self.node
+
+    def assigned(self, specs: Iterable[Spec]) -> list[Spec]:
+        """
+        Returns the specs this worker may claim, the ones owned by its node go first.
+        """
+        owned, others = [], []
+        for spec in specs:
+            if not spec.filename:
+                raise ValueError("Specs in the work queue must have a filename.")
+            (owned if self.owns(spec) else others).append(spec)
+
+        return owned + others if self.steal else owned
+
+    def pending(self, specs: Iterable[Spec]) -> list[Spec]:
+        """
+        Returns the specs which are not done yet, with one listing of the queue directory.
+        Specs without leases go first, so leases are read only when they run out.
+        """
+        workspace = get_workspace()
+        workspace.invalidate(self.dirname)
+        specs = list(specs)
+        exists = workspace.exists_many(
+            self._path(spec.filename, ext)
+            for spec in specs
+            for ext in ("done", "lease")
+        )
+        free, leased = [], []
+        for spec, done, lease in zip(specs, exists[::2], exists[1::2]):
+            if not done:
+                (leased if lease else free).append(spec)
+
+        return free + leased
+
+    def _new_lease(self, spec: Spec) -> Lease:
+        return Lease(
+            filename=spec.filename,
+            owner=self.worker_id,
+            token=uuid.uuid4().hex,
+            expires=time.time() + self.lease_ttl,
+        )
+
+    def _read_lease(self, path: str) -> Lease | None:
+        workspace = get_workspace()
+        data = ""
+        try:
+            with workspace.open(path, "r") as file:
+                data = file.read()
+            return Lease.parse_raw(data)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Lease written partially by a crashed worker expires by the modification time.
+            try:
+                modified = workspace.fs.modified(workspace.path(path)).timestamp()
+            except (FileNotFoundError, NotImplementedError):
+                modified = time.time()
+
+            return Lease(
+                filename="",
+                owner="",
+                token=f"invalid-{hashlib.sha1(data.encode()).hexdigest()}",
+                expires=modified + self.lease_ttl,
+            )
+
+    def _current_lease(self, filename: str) -> Lease | None:
+        """
+        Returns the lease of the spec with the expiry of its last heartbeat.
+        """
+        lease = self._read_lease(self._path(filename, "lease"))
+        if lease is None:
+            return None
+
+        heartbeat = self._read_lease(
+            self._path(f"{filename}.{lease.token}", "heartbeat")
+        )
+        if heartbeat is not None and heartbeat.token == lease.token:
+            lease = lease.copy(update={"expires": heartbeat.expires})
+
+        return lease
+
+    def _create(self, path: str, lease: Lease) -> bool:
+        """
+        Creates the file unless it exists. Filesystems which can't create files exclusively,
+        e.g. object stores, read the file back after `lease_settle_delay`, which is exclusive
+        as long as the writes of the racing workers take less than the delay.
+        """
+        data = lease.json()
+        try:
+            with get_workspace().open(path, "x") as file:
+                file.write(data)
+            return True
+        except FileExistsError:
+            return False
+        except (ValueError, NotImplementedError):
+            pass
+
+        workspace = get_workspace()
+        if workspace.fs.exists(workspace.path(path)):
+            return False
+
+        with workspace.open(path, "w") as file:
+            file.write(data)
+        time.sleep(conf.lease_settle_delay)
+        with workspace.open(path, "r") as file:
+            return file.read() == data
+
+    def acquire(self, spec: Spec) -> bool:
+        """
+        Claims the spec unless it's leased by a live worker or done already.
+
+        The lease file is created exclusively. Expired lease is taken over by the worker
+        which exclusively creates the takeover marker of its token, so the lease file is
+        only written by one worker for each token and is never overwritten by a worker
+        racing for the same lease.
+        """
+        path = self._path(spec.filename, "lease")
+        lease = self._new_lease(spec)
+        tokens = {lease.token}
+        if not self._create(path, lease):
+            current = self._current_lease(spec.filename)
+            if current is None or not current.expired:
+                return False
+
+            takeover = self._path(f"{spec.filename}.{current.token}", "takeover")
+            if not self._create(takeover, lease):
+                return False
+
+            tokens.add(current.token)
+
+            with get_workspace().open(path, "w") as file:
+                file.write(lease.json())
+            logger.info(
+                f"Took over expired lease of {spec.filename} from {current.owner}"
+            )
+
+        workspace = get_workspace()
+        # Done marker could be written by other workers meanwhile.
+        workspace.invalidate(self.dirname)
+        if workspace.fs.exists(workspace.path(self._path(spec.filename, "done"))):
+            self._remove_leases(spec.filename, tokens)
+            return False
+
+        with self._lock:
+            self._leases[spec.filename] = lease
+            self._tokens.setdefault(spec.filename, set()).update(tokens)
+
+        return True
+
+    def _remove_leases(self, filename: str, tokens: set[str]):
+        """
+        Removes the lease of the done spec with the heartbeats and takeover markers of the
+        given tokens and of the current lease. Files are removed by name, so the queue
+        directory is not listed.
+        """
+        current = self._read_lease(self._path(filename, "lease"))
+        if current is not None:
+            tokens = tokens | {current.token}
+
+        get_workspace().rm(
+            self._path(filename, "lease"),
+            *(
+                self._path(f"{filename}.{token}", ext)
+                for token in tokens
+                for ext in ("heartbeat", "takeover")
+            ),
+        )
+
+    def _holds(self, lease: Lease) -> bool:
+        current = self._read_lease(self._path(lease.filename, "lease"))
+        return current is not None and current.token == lease.token
+
+    def _heartbeat_path(self, lease: Lease) -> str:
+        return self._path(f"{lease.filename}.{lease.token}", "heartbeat")
+
+    def release(self, spec: Spec, done: bool = False):
+        """
+        Releases the lease of the spec. Done specs are not claimed again by any worker, the
+        others can be claimed immediately.
+        """
+        with self._lock:
+            lease = self._leases.pop(spec.filename, None)
+            tokens = self._tokens.pop(spec.filename, set()) if done else set()
+
+        if done:
+            with get_workspace().open(self._path(spec.filename, "done"), "w") as file:
+                file.write(
+                    json.dumps({"filename": spec.filename, "owner": self.worker_id})
+                )
+            self._remove_leases(spec.filename, tokens)
+        elif lease is not None and self._holds(lease):
+            # Heartbeat of the lease's own token expires it, leases of the other workers
+            # are never written.
+            with get_workspace().open(self._heartbeat_path(lease), "w") as file:
+                file.write(lease.copy(update={"expires": 0}).json())
+
+    def renew(self):
+        """
+        Extends the leases held by the worker by writing their heartbeats. Leases taken over
+        by other workers, e.g. after a long pause of this one, are dropped.
+        """
+        with self._lock:
+            leases = list(self._leases.values())
+
+        for lease in leases:
+            if not self._holds(lease):
+                current = self._read_lease(self._path(lease.filename, "lease"))
+                owner = current.owner if current is not None else None
+                logger.warning(f"Lease of {lease.filename} was taken by {owner}")
+                with self._lock:
+                    if self._leases.get(lease.filename) is lease:
+                        del self._leases[lease.filename]
+                continue
+
+            # Heartbeat is only written by the owner of the token, so it can't overwrite the
+            # lease of a worker which took over meanwhile.
+            with get_workspace().open(self._heartbeat_path(lease), "w") as file:
+                file.write(
+                    lease.copy(update={"expires": time.time() + self.lease_ttl}).json()
+                )
+
+    @property
+    def leases(self) -> list[str]:
+        """
+        Filenames of the specs leased by the worker.
+        """
+        with self._lock:
+            return list(self._leases)
+
+    def _run_heartbeat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self.renew()
+            except Exception:
+                logger.exception("Failed to renew leases")
+
+    def open(self):
+        if self._heartbeat is None:
+            self._stopped.clear()
+            self._heartbeat = threading.Thread(
+                target=self._run_heartbeat, name="docchain-heartbeat", daemon=True
+            )
+            self._heartbeat.start()
+
+    def close(self):
+        if self._heartbeat is not None:
+            self._stopped.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Worker:
+    """
+    Generates the specs claimed from the work queue on a pool of `concurrency` threads.
+    """
+
+    def __init__(
+        self,
+        generator: Generator,
+        queue: WorkQueue,
+        concurrency: int = 1,
+        poll_interval: float = None,
+    ):
+        self.generator = generator
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval or conf.queue_poll_interval
+
+    def _claim(self, specs: list[Spec], limit: int) -> list[Spec]:
+        claimed = []
+        for spec in specs:
+            if len(claimed) >= limit:
+                break
+            if self.queue.acquire(spec):
+                claimed.append(spec)
+
+        return claimed
+
+    def run(self, specs: Iterable[Spec]) -> Iterator[tuple[Spec, Document | Exception]]:
+        """
+        Yields specs with generated documents or errors until all the specs
+        assigned to the worker are done. Specs leased by live workers are waited for, so
+        the ones abandoned by dead workers are resumed here. Failed specs are not claimed
+        again by this worker.
+        """
+        pending = self.queue.assigned(specs)
+        running = {}
+        with self.queue, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                if len(running) < self.concurrency:
+                    pending = self.queue.pending(pending)
+                    for spec in self._claim(pending, self.concurrency - len(running)):
+                        pending.remove(spec)
+                        future = executor.submit(
+                            copy_context().run, self.generator, spec
+                        )
+                        running[future] = spec
+
+                if not running:
+                    if not pending:
+                        break
+
+                    time.sleep(self.poll_interval)
+                    continue
+
+                finished, _ = wait(
+                    running, timeout=self.poll_interval, return_when=FIRST_COMPLETED
+                )
+                if finished:
+                    # Documents written behind are saved before the specs are marked done.
+                    self.generator.flush()
+
+                for future in finished:
+                    spec = running.pop(future)
+                    try:
+                        res = future.result()
+                    except Exception as exc:
+                        # Spec is released, so one broken spec doesn't hold the others.
+                        res = exc
+                    self.queue.release(spec, done=not isinstance(res, Exception))
+                    yield spec, res
+
+
+def load_specs(path: str) -> list[Spec]:
+    """
+    Imports specs by the dotted path of a list of specs or a function which returns them.
+    """
+    specs = import_string(path)
+    if callable(specs):
+        specs = specs()
+
+    return list(specs)
+
+
+def run_worker(
+    process: int,
+    specs_path: str,
+    middleware: list[str],
+    node: int,
+    nodes: int,
+    processes: int,
+    concurrency: int,
+    steal: bool,
+) -> tuple[int, int]:
+    """
+    Runs the worker in the current process. Returns numbers of generated and failed documents.
+    """
+    specs = load_specs(specs_path)
+    # Processes of the node start with different specs, so they don't race for the leases.
+    shift = process * len(specs) // processes
+    specs = specs[shift:] + specs[:shift]
+
+    generator = Generator(middleware=[import_string(path) for path in middleware])
+    queue = WorkQueue(node=node, nodes=nodes, steal=steal)
+    generated = failed = 0
+    with generator:
+        for spec, res in Worker(generator, queue, concurrency=concurrency).run(specs):
+            if isinstance(res, Exception):
+                logger.error(
+                    f"Failed to generate {spec.filename}: {res.__cause__ or res!r}"
+                )
+                failed += 1
+            else:
+                generated += 1
+
+    return generated, failed
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="docchain-worker")
+    parser.add_argument(
+        "specs", help="Dotted path of the specs or a function returning them."
+    )
+    parser.add_argument("--node", type=int, default=0, help="Index of this node.")
+    parser.add_argument("--nodes", type=int, default=1, help="Number of nodes.")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Documents generated by each process.",
+    )
+    parser.add_argument(
+        "--middleware",
+        action="append",
+        help="Dotted path of the generator middleware. Defaults to SaveDocumentMiddleware.",
+    )
+    parser.add_argument(
+        "--no-steal",
+        dest="steal",
+        action="store_false",
+        help="Only generate the specs owned by this node.",
+    )
+    args = parser.parse_args(argv)
+
+    params = dict(
+        specs_path=args.specs,
+        middleware=args.middleware or ["docchain.middleware.SaveDocumentMiddleware"],
+        node=args.node,
+        nodes=args.nodes,
+        processes=args.processes,
+        concurrency=args.concurrency,
+        steal=args.steal,
+    )
+    if args.processes == 1:
+        results = [run_worker(0, **params)]
+    else:
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            results = pool.map(partial(run_worker, **params), range(args.processes))
+
+    generated = sum(res[0] for res in results)
+    failed = sum(res[1] for res in results)
+    print(f"Generated {generated} documents, {failed} failed.")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
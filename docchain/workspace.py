@@ -0,0 +1,349 @@
+"""
+Workspace where documents, snapshots, journals and caches are stored.
+
+Workspace owns the filesystem instance, so it's created once per backend and params, and keeps
+a cache of directory listings, so existence checks of the document files don't make a round
+trip each. Listings are refreshed after `fs_listing_ttl` seconds, files written or removed
+through the workspace update them immediately. Files written by other processes could be missed
+until then, so the paths which read them, e.g. resuming a document, check the files directly.
+Removal does not trust the listings. Batch operations run concurrently on the
+filesystems with async implementation, e.g. S3 or GCS.
+"""
+import asyncio
+import os
+import posixpath
+import threading
+import time
+from collections.abc import Iterable
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .settings import conf, get_filesystem
+from .tracing import trace_fs
+
+if TYPE_CHECKING:
+    from fsspec import AbstractFileSystem
+
+logger = getLogger(__name__)
+
+_WRITE_MODES = ("w", "a", "x")
+
+
+class Workspace:
+    def __init__(self, fs: "AbstractFileSystem", root: str, listing_ttl: float = 5.0):
+        self._fs = fs
+        self.root = str(root).rstrip("/")
+        self.listing_ttl = listing_ttl
+        self._listings: dict[str, tuple[float, set[str]]] = {}
+        self._dirs = set()
+        self._lock = threading.Lock()
+        # Object stores, e.g. GCS, can't append to the files, data appended to a file is
+        # written there as numbered segments instead.
+        self._can_append = True
+        self._next_segment: dict[str, int] = {}
+        self._segmented: set[str] = set()
+        self._segments_lock = threading.Lock()
+
+    @property
+    def fs(self) -> "AbstractFileSystem":
+        return trace_fs(self._fs)
+
+    @property
+    def _is_async(self) -> bool:
+        return getattr(self._fs, "async_impl", False) and not getattr(
+            self._fs, "asynchronous", False
+        )
+
+    def path(self, name: str | Path) -> str:
+        return f"{self.root}/{name}"
+
+    def _split(self, name: str | Path) -> tuple[str, str]:
+        dirname, basename = posixpath.split(str(name))
+        return dirname, basename
+
+    def local_path(self, name: str) -> str:
+        """
+        Returns local path of the file, for the libraries which can't use fsspec, e.g. SQLite.
+        """
+        if "file" not in self._fs.protocol:
+            raise ValueError(
+                f"Workspace on {self._fs.protocol} filesystem has no local paths."
+            )
+
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        return path
+
+    def _gather(self, method: str, paths: list[str]) -> list:
+        """
+        Calls the filesystem method for the paths, concurrently if the filesystem is async.
+        """
+        if self._is_async and len(paths) > 1:
+            from fsspec.asyn import sync
+
+            async def run():
+                coros = [getattr(self._fs, f"_{method}")(path) for path in paths]
+                return await asyncio.gather(*coros, return_exceptions=True)
+
+            return sync(self._fs.loop, run)
+
+        res = []
+        for path in paths:
+            try:
+                res.append(getattr(self.fs, method)(path))
+            except Exception as exc:
+                res.append(exc)
+
+        return res
+
+    def _fetch_listings(self, dirnames: list[str]) -> dict[str, set[str]]:
+        paths = [self.path(dirname) if dirname else self.root for dirname in dirnames]
+        now = time.monotonic()
+        listings = {}
+        for dirname, listing in zip(dirnames, self._gather("ls", paths)):
+            if isinstance(listing, FileNotFoundError):
+                listing = []
+            elif isinstance(listing, Exception):
+                raise listing
+
+            names = set()
+            for entry in listing:
+                name = entry["name"] if isinstance(entry, dict) else entry
+                names.add(name.rstrip("/").rsplit("/", 1)[-1])
+
+            listings[dirname] = names
+            with self._lock:
+                self._listings[dirname] = (now, names)
+
+        return listings
+
+    def _listing(self, dirname: str) -> set[str] | None:
+        with self._lock:
+            cached = self._listings.get(dirname)
+
+        if cached is None or time.monotonic() - cached[0] > self.listing_ttl:
+            return None
+
+        return cached[1]
+
+    def exists_many(
+        self, names: Iterable[str | Path], cached: bool = True
+    ) -> list[bool]:
+        """
+        Checks existence of the files with one listing per directory. Uncached checks ask for
+        each file concurrently, e.g. for a few files which could be written by other processes.
+        """
+        if not cached:
+            names = list(names)
+            res = self._gather("exists", [self.path(name) for name in names])
+            for name, exists in zip(names, res):
+                if isinstance(exists, Exception):
+                    raise exists
+                self._update_listing(name, exists)
+
+            return res
+
+        names = [self._split(name) for name in names]
+        listings = {dirname: self._listing(dirname) for dirname, _ in names}
+        missing = [dirname for dirname, listing in listings.items() if listing is None]
+        if missing:
+            # Fetched listings are used even if they expire meanwhile, e.g. with zero ttl.
+            listings.update(self._fetch_listings(missing))
+
+        return [basename in listings[dirname] for dirname, basename in names]
+
+    def exists(self, name: str | Path) -> bool:
+        return self.exists_many([name])[0]
+
+    def _update_listing(self, name: str | Path, exists: bool):
+        dirname, basename = self._split(name)
+        with self._lock:
+            cached = self._listings.get(dirname)
+            if cached is not None:
+                if exists:
+                    cached[1].add(basename)
+                else:
+                    cached[1].discard(basename)
+
+    def open(self, name: str | Path, mode: str = "r", **kwargs):
+        """
+        Opens the file. Directories of the written files are created.
+        """
+        if mode[0] in _WRITE_MODES:
+            dirname = self._split(name)[0]
+            created = dirname in self._dirs
+            if not created:
+                self._makedirs(dirname)
+
+            try:
+                file = self.fs.open(self.path(name), mode=mode, **kwargs)
+            except FileNotFoundError:
+                if not created:
+                    raise
+                # Directory was removed by another process since it was created.
+                self._makedirs(dirname)
+                file = self.fs.open(self.path(name), mode=mode, **kwargs)
+            self._update_listing(name, exists=True)
+
+            return file
+
+        return self.fs.open(self.path(name), mode=mode, **kwargs)
+
+    def append(self, name: str | Path, data: str):
+        """
+        Appends the data to the file. Filesystems which can't append, e.g. GCS, get a new
+        segment object for every call instead, so the cost does not grow with the file.
+        Appended data is read with `read_appended`.
+        """
+        if self._can_append:
+            try:
+                with self.open(name, "a") as file:
+                    file.write(data)
+                return
+            except (ValueError, NotImplementedError):
+                logger.info(f"Appending is not supported by {self._fs.protocol}")
+                self._can_append = False
+
+        name = str(name)
+        with self._segments_lock:
+            seq = self._next_segment.get(name)
+            if seq is None:
+                # Segments of the previous runs are kept, e.g. of a worker which died.
+                segments = self._segments(name)
+                seq = int(segments[-1]) + 1 if segments else 0
+            self._next_segment[name] = seq + 1
+            self._segmented.add(name)
+
+        with self.open(f"{self.segments_dir(name)}/{seq:06d}", "w") as file:
+            file.write(data)
+
+    def read_appended(self, name: str | Path) -> str:
+        """
+        Returns the data appended to the file, including its segments. Raises
+        FileNotFoundError when nothing was appended.
+        """
+        name = str(name)
+        try:
+            with self.open(name, "r") as file:
+                content = file.read()
+        except FileNotFoundError:
+            content = None
+
+        segments = self._segments(name)
+        if not segments:
+            if content is None:
+                raise FileNotFoundError(self.path(name))
+
+            return content
+
+        with self._segments_lock:
+            self._segmented.add(name)
+            self._next_segment.setdefault(name, int(segments[-1]) + 1)
+
+        paths = [self.path(f"{self.segments_dir(name)}/{seq}") for seq in segments]
+        parts = [content or ""]
+        for data in self._gather("cat_file", paths):
+            if isinstance(data, Exception):
+                raise data
+            parts.append(data.decode())
+
+        return "".join(parts)
+
+    @staticmethod
+    def segments_dir(name: str | Path) -> str:
+        """
+        Returns directory of the segments appended to the file.
+        """
+        return f"{name}.d"
+
+    def _segments(self, name: str) -> list[str]:
+        try:
+            listing = self.fs.ls(self.path(self.segments_dir(name)), detail=False)
+        except FileNotFoundError:
+            return []
+
+        return sorted(
+            segment
+            for segment in (path.rstrip("/").rsplit("/", 1)[-1] for path in listing)
+            if segment.isdigit()
+        )
+
+    def _makedirs(self, dirname: str):
+        self.fs.makedirs(self.path(dirname) if dirname else self.root, exist_ok=True)
+        with self._lock:
+            self._dirs.add(dirname)
+
+    def rm(self, *names: str | Path):
+        """
+        Removes the files, missing ones are skipped. Listings are not trusted here, as the files
+        could be written by other processes since they were fetched. Segments of the appended
+        files are removed with them.
+        """
+        for res in self._gather("rm_file", [self.path(name) for name in names]):
+            if isinstance(res, Exception) and not isinstance(res, FileNotFoundError):
+                raise res
+
+        for name in names:
+            self._update_listing(name, exists=False)
+
+        with self._segments_lock:
+            segmented = [str(name) for name in names if str(name) in self._segmented]
+            for name in segmented:
+                self._segmented.discard(name)
+                self._next_segment.pop(name, None)
+
+        for name in segmented:
+            try:
+                self.fs.rm(self.path(self.segments_dir(name)), recursive=True)
+            except FileNotFoundError:
+                pass
+
+    def mv(self, source: str | Path, target: str | Path):
+        """
+        Moves the file, replacing the target. Atomic on local filesystems.
+        """
+        self.fs.mv(self.path(source), self.path(target))
+        self._update_listing(source, exists=False)
+        self._update_listing(target, exists=True)
+
+    def ls(self, dirname: str = "") -> list[str]:
+        """
+        Returns names of the files in the workspace directory.
+        """
+        listing = self._listing(dirname)
+        if listing is None:
+            listing = self._fetch_listings([dirname])[dirname]
+
+        return sorted(listing)
+
+    def invalidate(self, dirname: str = None):
+        """
+        Drops cached listings, e.g. when files could be changed by other processes.
+        """
+        with self._lock:
+            if dirname is None:
+                self._listings.clear()
+            else:
+                self._listings.pop(dirname, None)
+
+
+_workspaces: dict[tuple, Workspace] = {}
+_workspaces_lock = threading.Lock()
+
+
+def get_workspace() -> Workspace:
+    """
+    Returns the workspace of the current settings.
+    """
+    fs = get_filesystem(conf.fs_backend, conf.fs_params)
+    key = (id(fs), str(conf.fs_workspace), conf.fs_listing_ttl)
+    with _workspaces_lock:
+        workspace = _workspaces.get(key)
+        if workspace is None:
+            workspace = _workspaces[key] = Workspace(
+                fs, conf.fs_workspace, listing_ttl=conf.fs_listing_ttl
+            )
+
+        return workspace
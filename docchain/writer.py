@@ -0,0 +1,188 @@
+"""
+Background writer of the generated documents.
+
+Writes are queued and done by a background thread, so generation does not wait for the storage.
+The queue is bounded, so producers are slowed down when the storage can't keep up. Failed
+writes are retried with exponential backoff and counted in the writer stats and in the stats
+of the document. Callback of the write is called only when it succeeds, e.g. to remove the
+snapshot of the document. Call `Generator.flush` or `Generator.close` to wait for the queued
+writes.
+"""
+import atexit
+import queue
+import threading
+import time
+import weakref
+from collections.abc import Callable
+from logging import getLogger
+
+from .settings import conf
+from .utils import incr_stat
+from .workspace import Workspace
+
+logger = getLogger(__name__)
+
+
+class BackgroundWriter:
+    _STOP = object()
+
+    def __init__(
+        self, max_queue_size: int = 100, max_retries: int = 3, backoff: float = 0.5
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = {}
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._atexit = False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="docchain-writer", daemon=True
+                )
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.close)
+                    self._atexit = True
+
+    def submit(
+        self,
+        workspace: Workspace,
+        name: str,
+        text: str,
+        stats: dict = None,
+        on_written: Callable[[], None] = None,
+    ):
+        """
+        Queues the write. Blocks when the queue is full.
+        """
+        self._start()
+        incr_stat(self.stats, "queued")
+        self._queue.put((workspace, name, text, stats, on_written))
+
+    def _write(
+        self,
+        workspace: Workspace,
+        name: str,
+        text: str,
+        stats: dict | None,
+        on_written: Callable[[], None] | None,
+    ):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with workspace.open(name, "w") as file:
+                    file.write(text)
+            except Exception:
+                if attempt == self.max_retries:
+                    logger.exception(f"Failed to write {name}")
+                    incr_stat(self.stats, "failed")
+                    if stats is not None:
+                        incr_stat(stats, "save_failed")
+                    return
+
+                incr_stat(self.stats, "retries")
+                if stats is not None:
+                    incr_stat(stats, "save_retries")
+                time.sleep(self.backoff * 2**attempt)
+            else:
+                incr_stat(self.stats, "written")
+                if on_written is not None:
+                    try:
+                        on_written()
+                    except Exception:
+                        logger.exception(f"Callback of {name} write failed")
+                return
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Waits until all queued documents are written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        Writes queued documents and stops the thread. Writer is started again on submit.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join()
+
+
+_writer: BackgroundWriter | None = None
+_writer_lock = threading.Lock()
+# Number of the open generators. The writer is closed with the last of them.
+_writer_users = 0
+
+
+def get_writer() -> BackgroundWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BackgroundWriter(
+                max_queue_size=conf.save_queue_size,
+                max_retries=conf.save_max_retries,
+                backoff=conf.save_retry_backoff,
+            )
+
+        return _writer
+
+
+def flush_writer():
+    if _writer is not None:
+        _writer.flush()
+
+
+def _release_writer() -> bool:
+    global _writer_users
+    with _writer_lock:
+        _writer_users -= 1
+        return _writer_users == 0
+
+
+def open_writer(owner: object) -> weakref.finalize:
+    """
+    Counts the owner as a user of the writer until the returned finalizer is passed to
+    `close_writer` or the owner is garbage collected without being closed.
+    """
+    global _writer_users
+    with _writer_lock:
+        _writer_users += 1
+
+    user = weakref.finalize(owner, _release_writer)
+    # Writer is closed at exit by itself.
+    user.atexit = False
+
+    return user
+
+
+def close_writer(user: weakref.finalize) -> bool:
+    """
+    Closes the writer when it's not used by other generators. Returns whether it was the
+    last user, otherwise only waits for the queued writes.
+    """
+    # Finalizer returns None when the user was released already.
+    last = bool(user())
+    if _writer is not None:
+        if last:
+            _writer.close()
+        else:
+            _writer.flush()
+
+    return last
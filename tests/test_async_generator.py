@@ -0,0 +1,114 @@
+import asyncio
+
+from docchain.blocks import TextBlock
+from docchain.documents import Document, Format
+from docchain.generator import Generator
+from docchain.middleware.base import AbstractMiddleware
+from docchain.specs import Spec
+from tests.testing.llms import AsyncFakeListLLM
+from tests.testing.middleware import (
+    AddSectionMiddleware,
+    async_mark_as_reviewed_middleware,
+    mark_as_draft_middleware,
+)
+
+
+def test_agenerate():
+    def callable_block(*args, **kwargs):
+        return "callable text"
+
+    callable_block.key = "callable"
+
+    generator = Generator(
+        middleware=(
+            mark_as_draft_middleware,
+            async_mark_as_reviewed_middleware,
+            AddSectionMiddleware,
+        ),
+        llm=AsyncFakeListLLM(responses=["first text", "second text"]),
+    )
+    spec = Spec(
+        title="Test title",
+        fmt=Format.yaml,
+        blocks=[
+            TextBlock("first", title="First"),
+            callable_block,
+            TextBlock("second", title="Second"),
+        ],
+    )
+
+    document: Document = asyncio.run(generator.agenerate(spec))
+
+    assert document.title == "WIP: Reviewed: Test title (Draft)"
+    assert document.stats == {"reviewed": 1}
+    assert document.text == (
+        "callable: callable text\nfirst: first text\nsecond: second text\n"
+    )
+    assert document.res["test"].title == "test document_title"
+    # original spec is not modified
+    assert spec.title == "Test title"
+
+
+def test_async_middleware_in_sync_generation():
+    generator = Generator(
+        middleware=(async_mark_as_reviewed_middleware, mark_as_draft_middleware),
+        llm=AsyncFakeListLLM(responses=[]),
+    )
+
+    document = generator(Spec(title="Test title"))
+
+    assert document.title == "Reviewed: WIP: Test title (Draft)"
+    assert document.stats == {"reviewed": 1}
+
+
+def test_sync_generation_in_running_loop():
+    class AsyncPassMiddleware(AbstractMiddleware):
+        async def spec_pass(self, spec: Spec):
+            await asyncio.sleep(0)
+            spec.title = f"Async: {spec.title}"
+
+    generator = Generator(
+        middleware=[AsyncPassMiddleware], llm=AsyncFakeListLLM(responses=[])
+    )
+
+    async def generate():
+        return generator(Spec(title="Test title"))
+
+    assert asyncio.run(generate()).title == "Async: Test title"
+
+
+def test_middleware_chains_are_built_on_first_use():
+    calls = []
+
+    def counting_middleware(build_document):
+        calls.append(build_document)
+        return build_document
+
+    generator = Generator(
+        middleware=[counting_middleware], llm=AsyncFakeListLLM(responses=[])
+    )
+    assert calls == []
+
+    generator(Spec(title="First"))
+    generator(Spec(title="Second"))
+    assert len(calls) == 1
+
+    asyncio.run(generator.agenerate(Spec(title="Third")))
+    assert len(calls) == 2
+
+
+def test_mixed_middleware_is_created_once():
+    calls = []
+
+    def counting_middleware(build_document):
+        calls.append(build_document)
+        return mark_as_draft_middleware(build_document)
+
+    generator = Generator(
+        middleware=[counting_middleware], llm=AsyncFakeListLLM(responses=[])
+    )
+    document = asyncio.run(generator.agenerate(Spec(title="Test title")))
+
+    # Sync step wraps the async handler without being called again.
+    assert document.title == "WIP: Test title (Draft)"
+    assert len(calls) == 1
@@ -0,0 +1,39 @@
+import json
+
+from benchmarks.__main__ import compare, main
+from benchmarks.suite import parse_json_schema
+
+
+def result(name: str, minimum: float, **params) -> dict:
+    return {"name": name, "params": params, "min": minimum}
+
+
+def test_compare():
+    results = [
+        result("format", 1.3, size=1),
+        result("format", 1.1, size=2),
+        result("generate", 1.0, blocks=1),
+    ]
+    baseline = [result("format", 1.0, size=1), result("format", 1.0, size=2)]
+
+    comparisons = compare(results, baseline, threshold=0.2)
+
+    # Results without a baseline are not compared.
+    assert [comparison["id"] for comparison in comparisons] == [
+        "format[size=1]",
+        "format[size=2]",
+    ]
+    assert [comparison["regression"] for comparison in comparisons] == [True, False]
+    assert round(comparisons[0]["ratio"], 2) == 1.3
+
+
+def test_regression_exit_code(tmpdir):
+    baseline = tmpdir.join("baseline.json")
+    baseline.write(json.dumps({"results": [result("spec_copy", 1e-9, blocks=1)]}))
+    args = ["--filter", "spec_copy", "--repeat", "1", "--min-time", "0"]
+
+    assert main(args + ["--baseline", str(baseline)]) == 1
+
+
+def test_parse_json_schema_fields():
+    assert len(parse_json_schema(200)()["properties"]) == 200
@@ -0,0 +1,81 @@
+import pytest
+
+from docchain.blocks import TextBlock
+from docchain.budget import TokenBudget, TokenBudgetExceeded, context_window
+from docchain.generator import Generator
+from docchain.specs import Spec
+from tests.conftest import override_settings
+from tests.testing.llms import MaxTokensFakeListLLM
+
+
+def test_context_window():
+    assert context_window("gpt-3.5-turbo-0301") == 4096
+    assert context_window("gpt-3.5-turbo-16k-0613") == 16384
+    assert context_window("unknown") == 4096
+
+    with override_settings(context_window=1000):
+        assert context_window("gpt-4") == 1000
+
+
+def test_budget_uses_hints_and_history():
+    llm = MaxTokensFakeListLLM(responses=["a" * 400] * 3)
+    generator = Generator(llm=llm, budget=TokenBudget(max_tokens=1000, margin=1.5))
+
+    def spec():
+        return Spec(
+            title="Test",
+            blocks=[
+                TextBlock("intro", title="Intro", max_tokens=200),
+                TextBlock("body", title="Body"),
+            ],
+        )
+
+    generator(spec())
+    # body had no history yet
+    assert llm.max_tokens_used == [200, 1000]
+
+    generator(Spec(title="Test", blocks=[TextBlock("body", title="Body")]))
+    # 400 chars is 100 tokens
+    assert llm.max_tokens_used[-1] == 150
+
+
+def test_budget_is_capped_by_context_window():
+    llm = MaxTokensFakeListLLM(responses=["result"])
+    spec = Spec(title="Test", blocks=[TextBlock("body", title="x" * 3600)])
+
+    with override_settings(context_window=1000):
+        Generator(llm=llm, budget=TokenBudget(max_tokens=500))(spec)
+
+    assert 0 < llm.max_tokens_used[0] < 100
+
+
+def test_budget_refuses_blocks_which_do_not_fit():
+    llm = MaxTokensFakeListLLM(responses=["result"])
+    spec = Spec(title="Test", blocks=[TextBlock("body", title="x" * 4000)])
+
+    with override_settings(context_window=1000):
+        with pytest.raises(Exception) as exc_info:
+            Generator(llm=llm, budget=TokenBudget())(spec)
+
+    assert isinstance(exc_info.value.__cause__, TokenBudgetExceeded)
+    assert llm.max_tokens_used == []
+
+
+def test_budgeted_chains_are_reused():
+    from langchain.chains import LLMChain
+    from langchain.prompts import PromptTemplate
+
+    llm = MaxTokensFakeListLLM(responses=[])
+    chain = LLMChain(prompt=PromptTemplate.from_template("{text}"), llm=llm)
+    block = TextBlock("body", title="Body", max_tokens=100)
+    budget = TokenBudget(chain_cache_size=1)
+
+    budgeted = budget.apply(block, chain, "prompt")
+    assert budgeted.llm.max_tokens == 100
+    assert llm.max_tokens == 2048
+    assert budget.apply(block, chain, "prompt") is budgeted
+
+    # Least recently used chains are dropped.
+    other = TextBlock("other", title="Other", max_tokens=200)
+    assert budget.apply(other, chain, "prompt").llm.max_tokens == 200
+    assert budget.apply(block, chain, "prompt") is not budgeted
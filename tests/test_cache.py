@@ -0,0 +1,82 @@
+import time
+
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import TextBlock
+from docchain.cache import FSCache, MemoryCache, TieredCache
+from docchain.generator import Generator
+from docchain.specs import Spec
+from tests.conftest import override_settings
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_size=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_memory_cache_ttl():
+    cache = MemoryCache(ttl=0.05)
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_fs_cache(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        cache = FSCache(max_size=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.set("c", "3")
+
+        # index is restored from the workspace
+        cache = FSCache(max_size=2)
+        assert cache.get("a") is None
+        assert cache.get("b") == "2"
+        assert cache.get("c") == "3"
+        assert sorted(tmpdir.join("cache").listdir()) == [
+            tmpdir.join("cache", "b.json"),
+            tmpdir.join("cache", "c.json"),
+        ]
+
+
+def test_tiered_cache_populates_faster_tiers(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        FSCache().set("a", "1")
+        memory = MemoryCache()
+        cache = TieredCache(memory, FSCache())
+
+        assert cache.get("a") == "1"
+        assert memory.get("a") == "1"
+
+
+def test_generator_uses_cache():
+    cache = MemoryCache()
+    spec = Spec(
+        title="Test",
+        blocks=[
+            TextBlock("cached", title="Cached"),
+            TextBlock("not_cached", title="Not cached", cacheable=False),
+        ],
+    )
+
+    generator = Generator(
+        llm=FakeListLLM(responses=["first", "second"]),
+        cache=cache,
+    )
+    doc = generator(spec)
+    assert doc.res == {"cached": "first", "not_cached": "second"}
+    assert doc.stats == {"cache_misses": 1}
+
+    generator = Generator(llm=FakeListLLM(responses=["third"]), cache=cache)
+    doc = generator(spec)
+    assert doc.res == {"cached": "first", "not_cached": "third"}
+    assert doc.stats == {"cache_hits": 1}
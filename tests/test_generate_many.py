@@ -0,0 +1,93 @@
+import asyncio
+import os
+
+from langchain.llms.fake import FakeListLLM
+
+from docchain.documents import Document
+from docchain.exceptions import DocumentGenerationError
+from docchain.generator import Generator
+from docchain.specs import Spec
+from tests.conftest import override_settings
+from tests.testing.blocks import SleepBlock
+from tests.testing.middleware import mark_as_draft_middleware
+
+
+def make_specs():
+    def failing_block(*args, **kwargs):
+        raise ValueError("Failed.")
+
+    failing_block.key = "failed"
+
+    return [
+        Spec(title="Slow", blocks=[SleepBlock("text", title="slow", delay=0.3)]),
+        Spec(title="Failed", filename="failed", blocks=[failing_block]),
+        Spec(title="Fast", blocks=[SleepBlock("text", title="fast", delay=0.1)]),
+    ]
+
+
+def test_generate_many(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        generator = Generator(
+            middleware=(mark_as_draft_middleware,),
+            llm=FakeListLLM(responses=[]),
+        )
+
+        results = list(generator.generate_many(make_specs(), concurrency=3))
+
+    # Failed spec could finish after the fast one, as saving its WIP and snapshot files
+    # is slow on first use.
+    assert [spec.title for spec, _ in results][-1] == "Slow"
+    results = {spec.title: res for spec, res in results}
+    assert isinstance(results["Failed"], DocumentGenerationError)
+    assert os.path.exists(tmpdir.join("failed.snapshot"))
+    assert isinstance(results["Fast"], Document)
+    assert results["Fast"].title == "WIP: Fast (Draft)"
+    assert results["Slow"].res == {"text": "slow"}
+
+
+def test_agenerate_many(tmpdir):
+    async def generate():
+        generator = Generator(llm=FakeListLLM(responses=[]))
+        return [
+            (spec.title, res)
+            async for spec, res in generator.agenerate_many(make_specs(), concurrency=2)
+        ]
+
+    with override_settings(fs_workspace=tmpdir):
+        results = asyncio.run(generate())
+
+    assert [title for title, _ in results][-1] == "Slow"
+    results = dict(results)
+    assert isinstance(results["Failed"], DocumentGenerationError)
+    assert results["Slow"].res == {"text": "slow"}
+
+
+def test_generate_many_error_outside_build(tmpdir, monkeypatch):
+    specs = make_specs()
+    plan = Generator.plan
+
+    def broken_plan(spec):
+        if spec.title == "Slow":
+            raise RuntimeError("Broken plan")
+        return plan(spec)
+
+    with override_settings(fs_workspace=tmpdir):
+        generator = Generator(llm=FakeListLLM(responses=[]))
+        monkeypatch.setattr(generator, "plan", broken_plan)
+
+        results = dict(
+            (spec.title, res) for spec, res in generator.generate_many(specs, 3)
+        )
+
+        async def collect():
+            return {
+                spec.title: res
+                async for spec, res in generator.agenerate_many(specs, 3)
+            }
+
+        aresults = asyncio.run(collect())
+
+    for res in (results, aresults):
+        assert isinstance(res["Slow"], RuntimeError)
+        assert isinstance(res["Failed"], DocumentGenerationError)
+        assert isinstance(res["Fast"], Document)
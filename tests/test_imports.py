@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+import pytest
+
+from docchain import blocks, middleware, models, output_parsers
+
+HEAVY_MODULES = ("langchain", "openai", "jsonschema", "jinja2", "fsspec", "tiktoken")
+
+SCRIPT = f"""
+import sys
+
+from docchain.blocks import JSONSchemaBlock, TextBlock
+from docchain.generator import Generator
+from docchain.middleware import SaveDocumentMiddleware
+from docchain.specs import Spec
+import docchain.models
+import docchain.output_parsers
+
+Spec(
+    blocks=[
+        TextBlock("text", title="{{{{ doc.title }}}}"),
+        JSONSchemaBlock("schema", title="Schema", description="Schema"),
+    ]
+)
+print(",".join(sorted({{name.split(".")[0] for name in sys.modules}} & {set(HEAVY_MODULES)})))
+"""
+
+
+def test_heavy_dependencies_are_not_imported():
+    res = subprocess.run(
+        [sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True
+    )
+
+    assert res.stdout.strip() == ""
+
+
+@pytest.mark.parametrize("package", [blocks, middleware, models, output_parsers])
+def test_lazy_attributes(package):
+    for name in package.__all__:
+        assert getattr(package, name) is not None
+
+    with pytest.raises(AttributeError):
+        package.Unknown
@@ -0,0 +1,108 @@
+import pytest
+from langchain.schema import OutputParserException
+
+from docchain.blocks import UISchemaBlock
+from docchain.documents import Document
+from docchain.events import TokenChunk, listen
+from docchain.generator import Generator
+from docchain.output_parsers import JSONScanner, parse_json_object
+from docchain.specs import Spec
+from tests.testing.llms import StreamingFakeListLLM
+
+
+def test_scanner_consumes_chunks():
+    scanner = JSONScanner()
+    chunks = [
+        'Sure! {"a": "{not',
+        " closed\\",
+        '"", "b": [1, {"c": 2}]',
+        "} and {more}",
+    ]
+
+    assert [scanner.feed(chunk) for chunk in chunks] == [False, False, False, True]
+    assert scanner.result == '{"a": "{not closed\\"", "b": [1, {"c": 2}]}'
+
+
+def test_scanner_consumes_single_characters():
+    text = 'Sure! {"a": "{not closed\\"", "b": [1, {"c": "\\\\"}]} and {more}'
+    scanner = JSONScanner()
+    end = text.index("]}") + 2
+    done = [scanner.feed(char) for char in text]
+
+    assert done.index(True) == end - 1
+    assert scanner.result == text[6:end]
+    # Text after the object is not consumed.
+    assert scanner.text == text[:end]
+
+
+def test_scanner_reports_mismatched_brackets():
+    scanner = JSONScanner()
+    scanner.feed('{"a": [1, 2')
+
+    with pytest.raises(OutputParserException) as exc_info:
+        scanner.feed("}")
+
+    assert "Unexpected '}' at position 11, expected ']'" in str(exc_info.value)
+
+
+@pytest.mark.parametrize(
+    "text, res",
+    [
+        ('{"a": 1}', {"a": 1}),
+        (
+            'Here it is:\n```json\n{"a": {"b": "}"}}\n```\nNote: use {braces}.',
+            {"a": {"b": "}"}},
+        ),
+    ],
+)
+def test_parse_json_object(text, res):
+    assert parse_json_object(text) == res
+
+
+@pytest.mark.parametrize(
+    "text, err_mess",
+    [
+        ('{"a": 1', "Failed to find json object"),
+        ("no json", "Failed to find json object"),
+        ('{"a": 1,}', "Failed to parse json"),
+    ],
+)
+def test_parse_json_object_errors(text, err_mess):
+    with pytest.raises(OutputParserException) as exc_info:
+        parse_json_object(text)
+
+    assert err_mess in str(exc_info.value)
+
+
+def test_generation_stops_after_json_object():
+    generator = Generator(
+        llm=StreamingFakeListLLM(
+            responses=['Form: {"age": {"ui:widget": "updown"}} Hope it helps {you}']
+        )
+    )
+    spec = Spec(
+        title="Test",
+        blocks=[UISchemaBlock("ui_schema", json_schema="{}")],
+    )
+    tokens = []
+
+    with listen(
+        lambda event: isinstance(event, TokenChunk) and tokens.append(event.text)
+    ):
+        doc = generator(spec)
+
+    assert doc.res == {"ui_schema": {"age": {"ui:widget": "updown"}}}
+    assert tokens == ["Form:", '{"age":', '{"ui:widget":', '"updown"}}']
+
+
+def test_malformed_json_is_reported_early():
+    block = UISchemaBlock("ui_schema", json_schema="{}")
+    llm = StreamingFakeListLLM(responses=['{"age": ] "never received"}'] * 2)
+    tokens = []
+
+    with listen(lambda event: tokens.append(event.text)):
+        with pytest.raises(OutputParserException):
+            block(document=Document(title="Test", res={}), llm=llm)
+
+    # LLM is asked again after the first malformed completion
+    assert tokens == ['{"age":', "]", '{"age":', "]"]
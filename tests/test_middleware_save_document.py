@@ -1,11 +1,18 @@
+import atexit
+import gc
+import json
 import os
 
+from fsspec.implementations.memory import MemoryFileSystem
 from langchain.llms.fake import FakeListLLM
 
+from docchain.blocks import TextBlock
 from docchain.documents import Document, Format
 from docchain.generator import Generator
-from docchain.middleware import SaveDocumentMiddleware
+from docchain.middleware import SaveDocumentMiddleware, save_document
 from docchain.specs import Spec
+from docchain.workspace import Workspace
+from docchain.writer import BackgroundWriter, get_writer
 
 from .conftest import override_settings
 from .testing.middleware import AddSectionMiddleware
@@ -41,3 +48,136 @@ def test_save_document(tmpdir):
         assert document.title == "Product description"
         assert os.path.exists(file)
         assert file.read() == "test_key: test text\n"
+
+
+def test_save_document_write_behind(tmpdir):
+    with override_settings(fs_workspace=tmpdir, save_write_behind=True):
+        spec = Spec(
+            filename="test.txt",
+            fmt=Format.json,
+            title="Product description",
+            blocks=[TextBlock("intro", title="Intro")],
+        )
+        with Generator(
+            middleware=[SaveDocumentMiddleware],
+            llm=FakeListLLM(responses=["intro"]),
+        ) as generator:
+            generator(spec)
+
+        assert tmpdir.join("test.txt").read() == json.dumps(
+            {"intro": "intro"}, indent=4
+        )
+        assert get_writer().stats["written"] >= 1
+        # Journal is removed once the document is written.
+        assert not tmpdir.join("test.txt.journal").exists()
+
+
+def test_save_document_write_behind_failure(tmpdir, monkeypatch):
+    writer = BackgroundWriter(max_retries=0)
+    monkeypatch.setattr(save_document, "get_writer", lambda: writer)
+    # Document can't be written over the directory.
+    tmpdir.mkdir("test.txt")
+    with override_settings(fs_workspace=tmpdir, save_write_behind=True):
+        spec = Spec(
+            filename="test.txt",
+            fmt=Format.json,
+            title="Product description",
+            blocks=[TextBlock("intro", title="Intro")],
+        )
+        document = Generator(
+            middleware=[SaveDocumentMiddleware], llm=FakeListLLM(responses=["intro"])
+        )(spec)
+        writer.flush()
+
+        assert document.stats["save_failed"] == 1
+        # Document is restored from the journal by the next run.
+        assert tmpdir.join("test.txt.journal").exists()
+
+        tmpdir.join("test.txt").remove()
+        Generator(middleware=[SaveDocumentMiddleware], llm=FakeListLLM(responses=[]))(
+            spec
+        )
+        writer.close()
+
+        assert tmpdir.join("test.txt").read() == json.dumps(
+            {"intro": "intro"}, indent=4
+        )
+        assert not tmpdir.join("test.txt.journal").exists()
+
+
+def test_close_shared_writer(tmpdir):
+    with override_settings(fs_workspace=tmpdir, save_write_behind=True):
+        spec = Spec(filename="test.txt", blocks=[TextBlock("intro", title="Intro")])
+        first = Generator(
+            middleware=[SaveDocumentMiddleware], llm=FakeListLLM(responses=["intro"])
+        )
+        second = Generator(
+            middleware=[SaveDocumentMiddleware], llm=FakeListLLM(responses=["intro"])
+        )
+        first(spec)
+        first.close()
+
+        # Writer is still used by the second generator.
+        assert get_writer()._thread is not None
+        second(spec)
+        second.close()
+
+        assert tmpdir.join("test.txt").exists()
+
+
+def test_writer_released_by_collected_generator(tmpdir):
+    with override_settings(fs_workspace=tmpdir, save_write_behind=True):
+        gc.collect()
+        spec = Spec(filename="test.txt", blocks=[TextBlock("intro", title="Intro")])
+        first = Generator(
+            middleware=[SaveDocumentMiddleware], llm=FakeListLLM(responses=["intro"])
+        )
+        second = Generator(
+            middleware=[SaveDocumentMiddleware], llm=FakeListLLM(responses=["intro"])
+        )
+        first(spec)
+        # First generator is not closed.
+        del first
+        gc.collect()
+        second(spec)
+        second.close()
+
+        assert get_writer()._thread is None
+
+
+def test_writer_registers_atexit_once(monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    writer = BackgroundWriter()
+    workspace = Workspace(MemoryFileSystem(), "/a")
+
+    for _ in range(2):
+        writer.submit(workspace, "a", "a")
+        writer.close()
+
+    assert registered == [writer.close]
+
+
+class FlakyWorkspace(Workspace):
+    def __init__(self, *args, failures: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = failures
+
+    def open(self, name, mode="r", **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("Storage is not available")
+
+        return super().open(name, mode, **kwargs)
+
+
+def test_background_writer_retries(tmpdir):
+    writer = BackgroundWriter(max_retries=2, backoff=0)
+    stats = {}
+
+    writer.submit(FlakyWorkspace(MemoryFileSystem(), "/a", failures=2), "a", "a", stats)
+    writer.submit(FlakyWorkspace(MemoryFileSystem(), "/b", failures=3), "b", "b")
+    writer.close()
+
+    assert stats == {"save_retries": 2}
+    assert writer.stats == {"queued": 2, "retries": 4, "written": 1, "failed": 1}
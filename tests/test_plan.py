@@ -0,0 +1,116 @@
+from copy import deepcopy
+from unittest.mock import patch
+
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import TextBlock
+from docchain.cache import MemoryCache
+from docchain.generator import Generator
+from docchain.specs import Spec
+from tests.testing.blocks import SleepBlock
+
+
+def make_spec(title: str = "Test") -> Spec:
+    return Spec(
+        title=title,
+        blocks=[
+            TextBlock("text", title="Text"),
+            SleepBlock("sleep", title="{{ text }}"),
+        ],
+    )
+
+
+def test_plan_is_shared_by_copies():
+    spec = make_spec()
+    plan = spec.compile()
+
+    assert plan.dependencies == (frozenset(), frozenset({0}))
+    assert deepcopy(spec).plan is plan
+    assert plan.matches(deepcopy(spec).blocks)
+    assert not plan.matches([TextBlock("text", title="Other")] + spec.blocks[1:])
+
+
+def test_chains_are_created_once_per_spec():
+    llm = FakeListLLM(responses=["first", "second"])
+    generator = Generator(llm=llm)
+    spec = make_spec()
+
+    with patch.object(
+        TextBlock, "create_chain", autospec=True, side_effect=TextBlock.create_chain
+    ) as create_chain:
+        first = generator(spec)
+        spec.title = "Other"
+        second = generator(spec)
+
+    assert create_chain.call_count == 1
+    assert first.res == {"text": "first", "sleep": "first"}
+    assert second.res == {"text": "second", "sleep": "second"}
+
+
+def test_prompt_is_rendered_for_each_document():
+    llm = FakeListLLM(responses=["first", "second"])
+    generator = Generator(llm=llm)
+    spec = make_spec()
+    plan = generator.plan(spec)
+    chain = plan.chain(plan.blocks[0], llm)
+
+    assert plan.chain(plan.blocks[1], llm) is None
+    for title in ("First", "Second"):
+        doc = generator(make_spec(title))
+        params = plan.blocks[0].get_params(doc)
+        assert f"for {title} document" in chain.prep_prompts([params])[0][0].to_string()
+
+
+def test_middleware_changes_to_blocks_are_used():
+    def not_cacheable_middleware(build_document):
+        def run(spec: Spec):
+            for block in spec.blocks:
+                block.cacheable = False
+            return build_document(spec)
+
+        return run
+
+    cache = MemoryCache()
+    spec = make_spec()
+    Generator(llm=FakeListLLM(responses=["first"] * 2), cache=cache)(spec)
+
+    generator = Generator(
+        middleware=[not_cacheable_middleware],
+        llm=FakeListLLM(responses=["second"] * 2),
+        cache=cache,
+    )
+    doc = generator(spec)
+
+    assert doc.res == {"text": "second", "sleep": "second"}
+    # Blocks of the original spec are not changed and share the plan.
+    assert spec.blocks[0].cacheable
+    assert generator.plan(spec).blocks[0] is spec.blocks[0]
+
+
+def test_subclasses_do_not_inherit_static_prompt():
+    from langchain.prompts import PromptTemplate
+
+    class DocumentTextBlock(TextBlock):
+        def create_prompt(self, document, llm, **kwargs):
+            return PromptTemplate.from_template(f"{document.title}: {{title}}")
+
+    llm = FakeListLLM(responses=["first", "second"])
+    spec = Spec(title="Test", blocks=[DocumentTextBlock("text", title="Text")])
+    plan = Generator(llm=llm).plan(spec)
+
+    assert TextBlock.static_prompt
+    assert not DocumentTextBlock.static_prompt
+    assert plan.chain(spec.blocks[0], llm) is None
+
+
+def test_config_changed_in_place():
+    llm = FakeListLLM(responses=["first", "second"])
+    generator = Generator(llm=llm)
+    spec = make_spec()
+    plan = generator.plan(spec)
+
+    spec.blocks[1].config.title = "Independent"
+    new_plan = generator.plan(spec)
+
+    assert new_plan is not plan
+    assert new_plan.dependencies == (frozenset(), frozenset())
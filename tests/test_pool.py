@@ -0,0 +1,194 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts.base import StringPromptValue
+from openai.error import InvalidRequestError, RateLimitError, Timeout
+
+from docchain.blocks import TextBlock
+from docchain.budget import TokenBudget
+from docchain.events import TokenChunk, listen
+from docchain.exceptions import DocumentGenerationError
+from docchain.generator import Generator
+from docchain.models.pool import LLMPool, LLMPoolUnavailable, pool_llm_factory
+from docchain.models.simulated import SimulatedLLM
+from docchain.specs import Spec
+from tests.conftest import override_settings
+from tests.testing.llms import MaxTokensFakeListLLM
+
+
+def simulated(**kwargs) -> SimulatedLLM:
+    params = dict(
+        responses=["text"],
+        latency=0.02,
+        latency_distribution="constant",
+        max_retries=0,
+        retry_min_wait=0,
+    )
+    return SimulatedLLM(**params | kwargs)
+
+
+def test_weighted_balancing():
+    members = [FakeListLLM(responses=[str(i)] * 10) for i in range(2)]
+    pool = LLMPool(members=members, weights=[2, 1], strategy="weighted")
+
+    assert [pool("prompt") for _ in range(6)] == ["0", "1", "0", "0", "1", "0"]
+    assert [stats["requests"] for stats in pool.stats()] == [4, 2]
+
+
+def test_least_outstanding_balancing():
+    members = [simulated(latency=0.05), simulated(latency=0.05)]
+    pool = LLMPool(members=members)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(pool, ["prompt"] * 4))
+
+    assert [llm.stats.requests for llm in members] == [2, 2]
+    assert all(stats["outstanding"] == 0 for stats in pool.stats())
+
+
+def test_failover_and_circuit_breaking():
+    failing, healthy = simulated(error_rate=1.0), simulated()
+    pool = LLMPool(members=[failing, healthy], failure_threshold=2, reset_timeout=0.05)
+
+    assert [pool("prompt") for _ in range(4)] == ["text"] * 4
+    # Failing member is taken out after two failures.
+    assert failing.stats.requests == 2
+    assert pool.stats()[0]["state"] == "open"
+    assert pool.stats()[0]["circuit_opened"] == 1
+
+    time.sleep(0.05)
+    failing.error_rate = 0.0
+    pool("prompt")
+
+    # Trial request closes the circuit.
+    assert failing.stats.requests == 3
+    assert pool.stats()[0]["state"] == "closed"
+
+
+def test_pool_unavailable():
+    pool = LLMPool(members=[simulated(error_rate=1.0)], failure_threshold=1)
+
+    with pytest.raises(RateLimitError):
+        pool("prompt")
+    with pytest.raises(LLMPoolUnavailable):
+        asyncio.run(pool.agenerate_prompt([StringPromptValue(text="prompt")]))
+
+
+class ErrorLLM(FakeListLLM):
+    error: Any
+    streamed: list[str] = []
+
+    def _call(self, prompt, stop=None, run_manager=None) -> str:
+        for token in self.streamed:
+            run_manager.on_llm_new_token(token)
+        raise self.error
+
+
+def test_client_error_is_not_retried():
+    invalid = ErrorLLM(responses=[], error=InvalidRequestError("Too long", None))
+    healthy = simulated()
+    pool = LLMPool(members=[invalid, healthy], failure_threshold=1)
+
+    with pytest.raises(InvalidRequestError):
+        pool("prompt")
+
+    # Error of the request doesn't take the member out.
+    assert healthy.stats.requests == 0
+    assert [stats["state"] for stats in pool.stats()] == ["closed", "closed"]
+
+
+def test_client_error_does_not_close_circuit():
+    member = ErrorLLM(responses=[], error=RateLimitError("Rate limited"))
+    pool = LLMPool(members=[member], failure_threshold=1, reset_timeout=0.01)
+    with pytest.raises(RateLimitError):
+        pool("prompt")
+    assert pool.stats()[0]["state"] == "open"
+
+    time.sleep(0.01)
+    member.error = InvalidRequestError("Too long", None)
+    with pytest.raises(InvalidRequestError):
+        pool("prompt")
+
+    # Error of the trial request doesn't tell whether the member recovered.
+    assert pool.stats()[0]["state"] == "open"
+    assert pool.stats()[0]["circuit_opened"] == 1
+
+
+def test_streamed_completion_is_not_retried():
+    streaming = ErrorLLM(
+        responses=[], error=Timeout("Timed out"), streamed=["partial", "text"]
+    )
+    healthy = simulated()
+    pool = LLMPool(members=[streaming, healthy])
+    tokens = []
+
+    with pytest.raises(DocumentGenerationError) as exc_info, listen(tokens.append):
+        Generator(llm=pool)(
+            Spec(title="Test", blocks=[TextBlock("text", title="Text")])
+        )
+
+    assert isinstance(exc_info.value.__cause__, Timeout)
+    assert healthy.stats.requests == 0
+    assert [event.text for event in tokens if isinstance(event, TokenChunk)] == [
+        "partial",
+        "text",
+    ]
+
+
+def make_spec(i: int) -> Spec:
+    return Spec(
+        title="Test",
+        name=f"spec-{i}",
+        blocks=[TextBlock("overview", title="Overview")],
+    )
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_generator_with_pool(is_async):
+    members = [simulated(), simulated()]
+    generator = Generator(llm=LLMPool(members=members))
+
+    specs = [make_spec(i) for i in range(4)]
+    if is_async:
+
+        async def collect():
+            return [res async for _, res in generator.agenerate_many(specs, 4)]
+
+        documents = asyncio.run(collect())
+    else:
+        documents = [res for _, res in generator.generate_many(specs, 4)]
+
+    assert [document.res for document in documents] == [{"overview": "text"}] * 4
+    assert [llm.stats.requests for llm in members] == [2, 2]
+
+
+def test_pool_max_tokens_with_budget():
+    llm = MaxTokensFakeListLLM(responses=["text"], max_tokens_used=[])
+    spec = Spec(
+        title="Test",
+        name="test",
+        blocks=[TextBlock("overview", title="Overview", max_tokens=100)],
+    )
+    generator = Generator(llm=LLMPool(members=[llm]), budget=TokenBudget())
+
+    generator(spec)
+
+    assert llm.max_tokens_used == [100]
+    # Member of the pool is not changed.
+    assert llm.max_tokens == 2048
+
+
+def test_pool_llm_factory():
+    with override_settings(
+        llm_pool=[{"openai_api_key": "a", "weight": 2}, {"openai_api_key": "b"}],
+        llm_pool_strategy="weighted",
+    ):
+        pool = pool_llm_factory()
+
+    assert [llm.openai_api_key for llm in pool.members] == ["a", "b"]
+    assert pool.weights == [2, 1]
+    assert pool.strategy == "weighted"
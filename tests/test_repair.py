@@ -0,0 +1,76 @@
+import pytest
+from langchain.llms.fake import FakeListLLM
+from langchain.schema import OutputParserException
+from pydantic import BaseModel
+
+from docchain.blocks import JSONSchemaBlock, PydanticBlock
+from docchain.generator import Generator
+from docchain.output_parsers import repair_json
+from docchain.specs import Spec
+
+
+@pytest.mark.parametrize(
+    "text, res",
+    [
+        ('{"a": 1, "b": [1, 2,],}', '{"a": 1, "b": [1, 2]}'),
+        ("```json\n{'a': 'it\\'s'}\n```", '{"a": "it\'s"}'),
+        ('{"a": True, "b": None, "c": "x\ny"}', '{"a": true, "b": null, "c": "x\\ny"}'),
+        ('Truncated: {"a": {"b": [1, 2', '{"a": {"b": [1, 2]}}'),
+        ('{"a": "truncated', '{"a": "truncated"}'),
+        ('{"a": 1, "b":', '{"a": 1, "b":null}'),
+    ],
+)
+def test_repair_json(text, res):
+    assert repair_json(text) == res
+
+
+@pytest.mark.parametrize(
+    "text", ["no json", '{"a": 1, "b"', '{"a": [1, 2}', '{"a": {"b": 1]}']
+)
+def test_repair_json_fails(text):
+    with pytest.raises(OutputParserException):
+        repair_json(text)
+
+
+SCHEMA = '{"type": "object", "properties": {"name": {"type": "string"}}}'
+
+
+def make_spec():
+    return Spec(
+        title="Test",
+        blocks=[JSONSchemaBlock("schema", title="Person", description="Name only.")],
+    )
+
+
+def test_block_repairs_completion():
+    generator = Generator(llm=FakeListLLM(responses=[SCHEMA[:-2] + ",}}"]))
+
+    doc = generator(make_spec())
+
+    assert doc.res["schema"]["properties"] == {"name": {"type": "string"}}
+    assert doc.stats == {"json_repaired": 1}
+
+
+def test_block_asks_llm_again_when_repair_fails():
+    generator = Generator(
+        llm=FakeListLLM(responses=['{"type": "object", "properties"', SCHEMA])
+    )
+
+    doc = generator(make_spec())
+
+    assert doc.res["schema"]["type"] == "object"
+    assert doc.stats == {"json_repair_failed": 1, "llm_retries": 1}
+
+
+class Person(BaseModel):
+    name: str
+
+
+def test_rejected_json_is_not_repair_failure():
+    generator = Generator(llm=FakeListLLM(responses=['{"age": 1}', '{"name": "A"}']))
+    spec = Spec(title="Test", blocks=[PydanticBlock("person", model=Person, title="P")])
+
+    doc = generator(spec)
+
+    assert doc.res["person"] == {"name": "A"}
+    assert doc.stats == {"json_rejected": 1, "llm_retries": 1}
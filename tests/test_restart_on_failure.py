@@ -55,3 +55,77 @@ def test_restart_on_exception(tmpdir):
             "second: second item\n"
             "third: third item\n"
         )
+
+
+class ProcessKilled(BaseException):
+    pass
+
+
+def test_restart_from_journal(tmpdir):
+    calls = []
+
+    def killed_block(*args, **kwargs):
+        calls.append("killed")
+        if len(calls) == 1:
+            # Not handled by the generator, no snapshot is saved.
+            raise ProcessKilled()
+
+        return "killed item"
+
+    killed_block.key = "killed"
+
+    with override_settings(fs_workspace=tmpdir):
+        generator = Generator(
+            llm=FakeListLLM(responses=["first item", "third item"]),
+        )
+        spec = Spec(
+            title="Test",
+            filename="testing_file",
+            fmt=Format.yaml,
+            blocks=[
+                TextBlock("first", title="Saved in the journal."),
+                killed_block,
+                TextBlock("third", title="Rendered on second run."),
+            ],
+        )
+
+        with pytest.raises(ProcessKilled):
+            generator(spec)
+
+        assert not os.path.exists(tmpdir.join(spec.filename + ".snapshot"))
+        assert os.path.exists(tmpdir.join(spec.filename + ".journal"))
+
+        doc = generator(spec)
+
+        assert not os.path.exists(tmpdir.join(spec.filename + ".journal"))
+        assert doc.text == (
+            "first: first item\n" "killed: killed item\n" "third: third item\n"
+        )
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_restart_with_nested_keys(tmpdir, max_workers):
+    with override_settings(fs_workspace=tmpdir):
+        generator = Generator(
+            llm=FakeListLLM(responses=["first item", "second item", "third item"]),
+            max_workers=max_workers,
+        )
+        spec = Spec(
+            title="Test",
+            filename="testing_file",
+            fmt=Format.yaml,
+            blocks=[
+                TextBlock("section.first", title="Rendered on first run."),
+                RaisesExceptionOnFirstCallBlock(
+                    "section.second", title="Raises exception on first run."
+                ),
+            ],
+        )
+
+        with pytest.raises(DocumentGenerationError):
+            generator(spec)
+
+        doc = generator(spec)
+
+        # Completed block is not generated again.
+        assert doc.res == {"section": {"first": "first item", "second": "second item"}}
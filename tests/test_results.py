@@ -0,0 +1,90 @@
+import copy
+import json
+import pickle
+
+import pytest
+import yaml
+
+from docchain.documents import Document
+from docchain.results import Results
+
+
+def test_dotted_paths():
+    res = Results({"a": {"b": {"c": 1}}, "d": 2})
+
+    assert "a.b.c" in res
+    assert "a.b" in res
+    assert "a.x" not in res
+    assert "d.x" not in res
+    assert res["a.b.c"] == 1
+    assert res.get("a.b") == {"c": 1}
+    assert res.get("a.x", "default") == "default"
+    with pytest.raises(KeyError):
+        res["a.x"]
+
+
+def test_set():
+    res = Results()
+    res.set("a.b", 1)
+    res.set("a.c.d", 2)
+
+    assert res == {"a": {"b": 1, "c": {"d": 2}}}
+    assert res["a.c.d"] == 2
+
+    res.set("a.c", 3)
+    assert "a.c.d" not in res
+    assert res["a.c"] == 3
+
+    res["a"] = {"e": 4}
+    assert "a.b" not in res
+    assert res["a.e"] == 4
+
+    with pytest.raises(TypeError):
+        res.set("a.e.f", 5)
+
+
+def test_nested_changes():
+    res = Results({"a": {"b": {"c": 1}}})
+    assert res["a.b.c"] == 1
+
+    res["a"]["b"]["c"] = 2
+    assert res["a.b.c"] == 2
+
+    res["a"]["b"] = {}
+    assert "a.b.c" not in res
+
+
+def test_copy_and_view():
+    res = Results({"a": {"b": 1}})
+    assert "a.b" in res
+
+    res_copy = res.copy()
+    res_copy["a"] = 2
+    assert res["a.b"] == 1
+    assert isinstance(res_copy, Results)
+
+    view = res.view()
+    assert view["a.b"] == 1
+    with pytest.raises(TypeError):
+        view["a"] = 2
+
+
+def test_serialization():
+    res = Results({"a": {"b": 1}})
+    res.set("c.d", 2)
+
+    assert json.loads(json.dumps(res)) == res
+    assert yaml.safe_load(yaml.dump(res)) == res
+    assert yaml.safe_load(yaml.dump(res, Dumper=yaml.SafeDumper)) == res
+    assert pickle.loads(pickle.dumps(res))["c.d"] == 2
+    assert copy.deepcopy(res)["c.d"] == 2
+
+
+def test_document_context():
+    document = Document(title="Test", res={"a": {"b": 1}})
+
+    assert isinstance(document.res, Results)
+    assert document.context["doc"]["title"] == "Test"
+    assert document.context["a.b"] == 1
+    with pytest.raises(TypeError):
+        document.context["a"] = 2
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+
+from docchain.generator import Generator
+from docchain.scheduler import block_dependencies
+from docchain.specs import Spec
+from tests.testing.blocks import AsyncBarrier, BarrierBlock, SleepBlock
+
+
+def test_block_dependencies():
+    def callable_block(*args, **kwargs):
+        return "callable"
+
+    callable_block.key = "callable"
+
+    blocks = [
+        SleepBlock("a", title="A"),
+        SleepBlock("nested.b", title="B"),
+        SleepBlock("c", title="{{ a }} {{ nested.b }}"),
+        SleepBlock("d", title="{% for x in c %}{{ x }}{% endfor %}"),
+        callable_block,
+        SleepBlock("e", title="{{ doc.title }}"),
+    ]
+
+    assert block_dependencies(blocks) == [
+        set(),
+        set(),
+        {0, 1},
+        {2},
+        {0, 1, 2, 3},
+        set(),
+    ]
+
+
+def test_independent_blocks_run_concurrently():
+    # Independent blocks wait for each other, so they fail unless they overlap.
+    BarrierBlock.barriers["sync"] = threading.Barrier(3)
+    generator = Generator(llm=FakeListLLM(responses=[]), max_workers=4)
+    spec = Spec(
+        title="Test",
+        blocks=[
+            BarrierBlock("slow", title="slow", delay=0.05, barrier="sync"),
+            BarrierBlock("a", title="a", barrier="sync"),
+            BarrierBlock("b", title="b", barrier="sync"),
+            SleepBlock("joined", title="{{ a }}+{{ b }}"),
+        ],
+    )
+
+    doc = generator(spec)
+
+    assert doc.res == {"slow": "slow", "a": "a", "b": "b", "joined": "a+b"}
+    # results are stored in the order of the blocks in the spec
+    assert list(doc.res) == ["slow", "a", "b", "joined"]
+
+
+def test_independent_blocks_run_concurrently_async():
+    BarrierBlock.barriers["async"] = AsyncBarrier(3)
+    generator = Generator(llm=FakeListLLM(responses=[]), max_workers=4)
+    spec = Spec(
+        title="Test",
+        blocks=[
+            BarrierBlock("slow", title="slow", delay=0.05, barrier="async"),
+            BarrierBlock("a", title="a", barrier="async"),
+            SleepBlock("joined", title="{{ a }}+{{ slow }}"),
+            BarrierBlock("b", title="b", barrier="async"),
+        ],
+    )
+
+    doc = asyncio.run(generator.agenerate(spec))
+
+    assert list(doc.res.items()) == [
+        ("slow", "slow"),
+        ("a", "a"),
+        ("joined", "a+slow"),
+        ("b", "b"),
+    ]
+
+
+def test_failed_block_keeps_finished_results():
+    class FailingBlock(SleepBlock):
+        def __call__(self, document, **kwargs):
+            super().__call__(document, **kwargs)
+            raise ValueError("Failed.")
+
+    generator = Generator(llm=FakeListLLM(responses=[]), max_workers=2)
+    spec = Spec(
+        title="Test",
+        blocks=[
+            FailingBlock("failed", title="failed", delay=0.1),
+            SleepBlock("finished", title="finished"),
+            SleepBlock("dependent", title="{{ failed }}"),
+        ],
+    )
+
+    with pytest.raises(ValueError):
+        generator.build_document(spec)
+
+    assert spec.doc.res == {"finished": "finished"}
@@ -0,0 +1,73 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from docchain.documents import Document, Format, Section
+from docchain.exceptions import DocumentGenerationError
+from docchain.serializers import (
+    CHUNK_SIZE,
+    JSONSerializer,
+    serialize,
+    write,
+)
+
+
+def make_document() -> Document:
+    return Document(
+        title="Test",
+        res={"intro": "Intro text", "section": Section(title="Title", text="Text")},
+    )
+
+
+def test_text_format():
+    assert serialize(make_document(), Format.text) == (
+        "intro\n\nIntro text\n\nsection\n\nText"
+    )
+
+
+def test_sections_are_serialized_as_dicts():
+    document = make_document()
+    section = {"title": "Title", "summary": None, "text": "Text"}
+
+    assert json.loads(serialize(document, Format.json))["section"] == section
+    assert yaml.safe_load(serialize(document, Format.yaml))["section"] == section
+
+
+def test_unknown_format():
+    with pytest.raises(DocumentGenerationError):
+        serialize(make_document(), "xml")
+
+
+def test_json_is_written_in_chunks():
+    res = {f"key_{i}": "Lorem ipsum " * 100 for i in range(200)}
+    file = io.StringIO()
+
+    with patch.object(file, "write", wraps=file.write) as write_mock:
+        JSONSerializer().dump(res, file)
+
+    assert 1 < write_mock.call_count < len(res)
+    assert all(len(call.args[0]) < 2 * CHUNK_SIZE for call in write_mock.call_args_list)
+    assert json.loads(file.getvalue()) == res
+
+
+def test_nested_changes_are_serialized():
+    document = make_document()
+    document.res["nested"] = {"key": 1}
+    assert "key: 1" in serialize(document, Format.yaml)
+
+    document.res["nested"]["key"] = 2
+    text = serialize(document, Format.yaml)
+    file = io.StringIO()
+    write(document, file, Format.yaml)
+
+    assert "key: 2" in text
+    assert file.getvalue() == text
+
+
+def test_yaml_tuples_are_tagged():
+    document = Document(title="Test", res={"pair": (1, 2)})
+
+    assert serialize(document, Format.yaml) == yaml.dump({"pair": (1, 2)}, indent=4)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+from openai.error import RateLimitError, Timeout
+
+from benchmarks.load_test import load_test, make_spec
+from docchain.blocks import TextBlock
+from docchain.events import TokenChunk, listen
+from docchain.generator import Generator
+from docchain.middleware import collect_openai_stats
+from docchain.models.simulated import RateLimiter, SimulatedLLM
+from docchain.specs import Spec
+
+
+def test_latency_and_streaming():
+    llm = SimulatedLLM(
+        responses=["one two three"],
+        latency=0.05,
+        latency_distribution="constant",
+        tokens_per_second=100,
+        streaming=True,
+    )
+    spec = Spec(title="Test", blocks=[TextBlock("intro", title="Intro")])
+    events = []
+
+    start = time.perf_counter()
+    with listen(events.append):
+        document = Generator(llm=llm)(spec)
+
+    assert time.perf_counter() - start >= 0.08
+    assert document.res == {"intro": "one two three"}
+    assert [event.text for event in events if isinstance(event, TokenChunk)] == [
+        "one",
+        " two",
+        " three",
+    ]
+
+
+def test_rate_limit_errors_are_retried():
+    llm = SimulatedLLM(
+        responses=["result"], latency=0, error_rate=0.5, retry_min_wait=0, seed=1
+    )
+
+    for _ in range(10):
+        assert llm("prompt") == "result"
+
+    assert llm.stats.successful == 10
+    assert llm.stats.retries == llm.stats.rate_limited > 0
+    assert llm.stats.wasted_tokens == 0
+
+
+def test_timeouts():
+    llm = SimulatedLLM(
+        responses=["result"],
+        latency=0,
+        timeout_rate=1,
+        request_timeout=0,
+        max_retries=2,
+    )
+
+    with pytest.raises(Timeout):
+        asyncio.run(llm.agenerate(["prompt"]))
+
+    assert llm.stats.timeouts == 3
+    assert llm.stats.wasted_tokens == llm.stats.total_tokens > 0
+
+
+def test_requests_per_minute():
+    limiter = RateLimiter(rpm=2)
+    assert limiter.acquire(10)
+    assert limiter.acquire(10)
+    assert not limiter.acquire(10)
+
+    llm = SimulatedLLM(responses=["result"], latency=0, tpm=5, max_retries=0)
+    with pytest.raises(RateLimitError):
+        llm("This prompt has more than five tokens")
+
+
+def test_load_test():
+    llm = SimulatedLLM(latency=0.01, completion_tokens=10, seed=1)
+    generator = Generator(middleware=[collect_openai_stats], llm=llm)
+
+    report = load_test(generator, [make_spec(i, 2) for i in range(4)], concurrency=2)
+
+    assert report["documents"] == 4
+    assert report["failed"] == 0
+    assert report["llm_requests"] == 8
+    assert report["wasted_tokens"] == 0
+    assert report["latency_p95"] >= report["latency_p50"] > 0
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from docchain.blocks import TextBlock
+from docchain.generator import Generator
+from docchain.models.simulated import SimulatedLLM
+from docchain.singleflight import SingleFlight
+from docchain.specs import Spec
+from tests.conftest import override_settings
+
+
+def test_single_flight():
+    single_flight = SingleFlight()
+    started = threading.Event()
+
+    def call():
+        started.set()
+        time.sleep(0.05)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        leader = executor.submit(single_flight.do, "key", call)
+        started.wait()
+        followers = [executor.submit(single_flight.do, "key", call) for _ in range(2)]
+
+    assert leader.result() == (True, "result")
+    assert [follower.result() for follower in followers] == [(False, "result")] * 2
+    assert single_flight.stats == {"calls": 1, "coalesced": 2}
+
+
+def test_single_flight_shares_errors():
+    single_flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError()
+
+    async def run():
+        return await asyncio.gather(
+            single_flight.ado("key", call),
+            single_flight.ado("key", call),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(run())
+
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert single_flight.stats == {"calls": 1, "coalesced": 1}
+
+
+def make_spec(i: int) -> Spec:
+    return Spec(
+        title="Test",
+        name=f"spec-{i}",
+        blocks=[
+            TextBlock("overview", title="Overview"),
+            TextBlock("details", title="Details", cacheable=False),
+        ],
+    )
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_identical_block_requests_are_coalesced(is_async):
+    llm = SimulatedLLM(
+        responses=["text"], latency=0.05, latency_distribution="constant"
+    )
+    with override_settings(coalesce_requests=True):
+        generator = Generator(llm=llm)
+
+    specs = [make_spec(i) for i in range(4)]
+    if is_async:
+
+        async def collect():
+            return [res async for _, res in generator.agenerate_many(specs, 4)]
+
+        documents = asyncio.run(collect())
+    else:
+        documents = [res for _, res in generator.generate_many(specs, 4)]
+
+    assert [document.res for document in documents] == [
+        {"overview": "text", "details": "text"}
+    ] * 4
+    # Blocks which are not cacheable are not coalesced.
+    assert llm.stats.requests == 1 + 4
+    assert sum(doc.stats.get("coalesced_requests", 0) for doc in documents) == 3
+    assert generator.single_flight.stats == {"calls": 1, "coalesced": 3}
@@ -0,0 +1,117 @@
+import io
+import os
+import pickle
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+
+from docchain.documents import Document, Format, Section
+from docchain.generator import Generator
+from docchain.snapshots import SnapshotError, dump_document, load_document
+from docchain.specs import Spec
+from tests.conftest import override_settings
+
+
+def make_document(filename="dir/test.json"):
+    return Document(
+        title="Test",
+        filename=filename,
+        format=Format.yaml,
+        stats={"total_tokens": 10},
+        res={
+            "section": Section(title="Section", text="Text"),
+            "nested": {
+                "doc": Document(title="Inner", res={"section": Section(title="Inner")}),
+                "list": [1, "two", {"three": 3.0}],
+            },
+        },
+    )
+
+
+def test_round_trip():
+    file = io.StringIO()
+    dump_document(make_document(), file)
+    file.seek(0)
+
+    assert load_document(file) == make_document()
+
+
+def test_tagged_keys_round_trip():
+    document = Document(
+        title="Test",
+        stats={"__section__": 1},
+        res={
+            "__section__": {"title": "Not a section"},
+            "dict": {"__document__": {"title": "Not a document"}, "___a": 1},
+            "section": Section(title="Section"),
+        },
+    )
+    file = io.StringIO()
+    dump_document(document, file)
+    file.seek(0)
+
+    assert load_document(file) == document
+
+
+def test_results_are_written_one_per_line():
+    file = io.StringIO()
+    dump_document(make_document(), file)
+    lines = file.getvalue().splitlines()
+
+    assert len(lines) == 5
+    # Snapshot cut between the results is truncated.
+    with pytest.raises(SnapshotError):
+        load_document(io.StringIO("\n".join(lines[:3])))
+
+
+@pytest.mark.parametrize(
+    "data, err_mess",
+    [
+        ('{"format": "docchain.snapshot", "version": 0}\n{}', "version: 0"),
+        ("not a snapshot", "Not a document snapshot"),
+        (
+            '{"format": "docchain.snapshot", "version": 1}\n{"__document__": {"res": {',
+            "truncated or corrupt",
+        ),
+    ],
+)
+def test_invalid_snapshot(data, err_mess):
+    with pytest.raises(SnapshotError) as exc_info:
+        load_document(io.StringIO(data))
+
+    assert err_mess in str(exc_info.value)
+
+
+def test_compressed_snapshot(tmpdir):
+    with override_settings(fs_workspace=tmpdir, snapshot_compression="gzip"):
+        spec = Spec(title="Test", filename="test")
+        spec.doc = make_document(filename="test")
+
+        Generator._maybe_save_snapshot(spec)
+
+        with open(tmpdir.join("test.snapshot"), "rb") as file:
+            assert file.read(2) == b"\x1f\x8b"
+
+        assert Generator._maybe_restore_from_snapshot(spec) == spec.doc
+        assert tmpdir.listdir("*.tmp") == []
+
+
+def test_uncompressed_snapshot_is_ignored(tmpdir):
+    spec = Spec(title="Test", filename="test")
+    spec.doc = make_document(filename="test")
+    with override_settings(fs_workspace=tmpdir):
+        Generator._maybe_save_snapshot(spec)
+
+    with override_settings(fs_workspace=tmpdir, snapshot_compression="gzip"):
+        assert Generator._maybe_restore_from_snapshot(spec) is None
+
+
+def test_pickle_snapshot_is_ignored(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        with open(os.path.join(tmpdir, "test.snapshot"), "wb") as file:
+            file.write(pickle.dumps(make_document()))
+
+        generator = Generator(llm=FakeListLLM(responses=[]))
+        doc = generator(Spec(title="Test", filename="test"))
+
+        assert doc.res == {}
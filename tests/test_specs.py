@@ -0,0 +1,74 @@
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import TextBlock
+from docchain.documents import Document
+from docchain.generator import Generator
+from docchain.specs import Spec
+
+
+def make_spec() -> Spec:
+    return Spec(
+        title="Test",
+        blocks=[TextBlock("text", title="Text")],
+        doc=Document(title="Prefilled", res={"a": {"b": 1}}),
+    )
+
+
+def test_copy_is_isolated():
+    spec = make_spec()
+    spec.extra = {"key": "value"}
+    spec_copy = spec.copy()
+
+    assert spec_copy.shares_blocks
+    spec_copy.title = "Other"
+    spec_copy.blocks[0].config.title = "Other"
+    spec_copy.blocks.append(TextBlock("other", title="Other"))
+    spec_copy.doc.res.set("a.b", 2)
+    spec_copy.extra["key"] = "other"
+
+    assert not spec_copy.shares_blocks
+    assert spec.title == "Test"
+    assert [block.key for block in spec.blocks] == ["text"]
+    assert spec.blocks[0].config.title == "Text"
+    assert spec.doc.res == {"a": {"b": 1}}
+    assert spec.extra == {"key": "value"}
+
+
+def test_copy_of_copy():
+    spec = make_spec()
+    spec_copy = spec.copy()
+    spec_copy.title = "Copy"
+    copy_of_copy = spec_copy.copy()
+
+    assert copy_of_copy.title == "Copy"
+    assert copy_of_copy.blocks is not spec.blocks
+    assert spec_copy.shares_blocks
+
+    spec_copy.blocks = []
+    assert spec_copy.blocks == []
+    assert not spec_copy.shares_blocks
+
+
+def test_blocks_are_not_copied_by_generator():
+    shares_blocks = []
+
+    def mark_as_draft(build_document):
+        def run(spec: Spec):
+            shares_blocks.append(spec.shares_blocks)
+            spec.title = f"WIP: {spec.title}"
+
+            return build_document(spec)
+
+        return run
+
+    generator = Generator(
+        llm=FakeListLLM(responses=["text"]), middleware=[mark_as_draft]
+    )
+    spec = Spec(title="Test", blocks=[TextBlock("text", title="Text")])
+
+    document = generator(spec)
+
+    assert shares_blocks == [True]
+    assert document.title == "WIP: Test"
+    assert spec.title == "Test"
+    assert document.res == {"text": "text"}
@@ -0,0 +1,122 @@
+import sys
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import TextBlock
+from docchain.exceptions import DocumentGenerationError
+from docchain.generator import Generator
+from docchain.middleware import collect_openai_stats, collect_stats
+from docchain.specs import Spec
+from docchain.stats import StatsStore, get_stats_store, main, percentile
+from tests.conftest import override_settings
+from tests.testing.blocks import SleepBlock
+from tests.testing.middleware import throw_exception_middleware
+
+
+def make_spec():
+    return Spec(
+        title="Test",
+        name="test-spec",
+        blocks=[
+            TextBlock("intro", title="Intro"),
+            SleepBlock("body", title="Body", delay=0.05),
+        ],
+    )
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 95) == 4
+
+
+def test_collect_stats(tmpdir):
+    with override_settings(stats_db=str(tmpdir.join("stats.sqlite3"))):
+        generator = Generator(
+            middleware=[collect_stats], llm=FakeListLLM(responses=["intro"])
+        )
+        generator(make_spec())
+
+        store = get_stats_store()
+        store.flush()
+
+    documents = store.query("SELECT * FROM documents")
+    assert len(documents) == 1
+    assert documents[0]["spec_name"] == "test-spec"
+    assert documents[0]["requests"] == 1
+    assert documents[0]["failed"] == 0
+
+    blocks = store.query("SELECT * FROM blocks ORDER BY block_key")
+    assert [(row["block_key"], row["block_type"]) for row in blocks] == [
+        ("body", "SleepBlock"),
+        ("intro", "TextBlock"),
+    ]
+    assert {row["run_id"] for row in blocks} == {documents[0]["run_id"]}
+
+    latency = store.latency(by="block_key")
+    assert latency["body"]["count"] == 1
+    assert latency["body"]["p95"] >= 0.05
+    assert store.tokens()["TextBlock"]["count"] == 1
+
+
+def test_stats_errors_are_logged(monkeypatch, caplog):
+    def broken_store():
+        raise ValueError("Workspace is not local")
+
+    module = sys.modules["docchain.middleware.collect_stats"]
+    monkeypatch.setattr(module, "get_stats_store", broken_store)
+    generator = Generator(
+        middleware=[collect_stats], llm=FakeListLLM(responses=["intro"])
+    )
+    assert generator(make_spec()).res["intro"] is not None
+    assert "Failed to record stats of test-spec" in caplog.text
+
+    # Error of the generation is kept.
+    generator = Generator(
+        middleware=[throw_exception_middleware, collect_stats],
+        llm=FakeListLLM(responses=["intro"]),
+    )
+    with pytest.raises(DocumentGenerationError) as exc_info:
+        generator(make_spec())
+    assert isinstance(exc_info.value.__cause__, NotImplementedError)
+
+
+def test_stats_are_written_in_batches(tmpdir):
+    store = StatsStore(tmpdir.join("stats.sqlite3"), batch_size=3, flush_interval=60)
+    store.record({"run_id": "1"}, [{"run_id": "1"}, {"run_id": "1"}])
+    store.flush()
+    store.record({"run_id": "2"}, [])
+    store.close()
+
+    assert len(store.query("SELECT * FROM documents")) == 2
+    assert len(store.query("SELECT * FROM blocks")) == 2
+
+
+def test_cli(tmpdir, capsys):
+    path = str(tmpdir.join("stats.sqlite3"))
+    store = StatsStore(path)
+    store.record(
+        {"run_id": "1"},
+        [
+            {"run_id": "1", "block_type": "TextBlock", "latency": 1.5},
+            {"run_id": "1", "block_type": "TextBlock", "latency": 0.5},
+        ],
+    )
+    store.close()
+
+    main(["latency", "--db", path])
+
+    output = capsys.readouterr().out.splitlines()
+    assert output[0].split() == ["block_type", "count", "p50", "p95"]
+    assert output[1].split() == ["TextBlock", "2", "0.500", "1.500"]
+
+
+def test_collect_openai_stats_without_debug():
+    generator = Generator(
+        middleware=[collect_openai_stats], llm=FakeListLLM(responses=["intro"])
+    )
+
+    document = generator(Spec(title="Test", blocks=[TextBlock("intro", title="Intro")]))
+
+    assert document.stats["successful_requests"] == 0
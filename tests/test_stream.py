@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from docchain.blocks import TextBlock
+from docchain.events import BlockFinished, BlockStarted, DocumentFinished, TokenChunk
+from docchain.exceptions import DocumentGenerationError
+from docchain.generator import Generator
+from docchain.specs import Spec
+from tests.testing.llms import StreamingFakeListLLM
+from tests.testing.middleware import throw_exception_middleware
+
+
+def make_spec():
+    return Spec(
+        title="Test",
+        blocks=[
+            TextBlock("first", title="First"),
+            TextBlock("second", title="Second"),
+        ],
+    )
+
+
+EXPECTED_EVENTS = [
+    BlockStarted(key="first"),
+    TokenChunk(key="first", text="first"),
+    TokenChunk(key="first", text="text"),
+    BlockFinished(key="first", result="first text"),
+    BlockStarted(key="second"),
+    TokenChunk(key="second", text="second"),
+    TokenChunk(key="second", text="text"),
+    BlockFinished(key="second", result="second text"),
+]
+
+
+def test_stream():
+    generator = Generator(
+        llm=StreamingFakeListLLM(responses=["first text", "second text"])
+    )
+
+    events = list(generator.stream(make_spec()))
+
+    assert events[:-1] == EXPECTED_EVENTS
+    assert isinstance(events[-1], DocumentFinished)
+    assert events[-1].document.res == {"first": "first text", "second": "second text"}
+
+
+def test_astream():
+    async def collect():
+        generator = Generator(
+            llm=StreamingFakeListLLM(responses=["first text", "second text"])
+        )
+        return [event async for event in generator.astream(make_spec())]
+
+    events = asyncio.run(collect())
+
+    assert events[:-1] == EXPECTED_EVENTS
+    assert isinstance(events[-1], DocumentFinished)
+
+
+def test_stream_failure():
+    generator = Generator(
+        middleware=(throw_exception_middleware,),
+        llm=StreamingFakeListLLM(responses=["first text", "second text"]),
+    )
+    events = []
+
+    with pytest.raises(DocumentGenerationError):
+        for event in generator.stream(make_spec()):
+            events.append(event)
+
+    assert events == EXPECTED_EVENTS
+
+
+def test_stream_error_outside_build(monkeypatch):
+    def broken_plan(spec):
+        raise RuntimeError("Broken plan")
+
+    generator = Generator(llm=StreamingFakeListLLM(responses=["first text"]))
+    monkeypatch.setattr(generator, "plan", broken_plan)
+
+    with pytest.raises(RuntimeError, match="Broken plan"):
+        list(generator.stream(make_spec()))
+
+    async def collect():
+        return [event async for event in generator.astream(make_spec())]
+
+    with pytest.raises(RuntimeError, match="Broken plan"):
+        asyncio.run(collect())
@@ -0,0 +1,45 @@
+from copy import deepcopy
+
+from docchain import templates
+from docchain.documents import Document
+from docchain.templates import CompiledTemplate
+from tests.testing.blocks import SleepBlock
+
+
+def test_static_strings_are_not_compiled():
+    template = CompiledTemplate("Plain {title} text")
+
+    assert template.is_static
+    assert template.variables == frozenset()
+    assert template.render({}) == "Plain {title} text"
+
+
+def test_templates_are_compiled_once():
+    template = CompiledTemplate("{{ a }} {% if b %}{{ c.d }}{% endif %}")
+
+    assert template.variables == {"a", "b", "c"}
+    assert template.template is CompiledTemplate(template.source).template
+    assert deepcopy(template) is template
+    # Sources are not kept after the templates are loaded.
+    assert templates._loading.sources == {}
+
+
+def test_evicted_templates_are_compiled_again():
+    environment = templates.get_environment()
+    template = CompiledTemplate("{{ evicted }}")
+    assert template.render({"evicted": "a"}) == "a"
+
+    environment.cache.clear()
+    assert CompiledTemplate(template.source).render({"evicted": "b"}) == "b"
+
+
+def test_block_templates():
+    block = SleepBlock("key", title="{{ doc.title }}: {{ section }}")
+    document = Document(title="Test", res={"section": "Section"})
+
+    assert block.template_variables == {"title": {"doc", "section"}}
+    assert block.variables == {"doc", "section"}
+    assert block.get_params(document) == {"title": "Test: Section", "delay": 0}
+
+    block.config.title = "{{ section }}"
+    assert block.get_params(document) == {"title": "Section", "delay": 0}
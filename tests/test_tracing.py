@@ -0,0 +1,145 @@
+import json
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+
+from docchain import tracing
+from docchain.blocks import TextBlock
+from docchain.generator import Generator
+from docchain.middleware import SaveDocumentMiddleware
+from docchain.specs import Spec
+from docchain.tracing import ChromeTraceExporter, MemoryExporter, set_exporter, span
+from tests.conftest import override_settings
+from tests.testing.middleware import mark_as_draft_middleware
+
+
+@pytest.fixture
+def exporter():
+    exporter = MemoryExporter()
+    set_exporter(exporter)
+    yield exporter
+    set_exporter(None)
+
+
+def make_spec():
+    return Spec(
+        title="Test",
+        filename="test.json",
+        blocks=[TextBlock("intro", title="Intro")],
+    )
+
+
+def test_tracing_is_disabled_by_default():
+    assert span("test") is span("other")
+
+
+def test_spans(tmpdir, exporter):
+    with override_settings(fs_workspace=tmpdir):
+        generator = Generator(
+            middleware=[mark_as_draft_middleware, SaveDocumentMiddleware],
+            llm=FakeListLLM(responses=["intro"]),
+        )
+        generator(make_spec())
+
+    names = [span.name for span in exporter.spans]
+    for name in (
+        "spec.copy",
+        "generate",
+        "mark_as_draft_middleware",
+        "SaveDocumentMiddleware",
+        "document.start",
+        "document.blocks",
+        "document.format",
+        "block",
+        "block.get_params",
+        "block.llm",
+        "block.parse_result",
+        "fs.open",
+        "fs.close",
+    ):
+        assert name in names
+
+    # Spans are exported when closed, so inner spans go first.
+    assert names.index("block.llm") < names.index("block") < names.index("generate")
+    block = exporter.spans[names.index("block")]
+    assert block.args == {"key": "intro", "type": "TextBlock"}
+
+
+def test_chrome_trace_exporter(tmpdir):
+    path = str(tmpdir.join("trace.json"))
+    exporter = ChromeTraceExporter(path)
+    set_exporter(exporter)
+    try:
+        with pytest.raises(ValueError):
+            with span("test", key="value"):
+                raise ValueError()
+    finally:
+        set_exporter(None)
+
+    exporter.flush()
+
+    with open(path) as file:
+        events = json.load(file)
+
+    assert len(events) == 1
+    assert events[0]["name"] == "test"
+    assert events[0]["ph"] == "X"
+    assert events[0]["args"] == {"key": "value", "error": "ValueError"}
+
+
+def test_chrome_trace_exporter_appends_events(tmpdir):
+    path = str(tmpdir.join("trace.json"))
+    exporter = ChromeTraceExporter(path, buffer_size=2)
+    set_exporter(exporter)
+    try:
+        for i in range(5):
+            with span(f"span {i}"):
+                pass
+
+            # Full buffers are written without a flush.
+            if i % 2:
+                with open(path) as file:
+                    assert len(json.load(file)) == i + 1
+    finally:
+        set_exporter(None)
+
+    exporter.flush()
+    exporter.flush()
+
+    with open(path) as file:
+        assert [event["name"] for event in json.load(file)] == [
+            f"span {i}" for i in range(5)
+        ]
+
+
+def test_trace_file_setting(tmpdir):
+    path = str(tmpdir.join("trace.json"))
+    try:
+        with override_settings(trace_file=path, fs_workspace=tmpdir):
+            Generator(llm=FakeListLLM(responses=["intro"]))(make_spec())
+
+        tracing.get_exporter().flush()
+    finally:
+        set_exporter(None)
+
+    with open(path) as file:
+        assert json.load(file)
+
+
+def test_chrome_trace_exporter_empty_flush(tmpdir):
+    path = str(tmpdir.join("trace.json"))
+    exporter = ChromeTraceExporter(path)
+    exporter.flush()
+    with open(path) as file:
+        assert json.load(file) == []
+
+    set_exporter(exporter)
+    try:
+        with span("test"):
+            pass
+    finally:
+        set_exporter(None)
+    exporter.flush()
+
+    with open(path) as file:
+        assert [event["name"] for event in json.load(file)] == ["test"]
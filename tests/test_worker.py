@@ -0,0 +1,276 @@
+import os
+import threading
+import time
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import TextBlock
+from docchain.documents import Format
+from docchain.exceptions import DocumentGenerationError
+from docchain.generator import Generator
+from docchain.middleware import SaveDocumentMiddleware
+from docchain.specs import Spec
+from docchain.worker import Lease, Worker, WorkQueue, main, spec_node
+from docchain.workspace import get_workspace
+from tests.conftest import override_settings
+from tests.testing.blocks import RaisesExceptionOnFirstCallBlock
+
+
+def make_specs(count: int = 10) -> list[Spec]:
+    return [
+        Spec(
+            title=f"Document {i}",
+            filename=f"docs/{i}.yaml",
+            fmt=Format.yaml,
+            blocks=[TextBlock("text", title="{{ doc.title }}")],
+        )
+        for i in range(count)
+    ]
+
+
+def lease_file(tmpdir):
+    (lease,) = tmpdir.join("queue").listdir("*.lease")
+    return lease
+
+
+def make_generator(responses: int = 10) -> Generator:
+    return Generator(
+        middleware=[SaveDocumentMiddleware],
+        llm=FakeListLLM(responses=[f"response {i}" for i in range(responses)]),
+    )
+
+
+def test_ownership():
+    specs = make_specs()
+    assigned = [
+        WorkQueue(node=node, nodes=3, steal=False).assigned(specs) for node in range(3)
+    ]
+
+    assert sorted(spec.filename for owned in assigned for spec in owned) == sorted(
+        spec.filename for spec in specs
+    )
+    for node, owned in enumerate(assigned):
+        assert all(spec_node(spec, 3) == node for spec in owned)
+
+    # Other specs are taken after the owned ones.
+    stealing = WorkQueue(node=1, nodes=3).assigned(specs)
+    assert len(stealing) == len(specs)
+    assert stealing[: len(assigned[1])] == assigned[1]
+
+
+def test_spec_without_filename():
+    with pytest.raises(ValueError):
+        WorkQueue().assigned([Spec(title="Test")])
+
+
+def test_worker(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        specs = make_specs()
+        worker = Worker(make_generator(), WorkQueue(), poll_interval=0.01)
+        res = list(worker.run(specs))
+
+        assert sorted(spec.filename for spec, _ in res) == sorted(
+            spec.filename for spec in specs
+        )
+        assert all(tmpdir.join(spec.filename).exists() for spec in specs)
+        assert len(tmpdir.join("queue").listdir("*.done")) == 10
+        assert tmpdir.join("queue").listdir("*.lease") == []
+
+        # Done specs are not generated again.
+        assert list(Worker(make_generator(), WorkQueue()).run(specs)) == []
+
+
+def test_workers_share_specs(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        specs = make_specs(20)
+        results = []
+
+        def run(node: int):
+            worker = Worker(
+                make_generator(20),
+                WorkQueue(node=node, nodes=2),
+                concurrency=2,
+                poll_interval=0.01,
+            )
+            results.extend(spec.filename for spec, _ in worker.run(specs))
+
+        threads = [threading.Thread(target=run, args=(node,)) for node in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every spec is generated once.
+        assert sorted(results) == sorted(spec.filename for spec in specs)
+
+
+def test_live_lease(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        spec = make_specs(1)[0]
+        with WorkQueue(lease_ttl=0.2, heartbeat_interval=0.05) as queue:
+            assert queue.acquire(spec)
+            time.sleep(0.4)
+
+            # Lease is renewed by the heartbeats.
+            assert not WorkQueue().acquire(spec)
+
+            queue.release(spec)
+
+        assert WorkQueue().acquire(spec)
+
+
+def test_lost_lease(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        spec = make_specs(1)[0]
+        queue = WorkQueue(lease_ttl=0.01)
+        assert queue.acquire(spec)
+        time.sleep(0.02)
+
+        other = WorkQueue()
+        assert other.acquire(spec)
+        queue.renew()
+
+        assert queue.leases == []
+        assert other.leases == [spec.filename]
+
+        # Lease of the other worker is kept.
+        queue.release(spec)
+        assert not WorkQueue().acquire(spec)
+        assert Lease.parse_raw(lease_file(tmpdir).read()).owner == other.worker_id
+
+
+def test_done_removes_leases(tmpdir, monkeypatch):
+    with override_settings(fs_workspace=tmpdir):
+        spec = make_specs(1)[0]
+        assert WorkQueue(lease_ttl=0.01).acquire(spec)
+        time.sleep(0.02)
+
+        queue = WorkQueue()
+        assert queue.acquire(spec)
+        queue.renew()
+
+        def ls(*args, **kwargs):
+            raise AssertionError("Queue directory is listed")
+
+        monkeypatch.setattr(get_workspace(), "ls", ls)
+        queue.release(spec, done=True)
+
+        # Lease, heartbeat and takeover marker are removed.
+        assert [path.ext for path in tmpdir.join("queue").listdir()] == [".done"]
+
+
+def test_takeover_race(tmpdir, monkeypatch):
+    with override_settings(fs_workspace=tmpdir):
+        spec = make_specs(1)[0]
+        assert WorkQueue(lease_ttl=0.01).acquire(spec)
+        time.sleep(0.02)
+
+        first, second = WorkQueue(), WorkQueue()
+        current_lease = first._current_lease
+
+        def racing_lease(filename):
+            # Second worker takes over after the first one found the lease expired.
+            lease = current_lease(filename)
+            assert second.acquire(spec)
+            return lease
+
+        monkeypatch.setattr(first, "_current_lease", racing_lease)
+
+        assert not first.acquire(spec)
+        assert first.leases == []
+        assert Lease.parse_raw(lease_file(tmpdir).read()).owner == second.worker_id
+
+
+def test_invalid_lease(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        spec = make_specs(1)[0]
+        assert WorkQueue().acquire(spec)
+        lease_file(tmpdir).write('{"filename": "docs')
+
+        # Lease is being written.
+        assert not WorkQueue().acquire(spec)
+
+        # Lease of the crashed worker expires.
+        modified = time.time() - 120
+        os.utime(lease_file(tmpdir), (modified, modified))
+        assert WorkQueue().acquire(spec)
+
+
+def test_no_exclusive_create(tmpdir, monkeypatch):
+    with override_settings(fs_workspace=tmpdir, lease_settle_delay=0.01):
+        workspace = get_workspace()
+        open_file = workspace.open
+
+        def open_without_exclusive(name, mode="r", **kwargs):
+            if mode == "x":
+                raise ValueError("Unsupported mode")
+            return open_file(name, mode, **kwargs)
+
+        monkeypatch.setattr(workspace, "open", open_without_exclusive)
+        spec = make_specs(1)[0]
+
+        assert WorkQueue().acquire(spec)
+        assert not WorkQueue().acquire(spec)
+
+
+def test_worker_error(tmpdir):
+    class BrokenGenerator(Generator):
+        def __call__(self, spec):
+            raise RuntimeError("Broken")
+
+    with override_settings(fs_workspace=tmpdir):
+        spec = make_specs(1)[0]
+        worker = Worker(BrokenGenerator(llm=FakeListLLM(responses=[])), WorkQueue())
+        ((_, error),) = worker.run([spec])
+
+        assert isinstance(error, RuntimeError)
+        # Lease is released, so other workers can retry the spec.
+        assert WorkQueue().acquire(spec)
+
+
+def test_resume_abandoned_spec(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        spec = Spec(
+            title="Test",
+            filename="testing_file",
+            fmt=Format.yaml,
+            blocks=[
+                TextBlock("first", title="Saved in the snapshot by the dead worker."),
+                RaisesExceptionOnFirstCallBlock("second", title="Kills the worker."),
+                TextBlock("third", title="Generated by the other worker."),
+            ],
+        )
+
+        dead = WorkQueue(lease_ttl=0.01)
+        assert dead.acquire(spec)
+        with pytest.raises(DocumentGenerationError):
+            Generator(llm=FakeListLLM(responses=["first item"]))(spec)
+        time.sleep(0.02)
+
+        lease = Lease.parse_raw(lease_file(tmpdir).read())
+        assert lease.owner == dead.worker_id
+        assert lease.expired
+
+        worker = Worker(
+            Generator(llm=FakeListLLM(responses=["second item", "third item"])),
+            WorkQueue(),
+            poll_interval=0.01,
+        )
+        ((_, document),) = worker.run([spec])
+
+        assert document.text == (
+            "first: first item\nsecond: second item\nthird: third item\n"
+        )
+
+
+def test_main(tmpdir, capsys):
+    llm = FakeListLLM(responses=[f"response {i}" for i in range(10)])
+    with override_settings(fs_workspace=tmpdir, default_llm_factory=lambda: llm):
+        main(["tests.test_worker.make_specs", "--concurrency", "2"])
+
+        assert len(tmpdir.join("docs").listdir()) == 10
+        assert capsys.readouterr().out == "Generated 10 documents, 0 failed.\n"
+
+        main(["tests.test_worker.make_specs", "--node", "1", "--nodes", "2"])
+        assert capsys.readouterr().out == "Generated 0 documents, 0 failed.\n"
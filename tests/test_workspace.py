@@ -0,0 +1,170 @@
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from langchain.llms.fake import FakeListLLM
+
+from docchain.blocks import TextBlock
+from docchain.generator import Generator
+from docchain.specs import Spec
+from docchain.tracing import MemoryExporter, set_exporter
+from docchain.workspace import Workspace, get_workspace
+from tests.conftest import override_settings
+
+
+@pytest.fixture
+def exporter():
+    exporter = MemoryExporter()
+    set_exporter(exporter)
+    yield exporter
+    set_exporter(None)
+
+
+def fs_calls(exporter: MemoryExporter) -> list[str]:
+    return [span.name for span in exporter.spans if span.category == "fs"]
+
+
+def test_listing_cache(tmpdir, exporter):
+    workspace = Workspace(MemoryFileSystem(), f"/{tmpdir}")
+    with workspace.open("docs/a.json", "w") as file:
+        file.write("a")
+
+    assert workspace.exists_many(["docs/a.json", "docs/b.json", "c.json"]) == [
+        True,
+        False,
+        False,
+    ]
+    exporter.spans.clear()
+
+    with workspace.open("docs/b.json", "w") as file:
+        file.write("b")
+    assert workspace.exists("docs/b.json")
+    workspace.rm("docs/a.json", "docs/b.json", "docs/c.json")
+    assert workspace.ls("docs") == []
+
+    # Listings are not fetched again.
+    assert fs_calls(exporter) == ["fs.open", "fs.close"] + ["fs.rm_file"] * 3
+
+
+def test_listing_ttl(tmpdir):
+    fs = MemoryFileSystem()
+    workspace = Workspace(fs, f"/{tmpdir}", listing_ttl=0)
+    assert not workspace.exists("a.json")
+
+    fs.pipe(f"/{tmpdir}/a.json", b"a")
+    assert workspace.exists("a.json")
+
+
+def test_files_of_other_processes(tmpdir):
+    fs = MemoryFileSystem()
+    workspace = Workspace(fs, f"/{tmpdir}")
+    with workspace.open("docs/a.json", "w") as file:
+        file.write("a")
+    assert not workspace.exists("docs/b.json")
+
+    # Written by another process after the listing was cached.
+    fs.pipe(f"/{tmpdir}/docs/b.json", b"b")
+    workspace.rm("docs/b.json")
+    assert not fs.exists(f"/{tmpdir}/docs/b.json")
+
+    # Directory removed by another process is created again.
+    fs.rm(f"/{tmpdir}/docs", recursive=True)
+    with workspace.open("docs/a.json", "w") as file:
+        file.write("a")
+    assert fs.cat(f"/{tmpdir}/docs/a.json") == b"a"
+
+
+class NoAppendFileSystem(MemoryFileSystem):
+    def _open(self, path, mode="rb", **kwargs):
+        if mode == "ab":
+            raise NotImplementedError("File mode not supported")
+        return super()._open(path, mode, **kwargs)
+
+
+@pytest.mark.parametrize("fs_class", [MemoryFileSystem, NoAppendFileSystem])
+def test_append(tmpdir, fs_class):
+    fs = fs_class()
+    workspace = Workspace(fs, f"/{tmpdir}")
+    with pytest.raises(FileNotFoundError):
+        workspace.read_appended("docs/a.journal")
+
+    workspace.append("docs/a.journal", "first\n")
+    workspace.append("docs/a.journal", "second\n")
+    assert workspace.read_appended("docs/a.journal") == "first\nsecond\n"
+
+    # Data appended by another process is read and continued.
+    other = Workspace(fs, f"/{tmpdir}")
+    assert other.read_appended("docs/a.journal") == "first\nsecond\n"
+    other.append("docs/a.journal", "third\n")
+    assert workspace.read_appended("docs/a.journal") == "first\nsecond\nthird\n"
+
+    other.rm("docs/a.journal")
+    assert fs.find(f"/{tmpdir}/docs") == []
+
+
+def test_append_segments(tmpdir):
+    fs = NoAppendFileSystem()
+    workspace = Workspace(fs, f"/{tmpdir}")
+    for i in range(3):
+        workspace.append("a.journal", f"{i}\n")
+
+    # Every record is a separate object, nothing is rewritten.
+    assert not workspace._can_append
+    assert [fs.cat(path) for path in fs.find(f"/{tmpdir}/a.journal.d")] == [
+        b"0\n",
+        b"1\n",
+        b"2\n",
+    ]
+
+
+def test_get_workspace(tmpdir):
+    with override_settings(fs_workspace=tmpdir):
+        workspace = get_workspace()
+        assert get_workspace() is workspace
+        assert workspace.local_path("db/stats.sqlite3") == f"{tmpdir}/db/stats.sqlite3"
+        assert tmpdir.join("db").isdir()
+
+    with pytest.raises(ValueError):
+        Workspace(MemoryFileSystem(), "/workspace").local_path("stats.sqlite3")
+
+
+def test_generator_checks_document_files_at_once(tmpdir, exporter):
+    spec = Spec(
+        title="Test",
+        filename="docs/test.json",
+        blocks=[TextBlock("intro", title="Intro")],
+    )
+
+    with override_settings(fs_workspace=tmpdir):
+        Generator(llm=FakeListLLM(responses=["intro"]))(spec)
+
+    # Files of the document are checked without listing the directory, then journal
+    # record and removal of the snapshot and the journal.
+    assert fs_calls(exporter) == [
+        "fs.exists",
+        "fs.exists",
+        "fs.exists",
+        "fs.exists",
+        "fs.makedirs",
+        "fs.open",
+        "fs.close",
+        "fs.rm_file",
+        "fs.rm_file",
+    ]
+
+
+def test_generator_resumes_files_of_other_processes(tmpdir):
+    spec = Spec(
+        title="Test",
+        filename="docs/test.json",
+        blocks=[TextBlock("intro", title="Intro")],
+    )
+
+    with override_settings(fs_workspace=tmpdir):
+        assert not get_workspace().exists("docs/test.json.journal")
+        # Journal of another process which was killed.
+        tmpdir.join("docs/test.json.journal").write(
+            '{"key": "intro", "value": "resumed"}\n', ensure=True
+        )
+
+        document = Generator(llm=FakeListLLM(responses=["intro"]))(spec)
+
+    assert document.res == {"intro": "resumed"}
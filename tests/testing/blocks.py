@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 
 from langchain.prompts import PromptTemplate
 from pydantic import BaseModel
@@ -37,3 +39,70 @@ class RaisesExceptionOnFirstCallBlock(BaseBlock):
             raise Exception("Called first time.")
 
         return super().__call__(**kwargs)
+
+
+class SleepBlockModel(BaseModel):
+    title: str
+    delay: float = 0
+
+
+class SleepBlock(BaseBlock):
+    """
+    This is a testing block. It waits for the given delay and returns the rendered title
+    without calling the LLM.
+    """
+
+    model = SleepBlockModel
+
+    def __call__(self, document, **kwargs) -> any:
+        params = self.get_params(document)
+        time.sleep(params["delay"])
+
+        return params["title"]
+
+    async def acall(self, document, **kwargs) -> any:
+        params = self.get_params(document)
+        await asyncio.sleep(params["delay"])
+
+        return params["title"]
+
+
+class AsyncBarrier:
+    """
+    Async rendezvous of the given number of parties, as asyncio.Barrier is new in 3.11.
+    """
+
+    def __init__(self, parties: int):
+        self.parties = parties
+        self.arrived = 0
+        self.event = asyncio.Event()
+
+    async def wait(self):
+        self.arrived += 1
+        if self.arrived >= self.parties:
+            self.event.set()
+
+        await self.event.wait()
+
+
+class BarrierBlock(SleepBlock):
+    """
+    This is a testing block. It waits on the shared barrier, so the blocks of the same barrier
+    fail unless they run concurrently.
+    """
+
+    barriers = {}
+
+    def __init__(self, key, /, barrier: str, **kwargs):
+        super().__init__(key, **kwargs)
+        self.barrier = barrier
+
+    def __call__(self, document, **kwargs) -> any:
+        self.barriers[self.barrier].wait(timeout=5)
+
+        return super().__call__(document, **kwargs)
+
+    async def acall(self, document, **kwargs) -> any:
+        await asyncio.wait_for(self.barriers[self.barrier].wait(), timeout=5)
+
+        return await super().acall(document, **kwargs)
@@ -0,0 +1,47 @@
+from langchain.llms.fake import FakeListLLM
+from pydantic import Field
+
+
+class AsyncFakeListLLM(FakeListLLM):
+    """
+    Fake LLM which supports async generation.
+    """
+
+    async def _acall(self, prompt, stop=None, run_manager=None) -> str:
+        return self._call(prompt, stop=stop)
+
+
+class StreamingFakeListLLM(AsyncFakeListLLM):
+    """
+    Fake LLM which streams responses word by word.
+    """
+
+    def _call(self, prompt, stop=None, run_manager=None) -> str:
+        response = super()._call(prompt, stop=stop)
+        if run_manager:
+            for token in response.split(" "):
+                run_manager.on_llm_new_token(token)
+
+        return response
+
+    async def _acall(self, prompt, stop=None, run_manager=None) -> str:
+        response = super()._call(prompt, stop=stop)
+        if run_manager:
+            for token in response.split(" "):
+                await run_manager.on_llm_new_token(token)
+
+        return response
+
+
+class MaxTokensFakeListLLM(FakeListLLM):
+    """
+    Fake LLM which records max_tokens of every call. Copies of the LLM share the records, so
+    responses are returned in order.
+    """
+
+    max_tokens: int = 2048
+    max_tokens_used: list = Field(default_factory=list)
+
+    def _call(self, prompt, stop=None, run_manager=None) -> str:
+        self.max_tokens_used.append(self.max_tokens)
+        return self.responses[len(self.max_tokens_used) - 1]
@@ -40,3 +40,14 @@ def throw_exception_middleware(build_document):
         raise NotImplementedError("This will be converted.")
 
     return run
+
+
+def async_mark_as_reviewed_middleware(build_document):
+    async def run(spec: Spec):
+        spec.title = f"Reviewed: {spec.title}"
+        document = await build_document(spec)
+        document.stats["reviewed"] = 1
+
+        return document
+
+    return run